@@ -5,12 +5,33 @@ from datetime import datetime, timedelta
 from streamlit_mic_recorder import mic_recorder
 import base64
 import os
+import time
 from pathlib import Path
 import sqlite3
+import re
+import uuid
+from concurrent.futures import Future
 import plotly.graph_objects as go
 import plotly.express as px
+import plotly.io as pio
 import pandas as pd
-from collections import Counter
+from database import (
+    DB_PATH, DEFAULT_USER, init_database, insert_conversation, fetch_conversations, delete_conversation_record,
+    fetch_statistics, fetch_error_categories, fetch_data_version, search_conversations
+)
+from corrections import extract_corrections
+from lexicon import update_lexicon, rebuild_lexicon, get_top_words, get_vocabulary_growth
+import telemetry
+import profiling
+import write_behind
+import routing
+import prefetch
+import idempotency
+import semantic_index
+import review
+import snapshots
+from prompts import get_system_prompt, HFPromptBuilder
+from bulk_import import import_conversations
 
 # Configuration de la page
 st.set_page_config(
@@ -19,190 +40,232 @@ st.set_page_config(
     layout="wide"
 )
 
-# Dossier pour sauvegarder les conversations
-SAVE_DIR = Path("saved_conversations")
-SAVE_DIR.mkdir(exist_ok=True)
+# Début de la mesure de cette exécution du script
+telemetry.begin_run()
+profiling.begin_run(profiling.requested_mode(st.query_params.get("profile")))
+profiling.mark("init")
 
-# Base de données SQLite
-DB_PATH = Path("conversations.db")
+# URL des fournisseurs (surchargées par mock_providers.py pour les tests hors ligne)
+GROQ_BASE_URL = os.environ.get("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+HF_BASE_URL = os.environ.get("HF_BASE_URL", "https://api-inference.huggingface.co")
+TTS_BASE_URL = os.environ.get("TTS_BASE_URL")
 
-# Initialiser la base de données
-def init_database():
-    """Crée la base de données et les tables si elles n'existent pas"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS conversations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            date_created TEXT NOT NULL,
-            date_modified TEXT NOT NULL,
-            level TEXT,
-            topic TEXT,
-            message_count INTEGER DEFAULT 0,
-            correction_count INTEGER DEFAULT 0,
-            messages_json TEXT,
-            corrections_json TEXT,
-            file_path TEXT
-        )
-    """)
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS statistics (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT NOT NULL,
-            messages_sent INTEGER DEFAULT 0,
-            corrections_received INTEGER DEFAULT 0,
-            time_practiced INTEGER DEFAULT 0,
-            topics_practiced TEXT
-        )
-    """)
-    
-    conn.commit()
-    conn.close()
+# Utilisateur courant (?user=... dans l'URL) : les données sont rangées par utilisateur.
+# Ce cloisonnement sert les performances (index par user_id) et le rangement, ce n'est
+# PAS un contrôle d'accès : quiconque connaît un identifiant voit ses données. Pour
+# des utilisateurs qui ne se font pas confiance, placer l'application derrière une
+# authentification.
+# Avec ENGLISH_TUTOR_MULTI_USER=1, un nouveau visiteur reçoit un identifiant aléatoire
+# (difficile à deviner), l'identifiant partagé « default » est refusé et le profil ne
+# peut pas être changé depuis la barre latérale.
+MULTI_USER = os.environ.get("ENGLISH_TUTOR_MULTI_USER") == "1"
+USER_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+current_user = st.query_params.get("user", "")
+if not USER_ID_PATTERN.match(current_user) or (MULTI_USER and current_user == DEFAULT_USER):
+    current_user = uuid.uuid4().hex[:12] if MULTI_USER else DEFAULT_USER
+    st.query_params["user"] = current_user
+
+# Jeton de session (?session=... dans l'URL) : la conversation en cours survit à un
+# rafraîchissement ou à une reconnexion
+session_token = st.query_params.get("session", "")
+new_session = not snapshots.TOKEN_PATTERN.match(session_token)
+if new_session:
+    session_token = uuid.uuid4().hex
+    st.query_params["session"] = session_token
+
+# Dossier pour sauvegarder les conversations (un sous-dossier par utilisateur)
+SAVE_DIR = Path("saved_conversations")
+if current_user != DEFAULT_USER:
+    SAVE_DIR = SAVE_DIR / current_user
+SAVE_DIR.mkdir(parents=True, exist_ok=True)
+
+# Écrivain en arrière-plan : les sauvegardes ne bloquent plus l'exécution du script
+writer = write_behind.get_writer(DB_PATH)
 
 # Fonctions de base de données
 def save_to_database(conversation_data):
-    """Sauvegarde une conversation dans la base de données"""
+    """Met en file la sauvegarde (base puis fichier JSON); retourne (True, future) ou (False, erreur)
+
+    Le future est résolu avec l'identifiant de la conversation une fois le COMMIT fait
+    et le fichier écrit. Le fichier est écrit après le COMMIT, hors de la transaction :
+    une opération rejouée par la file ne le réécrit pas.
+    """
+    user_id = current_user
+    index_text = semantic_index.conversation_text(conversation_data)
+    if not conversation_data.get('file_path'):
+        conversation_data['file_path'] = str(conversation_file_path(conversation_data['title']))
+
+    payload_in = len(json.dumps(conversation_data['messages']))
+    start = time.perf_counter()
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        cursor.execute("""
-            INSERT INTO conversations 
-            (title, date_created, date_modified, level, topic, message_count, 
-             correction_count, messages_json, corrections_json, file_path)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            conversation_data['title'],
-            conversation_data['date'],
-            now,
-            conversation_data['level'],
-            conversation_data['topic'],
-            conversation_data['message_count'],
-            len(conversation_data['corrections']),
-            json.dumps(conversation_data['messages']),
-            json.dumps(conversation_data['corrections']),
-            conversation_data.get('file_path', '')
-        ))
-        
-        conv_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
-        return True, conv_id
+        committed = writer.submit(lambda conn: insert_conversation(conversation_data, user_id, conn=conn))
     except Exception as e:
-        return False, str(e)
+        return False, str(e) or "file d'écriture saturée"
+    saved = Future()
+    def after_commit(f):
+        # Étape base de données = délai jusqu'à l'acquittement (COMMIT), pas la mise en file
+        telemetry.record("db_save", (time.perf_counter() - start) * 1000,
+                         payload_in=payload_in, ok=f.exception() is None)
+        if f.exception() is not None:
+            saved.set_exception(f.exception())
+            return
+        # Vecteurs calculés hors de la transaction et du thread écrivain
+        # (l'index se reconstruit depuis la base : python semantic_index.py build)
+        semantic_index.index_later(user_id, f.result(), index_text)
+        success_file, result = save_conversation(conversation_data)
+        if success_file:
+            saved.set_result(f.result())
+        else:
+            saved.set_exception(OSError(f"fichier JSON non écrit: {result}"))
+
+    committed.add_done_callback(after_commit)
+    return True, saved
 
 def load_from_database():
     """Charge toutes les conversations depuis la base de données"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, title, date_created, level, topic, message_count, 
-                   correction_count, messages_json, corrections_json, file_path
-            FROM conversations
-            ORDER BY date_modified DESC
-        """)
-        
-        conversations = []
-        for row in cursor.fetchall():
-            conversations.append({
-                'id': row[0],
-                'title': row[1],
-                'date': row[2],
-                'level': row[3],
-                'topic': row[4],
-                'message_count': row[5],
-                'correction_count': row[6],
-                'messages': json.loads(row[7]),
-                'corrections': json.loads(row[8]),
-                'file_path': row[9]
-            })
-        
-        conn.close()
+        with telemetry.stage("db_load") as record:
+            conversations = fetch_conversations(current_user)
+            record['payload_out'] = len(conversations)
         return conversations
     except Exception as e:
         st.error(f"Erreur de chargement DB: {e}")
         return []
 
-def delete_from_database(conv_id):
-    """Supprime une conversation de la base de données"""
+def delete_from_database(conv_id, file_path=None):
+    """Met en file la suppression d'une conversation (base puis fichier); retourne le future ou None
+
+    Le fichier n'est supprimé qu'après le COMMIT, hors de la transaction.
+    """
+    user_id = current_user
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM conversations WHERE id = ?", (conv_id,))
-        conn.commit()
-        conn.close()
-        return True
+        future = writer.submit(lambda conn: delete_conversation_record(conv_id, user_id, conn=conn))
     except Exception as e:
         st.error(f"Erreur de suppression: {e}")
-        return False
+        return None
+    def after_commit(f):
+        if f.exception() is None:
+            if file_path:
+                Path(file_path).unlink(missing_ok=True)
+            semantic_index.remove_later(user_id, conv_id)
+
+    future.add_done_callback(after_commit)
+    return future
+
+def track_write(label, future, conv_id=None):
+    """Suit une écriture en file jusqu'à son acquittement (notifiée à l'exécution suivante)"""
+    st.session_state.pending_writes.append({'label': label, 'future': future, 'conv_id': conv_id})
 
-def get_statistics():
-    """Récupère les statistiques globales"""
+def report_finished_writes():
+    """Affiche le résultat des écritures terminées et retire-les du suivi"""
+    pending = []
+    for write in st.session_state.pending_writes:
+        future = write['future']
+        if not future.done():
+            pending.append(write)
+        elif future.exception():
+            st.toast(f"❌ {write['label']}: {future.exception()}")
+        else:
+            result = future.result()
+            st.toast(f"✅ {write['label']}" + (f" (ID: {result})" if result is not None else ""))
+    st.session_state.pending_writes = pending
+
+def get_statistics(user_id, days=30):
+    """Récupère les statistiques d'un utilisateur (timeline sur `days` jours, tout l'historique si None)"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Stats globales
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total_conversations,
-                SUM(message_count) as total_messages,
-                SUM(correction_count) as total_corrections,
-                COUNT(DISTINCT level) as levels_practiced,
-                COUNT(DISTINCT topic) as topics_practiced
-            FROM conversations
-        """)
-        
-        stats = cursor.fetchone()
-        
-        # Stats par niveau
-        cursor.execute("""
-            SELECT level, COUNT(*) as count, SUM(message_count) as messages
-            FROM conversations
-            GROUP BY level
-        """)
-        level_stats = cursor.fetchall()
-        
-        # Stats par sujet
-        cursor.execute("""
-            SELECT topic, COUNT(*) as count
-            FROM conversations
-            GROUP BY topic
-            ORDER BY count DESC
-            LIMIT 10
-        """)
-        topic_stats = cursor.fetchall()
-        
-        # Stats temporelles (derniers 30 jours)
-        cursor.execute("""
-            SELECT DATE(date_created) as date, COUNT(*) as count, SUM(message_count) as messages
-            FROM conversations
-            WHERE date_created >= date('now', '-30 days')
-            GROUP BY DATE(date_created)
-            ORDER BY date
-        """)
-        time_stats = cursor.fetchall()
-        
-        conn.close()
-        
-        return {
-            'global': stats,
-            'by_level': level_stats,
-            'by_topic': topic_stats,
-            'timeline': time_stats
-        }
+        return fetch_statistics(days, user_id)
     except Exception as e:
         st.error(f"Erreur stats: {e}")
         return None
 
+def get_error_categories(user_id, days=90):
+    """Récupère les catégories d'erreurs les plus fréquentes sur une période"""
+    try:
+        return fetch_error_categories(days, user_id)
+    except Exception as e:
+        st.error(f"Erreur stats corrections: {e}")
+        return []
+
+# Nombre maximal de points affichés dans les courbes avant agrégation
+MAX_TIMELINE_POINTS = 120
+
+def get_data_version():
+    """Empreinte peu coûteuse des données affichées dans les statistiques"""
+    try:
+        return fetch_data_version(current_user)
+    except sqlite3.Error:
+        return datetime.now().isoformat()
+
+def aggregate_timeline(df, max_points=MAX_TIMELINE_POINTS):
+    """Agrège une série journalière par semaine, mois ou trimestre si elle est trop longue"""
+    if len(df) <= max_points:
+        return df, "jour"
+    series = df.assign(Date=pd.to_datetime(df['Date'])).set_index('Date')
+    for freq, unit in (("W", "semaine"), ("MS", "mois"), ("QS", "trimestre")):
+        aggregated = series.resample(freq).sum().reset_index()
+        if len(aggregated) <= max_points:
+            break
+    return aggregated, unit
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def build_statistics_figures(data_version, today, days, user_id):
+    """Construit les graphiques une seule fois par version des données
+
+    Les figures sont mises en cache sous forme JSON ; `data_version` et `today`
+    ne servent que de clé de cache. Toutes les lectures passent `user_id` : le
+    corps ne doit dépendre d'aucune variable globale absente de la clé.
+    """
+    stats = get_statistics(user_id, days)
+    if not stats or stats['global'][0] == 0:
+        return None
+    
+    figures = {}
+    
+    if stats['by_level']:
+        level_df = pd.DataFrame(stats['by_level'], columns=['Niveau', 'Conversations', 'Messages'])
+        figures['level'] = px.bar(level_df, x='Niveau', y='Conversations', 
+                                  color='Messages', color_continuous_scale='Blues').to_json()
+    
+    if stats['by_topic']:
+        topic_df = pd.DataFrame(stats['by_topic'], columns=['Sujet', 'Conversations'])
+        figures['topic'] = px.pie(topic_df, names='Sujet', values='Conversations').to_json()
+    
+    timeline_unit = "jour"
+    if stats['timeline']:
+        time_df = pd.DataFrame(stats['timeline'], columns=['Date', 'Conversations', 'Messages'])
+        time_df, timeline_unit = aggregate_timeline(time_df)
+        fig_time = go.Figure()
+        fig_time.add_trace(go.Scatter(x=time_df['Date'], y=time_df['Conversations'],
+                                      mode='lines+markers', name='Conversations'))
+        figures['timeline'] = fig_time.to_json()
+    
+    error_categories = get_error_categories(user_id, 90)
+    if error_categories:
+        category_df = pd.DataFrame(error_categories, columns=['Catégorie', 'Corrections'])
+        figures['categories'] = px.bar(category_df, x='Corrections', y='Catégorie', orientation='h').to_json()
+    
+    vocabulary_size = 0
+    vocabulary_growth = get_vocabulary_growth(user_id)
+    if vocabulary_growth:
+        growth_df = pd.DataFrame(vocabulary_growth, columns=['Date', 'Nouveaux mots'])
+        growth_df, _ = aggregate_timeline(growth_df)
+        growth_df['Mots différents'] = growth_df['Nouveaux mots'].cumsum()
+        vocabulary_size = int(growth_df['Mots différents'].iloc[-1])
+        figures['vocabulary'] = px.line(growth_df, x='Date', y='Mots différents', markers=True).to_json()
+        
+        top_words_df = pd.DataFrame(get_top_words(15, user_id=user_id), columns=['Mot', 'Occurrences'])
+        fig_words = px.bar(top_words_df, x='Occurrences', y='Mot', orientation='h')
+        fig_words.update_layout(yaxis={'categoryorder': 'total ascending'})
+        figures['top_words'] = fig_words.to_json()
+    
+    return {
+        'global': stats['global'],
+        'figures': figures,
+        'timeline_unit': timeline_unit,
+        'vocabulary_size': vocabulary_size
+    }
+
 # Initialiser la base de données au démarrage
 init_database()
 
@@ -225,18 +288,22 @@ def load_saved_conversations():
     return conversations
 
 # Fonction pour sauvegarder une conversation
+def conversation_file_path(title):
+    """Chemin unique du fichier JSON d'une conversation"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).strip()
+    safe_title = safe_title.replace(' ', '_')[:50]  # Limiter la longueur
+    return SAVE_DIR / f"{timestamp}_{safe_title}.json"
+
 def save_conversation(conversation_data):
     """Sauvegarde une conversation dans un fichier JSON"""
     try:
-        # Créer un nom de fichier unique
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_title = "".join(c for c in conversation_data['title'] if c.isalnum() or c in (' ', '-', '_')).strip()
-        safe_title = safe_title.replace(' ', '_')[:50]  # Limiter la longueur
-        filename = f"{timestamp}_{safe_title}.json"
-        file_path = SAVE_DIR / filename
-        
-        # Ajouter le chemin du fichier
-        conversation_data['file_path'] = str(file_path)
+        # Chemin déjà choisi par l'appelant, sinon un nom de fichier unique
+        if conversation_data.get('file_path'):
+            file_path = Path(conversation_data['file_path'])
+        else:
+            file_path = conversation_file_path(conversation_data['title'])
+            conversation_data['file_path'] = str(file_path)
         
         # Sauvegarder
         with open(file_path, 'w', encoding='utf-8') as f:
@@ -256,6 +323,142 @@ def delete_conversation(file_path):
         st.error(f"Erreur lors de la suppression: {e}")
         return False
 
+# Instantanés de session (reprise après rafraîchissement)
+def remember_audio(index, text, voice, audio_bytes):
+    """Garde le clip d'un message en session et sa référence dans le cache disque"""
+    st.session_state[f"audio_{index}"] = audio_bytes
+    st.session_state.audio_refs[str(index)] = snapshots.audio_key(text, voice)
+
+def clear_session_audio():
+    """Oublie les clips de la conversation précédente (les index de messages repartent de zéro)"""
+    for key in [key for key in st.session_state if str(key).startswith("audio_") and key != "audio_processed"]:
+        del st.session_state[key]
+    st.session_state.audio_refs = {}
+
+def restore_snapshot(snapshot):
+    """Restaure la conversation en cours; l'audio est relu à la demande depuis le cache"""
+    st.session_state.messages = snapshot['messages']
+    st.session_state.corrections = snapshot['corrections']
+    st.session_state.conversation_count = snapshot['conversation_count']
+    st.session_state.conversation_title = snapshot['conversation_title']
+    st.session_state.current_file_path = snapshot['current_file_path']
+    started = snapshot.get('conversation_started')
+    st.session_state.conversation_started = datetime.fromisoformat(started) if started else None
+    st.session_state.turn_durations = snapshot.get('turn_durations', [])
+    st.session_state.audio_refs = snapshot.get('audio_refs', {})
+    st.session_state.snapshot_fingerprint = snapshot_fingerprint()
+
+def snapshot_fingerprint():
+    """Résumé peu coûteux de l'état : l'instantané n'est réécrit que s'il change"""
+    return (len(st.session_state.messages), len(st.session_state.corrections),
+            st.session_state.conversation_count, st.session_state.conversation_title,
+            st.session_state.current_file_path, len(st.session_state.audio_refs))
+
+def persist_session_snapshot():
+    """Met en file l'instantané de la session (les écritures rapprochées sont fusionnées)"""
+    fingerprint = snapshot_fingerprint()
+    if fingerprint == st.session_state.snapshot_fingerprint:
+        return
+    st.session_state.snapshot_fingerprint = fingerprint
+    started = st.session_state.conversation_started
+    state = {
+        'messages': list(st.session_state.messages),
+        'corrections': list(st.session_state.corrections),
+        'conversation_count': st.session_state.conversation_count,
+        'conversation_title': st.session_state.conversation_title,
+        'current_file_path': st.session_state.current_file_path,
+        'conversation_started': started.isoformat() if started else None,
+        'turn_durations': list(st.session_state.turn_durations),
+        'audio_refs': dict(st.session_state.audio_refs),
+    }
+    try:
+        writer.submit(lambda conn, token=session_token, user_id=current_user:
+                      snapshots.save_snapshot(token, state, user_id, conn=conn),
+                      coalesce_key=f"snapshot:{session_token}")
+    except Exception:
+        pass
+
+# Révision espacée : corrections passées à pratiquer pendant la conversation
+REVIEW_BATCH = 20
+REVIEW_IN_PROMPT = 3
+
+def load_review_queue():
+    """Charge les éléments dus dans le tas de la session
+
+    La synchronisation avec les corrections est mise en file une fois par session,
+    sans l'attendre : les éléments dus sont lus tout de suite, puis relus quand elle
+    est acquittée (refresh_review_queue).
+    """
+    try:
+        if st.session_state.review_sync is None:
+            st.session_state.review_sync = writer.submit(
+                lambda conn, user_id=current_user: review.sync_from_corrections(user_id, conn=conn)
+            )
+        st.session_state.review_queue = review.ReviewQueue(review.due_items(current_user, REVIEW_BATCH))
+    except Exception as e:
+        st.error(f"Erreur de révision: {e}")
+        st.session_state.review_queue = review.ReviewQueue()
+
+def refresh_review_queue():
+    """Relit les éléments dus une fois la synchronisation acquittée (jamais bloquant)"""
+    sync = st.session_state.review_sync
+    if st.session_state.review_synced or sync is None or not sync.done():
+        return
+    st.session_state.review_synced = True
+    if sync.exception():
+        st.error(f"Erreur de révision: {sync.exception()}")
+    elif sync.result():
+        load_review_queue()
+
+def review_prompt_items():
+    """Corrections à faire pratiquer dans ce tour (tuple pour le cache des prompts)"""
+    queue = st.session_state.review_queue
+    if not review_mode or not queue:
+        return ()
+    return tuple((item['original'], item['corrected'], item['category']) for item in queue.peek(REVIEW_IN_PROMPT))
+
+# Panneau de profilage (?profile=1), affiché en fin d'exécution
+def render_profile_panel():
+    """Termine le profil de l'exécution et affiche le classement des sections"""
+    profile = profiling.finish_run()
+    if not profile:
+        return
+    
+    with st.expander(f"🐞 Profil de l'exécution ({profile.total_ms:.0f} ms)"):
+        sections_df = pd.DataFrame(profile.ranked_sections())
+        sections_df['%'] = (sections_df['ms'] / profile.total_ms * 100).round(1)
+        sections_df = sections_df.rename(columns={
+            'section': 'Section', 'ms': 'Temps (ms)',
+            'alloc_kb': 'Alloué (Ko)', 'peak_kb': 'Pic (Ko)'
+        }).round(1)
+        if not profile.memory:
+            sections_df = sections_df.drop(columns=['Alloué (Ko)', 'Pic (Ko)'])
+        st.dataframe(sections_df, hide_index=True, use_container_width=True)
+        
+        if profile.function_stats:
+            st.code(profile.function_stats, language=None)
+        st.caption(f"Les {profiling.MAX_PROFILES} derniers profils sont gardés dans {profiling.PROFILE_DIR}/")
+
+# Reprise de la session après rafraîchissement ou reconnexion (une seule lecture)
+if "messages" not in st.session_state:
+    st.session_state.audio_refs = {}
+    st.session_state.snapshot_fingerprint = None
+    if new_session:
+        # Nettoyage occasionnel des sessions abandonnées et des clips inutilisés
+        try:
+            writer.submit(lambda conn: snapshots.prune_snapshots(conn=conn))
+        except Exception:
+            pass
+        snapshots.prune_audio_cache_later()
+    else:
+        try:
+            snapshot = snapshots.load_snapshot(session_token, current_user)
+        except Exception:
+            snapshot = None
+        if snapshot:
+            restore_snapshot(snapshot)
+            st.toast("♻️ Conversation en cours restaurée")
+
 # Initialisation de la session
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -269,9 +472,39 @@ if "conversation_title" not in st.session_state:
     st.session_state.conversation_title = ""
 if "current_file_path" not in st.session_state:
     st.session_state.current_file_path = None
+if "conversation_started" not in st.session_state:
+    st.session_state.conversation_started = None
+if "turn_durations" not in st.session_state:
+    st.session_state.turn_durations = []
+if "pending_writes" not in st.session_state:
+    st.session_state.pending_writes = []
+if "hf_prompt_builder" not in st.session_state:
+    st.session_state.hf_prompt_builder = HFPromptBuilder()
+if "speculation" not in st.session_state:
+    st.session_state.speculation = None
+if "prefetch_saved" not in st.session_state:
+    st.session_state.prefetch_saved = []
+if "processed_inputs" not in st.session_state:
+    st.session_state.processed_inputs = {}
+if "review_queue" not in st.session_state:
+    st.session_state.review_queue = None
+if "index_rebuild" not in st.session_state:
+    st.session_state.index_rebuild = None
+if "review_sync" not in st.session_state:
+    st.session_state.review_sync = None
+if "review_synced" not in st.session_state:
+    st.session_state.review_synced = False
+
+# Résultat des sauvegardes et suppressions faites en arrière-plan
+report_finished_writes()
 
 # Charger les conversations sauvegardées au démarrage
+profiling.mark("db_load")
 saved_conversations = load_from_database()
+# Masquer les conversations dont la suppression est encore en file
+pending_deletes = {w['conv_id'] for w in st.session_state.pending_writes if w['conv_id'] is not None}
+if pending_deletes:
+    saved_conversations = [c for c in saved_conversations if c['id'] not in pending_deletes]
 
 # Titre et description
 st.title("🗣️ English Conversation Practice")
@@ -283,13 +516,34 @@ api_key = ""
 enable_tts = True
 voice_choice = "nova"
 auto_play = True
+enable_prefetch = prefetch.ENABLED_BY_DEFAULT
+review_mode = False
 level = "Intermédiaire (B1-B2)"
 selected_topic = "Libre"
 
 # Sidebar pour les paramètres
+profiling.mark("sidebar")
 with st.sidebar:
     st.header("⚙️ Paramètres")
     
+    # Profil (identifiant de l'utilisateur dans l'URL)
+    if MULTI_USER:
+        st.caption(f"👤 Profil : `{current_user}` — gardez ce lien pour retrouver vos conversations")
+    else:
+        profile_input = st.text_input(
+            "👤 Profil",
+            value=current_user,
+            help="Vos conversations et statistiques sont rangées sous cet identifiant (lettres, chiffres, - et _). "
+                 "Ce n'est pas un mot de passe : toute personne qui saisit le même identifiant voit ces données.",
+            key="profile_input"
+        )
+        if profile_input != current_user:
+            if USER_ID_PATTERN.match(profile_input):
+                st.query_params["user"] = profile_input
+                st.rerun()
+            else:
+                st.error("⚠️ Identifiant invalide")
+    
     # Navigation par onglets
     tab = st.radio(
         "Navigation",
@@ -387,6 +641,13 @@ with st.sidebar:
                 key="auto_play_option"
             )
         
+        enable_prefetch = st.checkbox(
+            "⚡ Préparation anticipée",
+            value=prefetch.ENABLED_BY_DEFAULT,
+            help="Prépare le tour suivant pendant que vous réfléchissez (connexions, audio de la question)",
+            key="enable_prefetch"
+        )
+        
         # Niveau d'anglais
         level = st.selectbox(
             "Votre niveau d'anglais",
@@ -403,6 +664,17 @@ with st.sidebar:
         ]
         selected_topic = st.selectbox("Choisir un sujet", ["Libre"] + topics, key="topic_selection")
         
+        # Révision espacée des corrections passées
+        review_mode = st.checkbox(
+            "🔁 Réviser mes erreurs",
+            help="L'IA oriente la conversation pour vous faire pratiquer vos corrections à revoir",
+            key="review_mode"
+        )
+        if review_mode and st.session_state.review_queue is None:
+            load_review_queue()
+        if review_mode:
+            refresh_review_queue()
+        
         # Statistiques de session
         st.subheader("📊 Session actuelle")
         st.metric("Messages envoyés", st.session_state.conversation_count)
@@ -415,16 +687,26 @@ with st.sidebar:
             st.session_state.audio_processed = False
             st.session_state.conversation_title = ""
             st.session_state.current_file_path = None
+            st.session_state.conversation_started = None
+            st.session_state.turn_durations = []
+            clear_session_audio()
             st.rerun()
     
     # Onglet Statistiques
     elif tab == "📊 Statistiques":
+        profiling.mark("sidebar_statistiques")
         st.subheader("📈 Vos statistiques")
         
-        stats = get_statistics()
+        periods = {"30 derniers jours": 30, "12 derniers mois": 365, "Tout l'historique": None}
+        period = st.selectbox("Période", list(periods.keys()), key="stats_period")
         
-        if stats and stats['global'][0] > 0:
+        stats = build_statistics_figures(
+            get_data_version(), datetime.now().strftime("%Y-%m-%d"), periods[period], current_user
+        )
+        
+        if stats:
             total_conv, total_msg, total_corr, levels, topics = stats['global']
+            figures = stats['figures']
             
             # Métriques principales
             col1, col2 = st.columns(2)
@@ -436,28 +718,37 @@ with st.sidebar:
                 st.metric("Sujets explorés", topics)
             
             # Graphique par niveau
-            if stats['by_level']:
+            if 'level' in figures:
                 st.markdown("**📊 Par niveau**")
-                level_df = pd.DataFrame(stats['by_level'], columns=['Niveau', 'Conversations', 'Messages'])
-                fig_level = px.bar(level_df, x='Niveau', y='Conversations', 
-                                  color='Messages', color_continuous_scale='Blues')
-                st.plotly_chart(fig_level, use_container_width=True)
+                st.plotly_chart(pio.from_json(figures['level']), use_container_width=True)
             
             # Top sujets
-            if stats['by_topic']:
+            if 'topic' in figures:
                 st.markdown("**🎯 Sujets favoris**")
-                topic_df = pd.DataFrame(stats['by_topic'], columns=['Sujet', 'Conversations'])
-                fig_topic = px.pie(topic_df, names='Sujet', values='Conversations')
-                st.plotly_chart(fig_topic, use_container_width=True)
+                st.plotly_chart(pio.from_json(figures['topic']), use_container_width=True)
             
             # Timeline
-            if stats['timeline']:
-                st.markdown("**📅 Activité (30 derniers jours)**")
-                time_df = pd.DataFrame(stats['timeline'], columns=['Date', 'Conversations', 'Messages'])
-                fig_time = go.Figure()
-                fig_time.add_trace(go.Scatter(x=time_df['Date'], y=time_df['Conversations'],
-                                              mode='lines+markers', name='Conversations'))
-                st.plotly_chart(fig_time, use_container_width=True)
+            if 'timeline' in figures:
+                st.markdown(f"**📅 Activité ({period.lower()}, par {stats['timeline_unit']})**")
+                st.plotly_chart(pio.from_json(figures['timeline']), use_container_width=True)
+            
+            # Catégories d'erreurs
+            if 'categories' in figures:
+                st.markdown("**🧩 Erreurs fréquentes (90 derniers jours)**")
+                st.plotly_chart(pio.from_json(figures['categories']), use_container_width=True)
+            
+            # Vocabulaire
+            if 'vocabulary' in figures:
+                st.markdown("**📖 Vocabulaire**")
+                st.metric("Mots différents utilisés", stats['vocabulary_size'])
+                st.plotly_chart(pio.from_json(figures['vocabulary']), use_container_width=True)
+                st.plotly_chart(pio.from_json(figures['top_words']), use_container_width=True)
+            
+            if st.button("🔄 Reconstruire l'index du vocabulaire", use_container_width=True):
+                with st.spinner("Analyse de l'historique..."):
+                    entries = rebuild_lexicon(current_user)
+                st.success(f"✅ {entries} mots indexés")
+                st.rerun()
             
             # Calcul de la moyenne
             if total_conv > 0:
@@ -481,11 +772,8 @@ with st.sidebar:
     
     # Onglet Sauvegardes
     elif tab == "💾 Sauvegardes":
-        # Sauvegarde de conversation
-        st.subheader("💾 Sauvegarder")
-    
-    # Onglet Sauvegardes
-    elif tab == "💾 Sauvegardes":
+        profiling.mark("sidebar_sauvegardes")
+        
         # Sauvegarde de conversation
         st.subheader("💾 Sauvegarder")
         
@@ -512,21 +800,14 @@ with st.sidebar:
                             "message_count": st.session_state.conversation_count
                         }
                         
-                        # Sauvegarder dans le fichier
-                        success_file, result = save_conversation(conversation_data)
+                        # Base puis fichier, écrits en arrière-plan
+                        queued, result = save_to_database(conversation_data)
                         
-                        # Sauvegarder dans la base de données
-                        if success_file:
-                            conversation_data['file_path'] = str(result)
-                            success_db, conv_id = save_to_database(conversation_data)
-                            
-                            if success_db:
-                                st.session_state.conversation_title = conv_title
-                                st.session_state.current_file_path = str(result)
-                                st.success(f"✅ Sauvegardé (ID: {conv_id})")
-                                st.rerun()
-                            else:
-                                st.warning(f"⚠️ Fichier sauvegardé mais erreur DB: {conv_id}")
+                        if queued:
+                            track_write(f"Sauvegardé « {conv_title} »", result)
+                            st.session_state.conversation_title = conv_title
+                            st.session_state.current_file_path = conversation_data['file_path']
+                            st.rerun()
                         else:
                             st.error(f"❌ Erreur: {result}")
                     else:
@@ -557,20 +838,57 @@ with st.sidebar:
         st.divider()
         
         # Historique des conversations
+        profiling.mark("sidebar_historique")
         if len(saved_conversations) > 0:
             st.subheader(f"📚 Historique ({len(saved_conversations)})")
             
             # Option de recherche
             search_term = st.text_input("🔍 Rechercher", placeholder="Titre ou sujet...", key="search_conversations")
+            if semantic_index.semantic_model_available():
+                semantic_label = "🧠 Recherche par sens"
+                semantic_help = "Trouve les conversations où vous avez parlé de ce thème, même sans le mot exact"
+            else:
+                semantic_label = "🔤 Recherche approchée"
+                semantic_help = ("Cherche dans vos messages, pas seulement le titre. Installez "
+                                 "sentence-transformers pour une recherche par sens.")
+            semantic_search = st.checkbox(semantic_label, help=semantic_help, key="semantic_search")
             
             # Filtrer les conversations
-            filtered_convs = saved_conversations
-            if search_term:
-                filtered_convs = [
-                    conv for conv in saved_conversations 
-                    if search_term.lower() in conv['title'].lower() 
-                    or search_term.lower() in conv.get('topic', '').lower()
-                ]
+            if semantic_search and search_term:
+                index = semantic_index.VectorIndex(current_user)
+                rebuild = st.session_state.index_rebuild
+                if rebuild and rebuild['future'].done():
+                    st.session_state.index_rebuild = None
+                    if rebuild['future'].exception():
+                        st.error(f"Erreur d'indexation: {rebuild['future'].exception()}")
+                    else:
+                        st.toast(f"🧠 {rebuild['future'].result()} conversation(s) indexée(s)")
+                    rebuild = None
+                index_meta = index.meta()
+                if rebuild:
+                    # Indexation en arrière-plan (même thread que les mises à jour de l'index)
+                    done, expected = rebuild['done'], rebuild['expected']
+                    st.progress(min(1.0, done / expected) if expected else 0.0,
+                                text=f"Indexation des conversations... {done}/{expected or '?'}")
+                    st.button("🔄 Actualiser", key="refresh_semantic_index")
+                    filtered_convs = []
+                elif not index_meta or index_meta['count'] == 0:
+                    st.info("L'index de recherche n'existe pas encore pour cet historique")
+                    if st.button("🧠 Construire l'index", key="build_semantic_index"):
+                        rebuild = {'done': 0, 'expected': 0}
+                        rebuild['future'] = semantic_index.rebuild_later(
+                            current_user, progress=lambda done, expected: rebuild.update(done=done, expected=expected)
+                        )
+                        st.session_state.index_rebuild = rebuild
+                        st.rerun()
+                    filtered_convs = []
+                else:
+                    with telemetry.stage("semantic_search", model=index_meta['model']):
+                        matches = index.search(search_term, k=20)[0]
+                    by_id = {conv['id']: conv for conv in saved_conversations}
+                    filtered_convs = [by_id[conv_id] for conv_id, _ in matches if conv_id in by_id]
+            else:
+                filtered_convs = search_conversations(saved_conversations, search_term)
             
             st.caption(f"Affichage: {len(filtered_convs)} conversation(s)")
             
@@ -597,6 +915,9 @@ with st.sidebar:
                             st.session_state.conversation_count = conv.get('message_count', len(conv['messages']))
                             st.session_state.conversation_title = conv['title']
                             st.session_state.current_file_path = conv.get('file_path')
+                            st.session_state.conversation_started = None
+                            st.session_state.turn_durations = []
+                            clear_session_audio()
                             st.rerun()
                     
                     with col2:
@@ -611,22 +932,61 @@ with st.sidebar:
                     
                     with col3:
                         if st.button("🗑️", key=f"delete_{conv['id']}"):
-                            # Supprimer de la BD
-                            if delete_from_database(conv['id']):
-                                # Supprimer le fichier si existe
-                                if conv.get('file_path') and Path(conv['file_path']).exists():
-                                    delete_conversation(conv['file_path'])
+                            # Supprimer de la BD et le fichier (en arrière-plan)
+                            future = delete_from_database(conv['id'], conv.get('file_path'))
+                            if future:
+                                track_write(f"Supprimée « {conv['title']} »", future, conv['id'])
                                 
                                 # Si on supprime la conversation actuelle
                                 if is_current:
                                     st.session_state.current_file_path = None
                                 
-                                st.success("✅ Supprimée")
                                 st.rerun()
         else:
             st.info("📚 Aucune conversation sauvegardée")
+        
+        st.divider()
+        
+        # Import en masse (restauration de sauvegardes)
+        st.subheader("📥 Importer")
+        uploaded_files = st.file_uploader(
+            "Fichiers JSON ou archive ZIP",
+            type=["json", "zip"],
+            accept_multiple_files=True,
+            key="import_files"
+        )
+        
+        col_imp1, col_imp2 = st.columns(2)
+        import_sources = None
+        with col_imp1:
+            if st.button("📥 Importer", use_container_width=True, disabled=not uploaded_files):
+                import_sources = uploaded_files
+        with col_imp2:
+            if st.button("📂 Dossier local", use_container_width=True, help=f"Importer {SAVE_DIR}/*.json"):
+                import_sources = [SAVE_DIR]
+        
+        if import_sources:
+            import_progress = st.progress(0.0, text="Import en cours...")
+            # Analyse dans le thread du script : pas de pool de processus dans le serveur Streamlit
+            report = import_conversations(
+                import_sources,
+                user_id=current_user,
+                workers=1,
+                progress=lambda r: import_progress.progress(
+                    1.0, text=f"{r['files']} fichiers - {r['rate']:.0f} fichiers/s"
+                )
+            )
+            st.success(
+                f"✅ {report['imported']} importée(s), {report['duplicates']} doublon(s) "
+                f"en {report['elapsed']:.2f}s ({report['rate']:.0f} fichiers/s)"
+            )
+            for error in report['errors'][:10]:
+                st.warning(f"⚠️ {error}")
+            if report['imported']:
+                st.rerun()
 
 # Vérification de la clé API
+profiling.mark("page")
 if not api_key:
     st.warning("⚠️ Veuillez entrer votre clé API gratuite dans la barre latérale (onglet 💬 Conversation).")
     st.warning("⚠️ Veuillez entrer votre clé API gratuite dans la barre latérale pour commencer.")
@@ -669,41 +1029,15 @@ if not api_key:
         5. Copiez-le dans la barre latérale
         """)
     
+    telemetry.finish_run()
+    render_profile_panel()
     st.stop()
 
-# Système de prompt pour l'IA
-def get_system_prompt(level, topic):
-    level_instructions = {
-        "Débutant (A1-A2)": "Use simple vocabulary and short sentences. Speak slowly and clearly.",
-        "Intermédiaire (B1-B2)": "Use everyday vocabulary with some idioms. Encourage natural conversation.",
-        "Avancé (C1-C2)": "Use advanced vocabulary and complex structures. Challenge the learner."
-    }
-    
-    topic_instruction = f" Focus the conversation on {topic}." if topic != "Libre" else ""
-    
-    return f"""You are a friendly English conversation partner helping a French speaker practice English.
-
-Level: {level}
-Instructions: {level_instructions[level]}{topic_instruction}
-
-Your role:
-1. Have natural, friendly conversations like a friend would
-2. Ask follow-up questions to keep the conversation flowing
-3. If the user makes grammatical errors, gently correct them by:
-   - First responding naturally to their message
-   - Then adding a helpful note like "💡 Petite correction: instead of 'I go yesterday', say 'I went yesterday'"
-4. Encourage the user and be supportive
-5. Keep responses concise (2-4 sentences typically)
-6. Use casual, friendly language
-7. Show interest in what they say
-
-Remember: You're a conversation partner, not a strict teacher. Make it fun and natural!"""
-
 # Fonction pour transcrire l'audio avec Groq Whisper
 def transcribe_audio_groq(audio_bytes, api_key):
     """Transcrit l'audio avec Groq Whisper"""
     try:
-        url = "https://api.groq.com/openai/v1/audio/transcriptions"
+        url = f"{GROQ_BASE_URL}/audio/transcriptions"
         
         headers = {
             "Authorization": f"Bearer {api_key}"
@@ -715,9 +1049,12 @@ def transcribe_audio_groq(audio_bytes, api_key):
             "language": (None, "en")
         }
         
-        response = requests.post(url, headers=headers, files=files, timeout=30)
-        response.raise_for_status()
-        return response.json()["text"]
+        with telemetry.stage("stt", model="whisper-large-v3", payload_in=len(audio_bytes)) as record:
+            response = prefetch.http.post(url, headers=headers, files=files, timeout=30)
+            response.raise_for_status()
+            text = response.json()["text"]
+            record['payload_out'] = len(text)
+        return text
     
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 401:
@@ -749,16 +1086,36 @@ def transcribe_audio_browser():
     """)
 
 # Fonction pour générer l'audio avec OpenAI TTS (compatible Groq)
-def text_to_speech(text, api_key, voice="nova"):
-    """Utilise l'API OpenAI TTS (gratuit avec certains services ou limité)"""
-    try:
-        # Pour une solution 100% gratuite, on utilise gTTS via web
-        # Mais avec Groq, on peut aussi utiliser leur endpoint TTS s'ils en ont un
-        
-        # Alternative gratuite : Google TTS via gTTS
-        from gtts import gTTS
-        import io
-        
+def synthesize_speech(text, voice="nova"):
+    """Synthèse vocale sans affichage (utilisable hors du script, ex. préparation anticipée)
+
+    Un clip déjà synthétisé (même texte, même voix) est relu depuis le cache disque.
+    """
+    cache_key = snapshots.audio_key(text, voice)
+    audio_bytes = snapshots.load_audio(cache_key)
+    if audio_bytes is None:
+        audio_bytes = _synthesize(text, voice)
+        if audio_bytes:
+            snapshots.store_audio(cache_key, audio_bytes)
+    return audio_bytes
+
+def _synthesize(text, voice):
+    # Service TTS configuré (serveur simulé pour les tests hors ligne)
+    if TTS_BASE_URL:
+        with telemetry.stage("tts", model="tts_base_url", payload_in=len(text)) as record:
+            response = prefetch.http.post(TTS_BASE_URL, params={"text": text, "voice": voice}, timeout=30)
+            response.raise_for_status()
+            record['payload_out'] = len(response.content)
+        return response.content
+    
+    # Pour une solution 100% gratuite, on utilise gTTS via web
+    # Mais avec Groq, on peut aussi utiliser leur endpoint TTS s'ils en ont un
+    
+    # Alternative gratuite : Google TTS via gTTS
+    from gtts import gTTS
+    import io
+    
+    with telemetry.stage("tts", model="gtts", payload_in=len(text)) as record:
         # Créer l'audio
         tts = gTTS(text=text, lang='en', slow=False)
         
@@ -766,8 +1123,15 @@ def text_to_speech(text, api_key, voice="nova"):
         audio_buffer = io.BytesIO()
         tts.write_to_fp(audio_buffer)
         audio_buffer.seek(0)
-        
-        return audio_buffer.read()
+        audio_bytes = audio_buffer.read()
+        record['payload_out'] = len(audio_bytes)
+    
+    return audio_bytes
+
+def text_to_speech(text, api_key, voice="nova"):
+    """Utilise l'API OpenAI TTS (gratuit avec certains services ou limité)"""
+    try:
+        return synthesize_speech(text, voice)
     
     except ImportError:
         # Si gTTS n'est pas disponible, on essaie l'API OpenAI (payante mais compatible)
@@ -777,6 +1141,54 @@ def text_to_speech(text, api_key, voice="nova"):
         st.error(f"Erreur TTS: {str(e)}")
         return None
 
+# Préparation anticipée du tour suivant (connexions, audio de la question de relance)
+def provider_urls():
+    """Points d'accès appelés au prochain tour"""
+    urls = [GROQ_BASE_URL if service == "Groq (Recommandé)" else HF_BASE_URL]
+    if enable_tts and TTS_BASE_URL:
+        urls.append(TTS_BASE_URL)
+    return urls
+
+def start_prefetch():
+    """Lance la préparation après une réponse (une seule fois par réponse)"""
+    speculation = st.session_state.speculation
+    key = len(st.session_state.messages)
+    if speculation and speculation.key == key:
+        return
+    if speculation:
+        speculation.cancel()
+    voice = voice_choice if enable_tts else "nova"
+    st.session_state.speculation = prefetch.start(
+        key, provider_urls(),
+        question=prefetch.follow_up_question(st.session_state.messages[-1]["content"]) if enable_tts else None,
+        synthesize=lambda text: synthesize_speech(text, voice),
+        modules=("gtts",) if enable_tts and not TTS_BASE_URL else ()
+    )
+
+def record_prefetch_savings():
+    """Une vraie entrée arrive : annule la préparation et enregistre la latence économisée"""
+    speculation = st.session_state.speculation
+    if not speculation:
+        return
+    st.session_state.speculation = None
+    saved = prefetch.consume(speculation, provider_urls())
+    for source, saved_ms in saved:
+        telemetry.record("prefetch_saved", saved_ms, model=source)
+    if saved:
+        st.session_state.prefetch_saved.append(sum(saved_ms for _, saved_ms in saved))
+
+# Idempotence des entrées (réservées en session avant d'être ajoutées à la conversation) :
+# un même texte renvoyé dans les idempotency.INPUT_WINDOW_S secondes est un double envoi,
+# un même enregistrement du micro n'est traité qu'une fois.
+def claim_input(kind, content):
+    """Réserve une entrée ("text" ou "audio"); retourne False si c'est un doublon"""
+    window = None if kind == "audio" else idempotency.INPUT_WINDOW_S
+    if idempotency.claim_input(st.session_state.processed_inputs, kind, content, window):
+        return True
+    telemetry.record("dedup_input", 0, model=kind)
+    st.toast("⏭️ Entrée déjà traitée, ignorée")
+    return False
+
 # Fonction pour créer un lecteur audio HTML5
 def create_audio_player(audio_bytes, auto_play=True):
     """Crée un lecteur audio HTML5 avec les données audio"""
@@ -793,8 +1205,10 @@ def create_audio_player(audio_bytes, auto_play=True):
     return None
 
 # Fonction pour appeler l'API Groq
-def call_groq_api(messages, api_key, system_prompt):
-    url = "https://api.groq.com/openai/v1/chat/completions"
+def call_groq_api(messages, api_key, system_prompt, route=None):
+    """Appelle le modèle choisi par le routage (grand modèle par défaut)"""
+    route = route or {'route': 'large', **routing.ROUTES['large']}
+    url = f"{GROQ_BASE_URL}/chat/completions"
     
     headers = {
         "Authorization": f"Bearer {api_key}",
@@ -805,30 +1219,45 @@ def call_groq_api(messages, api_key, system_prompt):
     api_messages.extend(messages)
     
     data = {
-        "model": "llama-3.3-70b-versatile",
+        "model": route["model"],
         "messages": api_messages,
         "temperature": 0.7,
-        "max_tokens": 1000
+        "max_tokens": route["max_tokens"]
     }
     
-    response = requests.post(url, headers=headers, json=data)
-    response.raise_for_status()
-    return response.json()["choices"][0]["message"]["content"]
+    response = None
+    start = time.perf_counter()
+    try:
+        with telemetry.stage("llm", model=data["model"], payload_in=len(json.dumps(data))) as record:
+            response = prefetch.http.post(url, headers=headers, json=data)
+            response.raise_for_status()
+            result = response.json()
+            content = result["choices"][0]["message"]["content"]
+            usage = result.get("usage", {})
+            record.update(payload_out=len(content),
+                          tokens_in=usage.get("prompt_tokens"),
+                          tokens_out=usage.get("completion_tokens"))
+    except Exception:
+        routing.record_call(route['route'], (time.perf_counter() - start) * 1000, ok=False,
+                            status=response.status_code if response is not None else None,
+                            headers=response.headers if response is not None else None)
+        raise
+    routing.record_call(route['route'], (time.perf_counter() - start) * 1000,
+                        tokens_in=usage.get("prompt_tokens"), tokens_out=usage.get("completion_tokens"),
+                        headers=response.headers)
+    return content
 
 # Fonction pour appeler l'API Hugging Face
-def call_huggingface_api(messages, api_key, system_prompt):
-    url = "https://api-inference.huggingface.co/models/meta-llama/Meta-Llama-3-8B-Instruct"
+def call_huggingface_api(messages, api_key, system_prompt, builder=None):
+    url = f"{HF_BASE_URL}/models/meta-llama/Meta-Llama-3-8B-Instruct"
     
     headers = {
         "Authorization": f"Bearer {api_key}",
         "Content-Type": "application/json"
     }
     
-    full_prompt = system_prompt + "\n\n"
-    for msg in messages:
-        role = "User" if msg["role"] == "user" else "Assistant"
-        full_prompt += f"{role}: {msg['content']}\n"
-    full_prompt += "Assistant:"
+    # Seuls les nouveaux messages sont formatés à chaque tour
+    full_prompt = (builder or HFPromptBuilder()).build(system_prompt, messages)
     
     data = {
         "inputs": full_prompt,
@@ -839,46 +1268,69 @@ def call_huggingface_api(messages, api_key, system_prompt):
         }
     }
     
-    response = requests.post(url, headers=headers, json=data)
-    response.raise_for_status()
-    result = response.json()
-    
-    if isinstance(result, list) and len(result) > 0:
-        return result[0].get("generated_text", "")
-    return ""
-
-# Fonction pour analyser les corrections
-def extract_corrections(response_text):
-    if "💡" in response_text or "correction" in response_text.lower():
-        lines = response_text.split("\n")
-        for line in lines:
-            if "💡" in line or "correction" in line.lower():
-                return line.strip()
-    return None
+    with telemetry.stage("llm", model="meta-llama/Meta-Llama-3-8B-Instruct",
+                         payload_in=len(full_prompt)) as record:
+        response = prefetch.http.post(url, headers=headers, json=data)
+        response.raise_for_status()
+        result = response.json()
+        
+        generated_text = ""
+        if isinstance(result, list) and len(result) > 0:
+            generated_text = result[0].get("generated_text", "")
+        record['payload_out'] = len(generated_text)
+    return generated_text
 
 # Fonction pour traiter un message (texte ou audio)
 def process_message(user_input):
     if not user_input or user_input.strip() == "":
         return
     
+    # Historique avant ce tour : avec la nouvelle entrée, il forme la clé d'idempotence de la réponse
+    prior_history = [{"role": msg["role"], "content": msg["content"]} for msg in st.session_state.messages]
+    
     # Ajouter le message de l'utilisateur
     st.session_state.messages.append({"role": "user", "content": user_input})
     st.session_state.conversation_count += 1
+    if st.session_state.conversation_started is None:
+        st.session_state.conversation_started = datetime.now()
+    
+    # Mettre à jour l'index du vocabulaire (en arrière-plan, sans attendre)
+    try:
+        writer.submit(lambda conn, text=user_input, level=level, user_id=current_user:
+                      update_lexicon(text, level, user_id=user_id, conn=conn))
+    except Exception:
+        pass
     
     # Préparer les messages pour l'API
-    api_messages = [
-        {"role": msg["role"], "content": msg["content"]}
-        for msg in st.session_state.messages
-    ]
+    api_messages = prior_history + [{"role": "user", "content": user_input}]
     
     # Obtenir la réponse de l'IA
     try:
-        system_prompt = get_system_prompt(level, selected_topic)
+        system_prompt = get_system_prompt(level, selected_topic, review_prompt_items())
         
         if service == "Groq (Recommandé)":
-            assistant_message = call_groq_api(api_messages, api_key, system_prompt)
+            # Petit modèle pour les tours simples, grand modèle quand c'est utile
+            recent_corrections = sum(
+                1 for c in st.session_state.corrections
+                if (c.get('turn') or 0) >= len(st.session_state.messages) - 6
+            )
+            route = routing.choose_route(level, user_input, recent_corrections)
+            ask = lambda: call_groq_api(api_messages, api_key, system_prompt, route)
+            model, max_tokens = route['model'], route['max_tokens']
         else:
-            assistant_message = call_huggingface_api(api_messages, api_key, system_prompt)
+            builder = st.session_state.hf_prompt_builder
+            ask = lambda: call_huggingface_api(api_messages, api_key, system_prompt, builder)
+            model, max_tokens = "meta-llama/Meta-Llama-3-8B-Instruct", None
+        
+        # Une requête identique de cette session déjà en cours ou traitée récemment
+        # (exécution du script rejouée) n'est pas renvoyée au modèle
+        response_key = idempotency.request_key(session_token, {
+            'service': service, 'model': model, 'max_tokens': max_tokens,
+            'system': system_prompt, 'history': prior_history, 'input': user_input
+        })
+        assistant_message, status = idempotency.responses.run(response_key, ask)
+        if status != 'new':
+            telemetry.record("dedup_llm", 0, model=status)
         
         # Sauvegarder la réponse
         st.session_state.messages.append({
@@ -887,14 +1339,23 @@ def process_message(user_input):
         })
         
         # Extraire et sauvegarder les corrections
-        correction = extract_corrections(assistant_message)
-        if correction:
+        new_corrections = extract_corrections(assistant_message)
+        for correction in new_corrections:
             st.session_state.corrections.append({
                 "timestamp": datetime.now().strftime("%H:%M"),
                 "user_message": user_input,
-                "correction": correction
+                "turn": len(st.session_state.messages) - 1,
+                **correction
             })
         
+        # Les nouvelles erreurs (ou rechutes) deviennent dues en révision
+        if new_corrections:
+            try:
+                writer.submit(lambda conn, items=new_corrections, user_id=current_user:
+                              review.schedule_corrections(items, user_id, conn=conn))
+            except Exception:
+                pass
+        
         return assistant_message
         
     except requests.exceptions.HTTPError as e:
@@ -913,6 +1374,7 @@ def process_message(user_input):
 st.subheader("💬 Conversation")
 
 # Afficher l'historique des messages
+profiling.mark("chat_history_audio")
 for i, msg in enumerate(st.session_state.messages):
     with st.chat_message(msg["role"]):
         st.write(msg["content"])
@@ -922,20 +1384,42 @@ for i, msg in enumerate(st.session_state.messages):
             # Créer une clé unique pour chaque message
             audio_key = f"audio_{i}"
             
+            # Clip référencé par l'instantané de session : relu depuis le cache disque
+            audio_ref = st.session_state.audio_refs.get(str(i))
+            if audio_key not in st.session_state and audio_ref:
+                cached_audio = snapshots.load_audio(audio_ref)
+                if cached_audio:
+                    st.session_state[audio_key] = cached_audio
+            
             # Vérifier si l'audio existe déjà dans la session
             if audio_key not in st.session_state:
                 with st.spinner("🔊 Génération audio..."):
-                    audio_bytes = text_to_speech(msg["content"], api_key, voice_choice if 'voice_choice' in locals() else "nova")
+                    voice = voice_choice if 'voice_choice' in locals() else "nova"
+                    audio_bytes = text_to_speech(msg["content"], api_key, voice)
                     if audio_bytes:
-                        st.session_state[audio_key] = audio_bytes
+                        remember_audio(i, msg["content"], voice, audio_bytes)
             
             # Afficher le lecteur audio
             if audio_key in st.session_state:
                 audio_html = create_audio_player(st.session_state[audio_key], auto_play=False)
                 if audio_html:
                     st.markdown(audio_html, unsafe_allow_html=True)
+            
+            # Question de relance seule, synthétisée pendant la préparation anticipée
+            speculation = st.session_state.speculation
+            if speculation and speculation.key == i + 1:
+                prepared = speculation.result("tts_question")
+                if prepared:
+                    st.caption("🔁 Réécouter la question")
+                    audio_html = create_audio_player(prepared[0], auto_play=False)
+                    if audio_html:
+                        st.markdown(audio_html, unsafe_allow_html=True)
+                    if speculation.take("tts_question"):
+                        telemetry.record("prefetch_saved", prepared[1], model="tts_question")
+                        st.session_state.prefetch_saved.append(prepared[1])
 
 # Section d'entrée avec micro et texte
+profiling.mark("input_processing")
 col1, col2 = st.columns([3, 1])
 
 with col1:
@@ -952,7 +1436,10 @@ with col2:
     )
 
 # Traiter l'entrée texte
-if user_input:
+if user_input and claim_input("text", user_input):
+    telemetry.start_turn()
+    record_prefetch_savings()
+    
     with st.chat_message("user"):
         st.write(user_input)
     
@@ -966,11 +1453,11 @@ if user_input:
                 # Générer et jouer l'audio
                 if enable_tts:
                     with st.spinner("🔊 Génération audio..."):
-                        audio_bytes = text_to_speech(assistant_response, api_key, voice_choice if 'voice_choice' in locals() else "nova")
+                        voice = voice_choice if 'voice_choice' in locals() else "nova"
+                        audio_bytes = text_to_speech(assistant_response, api_key, voice)
                         if audio_bytes:
                             # Sauvegarder dans la session
-                            audio_key = f"audio_{len(st.session_state.messages)-1}"
-                            st.session_state[audio_key] = audio_bytes
+                            remember_audio(len(st.session_state.messages) - 1, assistant_response, voice, audio_bytes)
                             
                             # Afficher le lecteur
                             audio_html = create_audio_player(audio_bytes, auto_play=auto_play if 'auto_play' in locals() else True)
@@ -978,14 +1465,24 @@ if user_input:
                                 st.markdown(audio_html, unsafe_allow_html=True)
 
 # Traiter l'entrée audio
-if audio and not st.session_state.audio_processed:
+audio_input_key = idempotency.audio_key(current_user, audio['bytes']) if audio else None
+recorder_event = (audio.get('id') or audio_input_key) if audio else None
+if audio and not st.session_state.audio_processed and claim_input("audio", recorder_event):
+    telemetry.start_turn()
+    record_prefetch_savings()
+    
     with st.spinner("🎤 Transcription en cours..."):
         try:
             audio_bytes = audio['bytes']
             
             if service == "Groq (Recommandé)":
                 try:
-                    transcription = transcribe_audio_groq(audio_bytes, api_key)
+                    # Même enregistrement déjà transcrit ou en cours : pas de second appel
+                    transcription, status = idempotency.transcriptions.run(
+                        audio_input_key, lambda: transcribe_audio_groq(audio_bytes, api_key)
+                    )
+                    if status != 'new':
+                        telemetry.record("dedup_stt", 0, model=status)
                 except Exception as e:
                     st.error(f"❌ {str(e)}")
                     transcribe_audio_browser()
@@ -1010,10 +1507,11 @@ if audio and not st.session_state.audio_processed:
                             # Générer et jouer l'audio
                             if enable_tts:
                                 with st.spinner("🔊 Génération audio..."):
-                                    audio_bytes_response = text_to_speech(assistant_response, api_key, voice_choice if 'voice_choice' in locals() else "nova")
+                                    voice = voice_choice if 'voice_choice' in locals() else "nova"
+                                    audio_bytes_response = text_to_speech(assistant_response, api_key, voice)
                                     if audio_bytes_response:
-                                        audio_key = f"audio_{len(st.session_state.messages)-1}"
-                                        st.session_state[audio_key] = audio_bytes_response
+                                        remember_audio(len(st.session_state.messages) - 1, assistant_response,
+                                                       voice, audio_bytes_response)
                                         audio_html = create_audio_player(audio_bytes_response, auto_play=auto_play if 'auto_play' in locals() else True)
                                         if audio_html:
                                             st.markdown(audio_html, unsafe_allow_html=True)
@@ -1022,11 +1520,19 @@ if audio and not st.session_state.audio_processed:
             st.error(f"❌ Erreur inattendue: {str(e)}")
             st.info("💡 Essayez de taper votre message à la place, ou vérifiez votre clé API Groq.")
 
+# Préparer le tour suivant pendant que l'utilisateur réfléchit
+if enable_prefetch and st.session_state.messages and st.session_state.messages[-1]["role"] == "assistant":
+    start_prefetch()
+elif not enable_prefetch and st.session_state.speculation:
+    st.session_state.speculation.cancel()
+    st.session_state.speculation = None
+
 # Réinitialiser le flag audio après traitement
 if st.session_state.audio_processed:
     st.session_state.audio_processed = False
 
 # Afficher les corrections récentes dans un expander
+profiling.mark("summary_help")
 if st.session_state.corrections:
     with st.expander("📝 Corrections récentes"):
         for corr in reversed(st.session_state.corrections[-5:]):
@@ -1034,15 +1540,51 @@ if st.session_state.corrections:
             st.markdown(f"{corr['correction']}")
             st.divider()
 
+# Révision espacée : éléments en cours de pratique et notation
+if review_mode and st.session_state.review_queue is not None:
+    review_queue = st.session_state.review_queue
+    with st.expander(f"🔁 Révision ({len(review_queue)} à pratiquer)", expanded=bool(review_queue)):
+        if not review_queue:
+            st.info("🎉 Rien à réviser pour le moment")
+            if st.button("🔄 Recharger", key="review_reload"):
+                load_review_queue()
+                st.rerun()
+        for item in review_queue.peek(REVIEW_IN_PROMPT):
+            st.markdown(f"**[{item['category']}]** ~~{item['original']}~~ → **{item['corrected']}**")
+            col_r1, col_r2, col_r3 = st.columns(3)
+            for column, label, quality in ((col_r1, "😣 Oublié", 1), (col_r2, "🙂 Difficile", 3),
+                                           (col_r3, "😎 Facile", 5)):
+                if column.button(label, key=f"review_{item['id']}_{quality}", use_container_width=True):
+                    review_queue.remove(item['id'])
+                    try:
+                        writer.submit(lambda conn, item=item, quality=quality, user_id=current_user:
+                                      review.grade(item, quality, user_id, conn=conn))
+                    except Exception as e:
+                        st.error(f"Erreur de révision: {e}")
+                    st.rerun()
+            st.divider()
+
 # Résumé de la conversation actuelle
 if len(st.session_state.messages) > 0:
     with st.expander("📊 Résumé de cette conversation"):
+        if st.session_state.conversation_started:
+            elapsed = int((datetime.now() - st.session_state.conversation_started).total_seconds())
+            duration_text = f"{elapsed // 60} min {elapsed % 60:02d} s"
+        else:
+            duration_text = "non mesurée (conversation rechargée)"
+        turn_durations = st.session_state.turn_durations
+        response_text = f"{sum(turn_durations) / len(turn_durations) / 1000:.1f} s" if turn_durations else "—"
+        prefetch_saved = st.session_state.prefetch_saved
+        if prefetch_saved:
+            response_text += f" (préparation anticipée : {sum(prefetch_saved):.0f} ms économisées au total)"
+        
         st.markdown(f"""
         - **Messages échangés:** {len(st.session_state.messages)} ({len([m for m in st.session_state.messages if m['role'] == 'user'])} de vous)
         - **Corrections reçues:** {len(st.session_state.corrections)}
         - **Niveau:** {level}
         - **Sujet:** {selected_topic}
-        - **Durée approximative:** ~{len(st.session_state.messages) * 30} secondes
+        - **Durée:** {duration_text}
+        - **Temps de réponse moyen:** {response_text}
         """)
         
         if not st.session_state.conversation_title:
@@ -1109,6 +1651,78 @@ with st.expander("ℹ️ Comment utiliser cette application"):
     - 🔢 Moyennes de messages et corrections par conversation
     """)
 
+# Panneau de performance (admin): ENGLISH_TUTOR_ADMIN=1 ou ?admin=1
+profiling.mark("admin_telemetry")
+if os.environ.get("ENGLISH_TUTOR_ADMIN") == "1" or st.query_params.get("admin") == "1":
+    with st.expander("🛠️ Performance (admin)"):
+        metrics_days = st.slider("Fenêtre (jours)", 1, 90, 7, key="metrics_days")
+        latency = telemetry.get_latency_percentiles(metrics_days)
+        if latency:
+            latency_df = pd.DataFrame([
+                {'Étape': name, 'Mesures': values['count'], 'p50 (ms)': round(values['p50']),
+                 'p95 (ms)': round(values['p95']), 'p99 (ms)': round(values['p99']),
+                 'Jetons générés': values['tokens_out']}
+                for name, values in sorted(latency.items())
+            ])
+            st.dataframe(latency_df, hide_index=True, use_container_width=True)
+            st.download_button(
+                label="📥 Export Prometheus",
+                data=telemetry.export_prometheus(metrics_days),
+                file_name="english_tutor_metrics.prom",
+                mime="text/plain"
+            )
+        else:
+            st.info("Aucune mesure enregistrée sur cette période")
+        
+        # Pseudo-étapes : latence économisée par la préparation, entrées dédoublonnées
+        events = telemetry.get_events(metrics_days)
+        if events:
+            st.markdown("**⚡ Préparation anticipée et dédoublonnage**")
+            st.dataframe(pd.DataFrame([
+                {'Événement': name, 'Détail': detail, 'Nombre': values['count'],
+                 'Économisé (ms)': round(values['total_ms'])}
+                for (name, detail), values in sorted(events.items())
+            ]), hide_index=True, use_container_width=True)
+        
+        # Routage des modèles (depuis le démarrage du serveur)
+        st.markdown(f"**🧭 Routage des modèles** (budget p95 {routing.LATENCY_BUDGET_MS:.0f} ms)")
+        routes_df = pd.DataFrame(routing.route_metrics())
+        routes_df['quota_left'] = (routes_df['quota_left'] * 100).round(0)
+        st.dataframe(routes_df.rename(columns={
+            'route': 'Route', 'model': 'Modèle', 'requests': 'Appels', 'errors': 'Erreurs',
+            'rate_limited': '429', 'p50_ms': 'p50 (ms)', 'p95_ms': 'p95 (ms)',
+            'tokens_in': 'Jetons entrée', 'tokens_out': 'Jetons sortie',
+            'quota_left': 'Quota restant (%)', 'remaining_tokens': 'Jetons restants'
+        }).round(0), hide_index=True, use_container_width=True)
+        
+        # Dédoublonnage des entrées (caches courts partagés)
+        dedup_df = pd.DataFrame([
+            {'Cache': 'Transcriptions', **idempotency.transcriptions.metrics()},
+            {'Cache': 'Réponses', **idempotency.responses.metrics()},
+        ]).rename(columns={'entries': 'Entrées', 'new': 'Appels', 'cached': 'Resservis', 'joined': 'Rejoints'})
+        st.markdown(f"**♻️ Dédoublonnage** (fenêtre {idempotency.TTL_S} s)")
+        st.dataframe(dedup_df, hide_index=True, use_container_width=True)
+        
+        # File d'écriture en arrière-plan
+        write_metrics = writer.metrics()
+        st.markdown("**💾 File d'écriture**")
+        col_w1, col_w2, col_w3, col_w4 = st.columns(4)
+        col_w1.metric("En file", f"{write_metrics['queue_depth']}/{write_metrics['queue_max']}")
+        col_w2.metric("Écrites", write_metrics['committed'], f"{write_metrics['failed']} échecs",
+                      delta_color="inverse")
+        col_w3.metric("Lot moyen", f"{write_metrics['avg_batch_size']:.1f}")
+        col_w4.metric("Acquittement p95", f"{write_metrics['ack_ms_p95']:.0f} ms")
+
+# Instantané de la session (reprise après rafraîchissement)
+persist_session_snapshot()
+
+# Fin de la mesure du tour en cours (inclut le rendu)
+finished_turn = telemetry.finish_run()
+if finished_turn:
+    st.session_state.turn_durations.append(
+        next(r['duration_ms'] for r in finished_turn.records if r['stage'] == 'total')
+    )
+
 # Footer
 st.markdown("---")
 st.markdown(
@@ -1118,3 +1732,5 @@ st.markdown(
     "</div>",
     unsafe_allow_html=True
 )
+
+render_profile_panel()
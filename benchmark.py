@@ -0,0 +1,336 @@
+"""Benchmarks des chemins critiques sur des historiques synthétiques.
+
+Usage:
+    python benchmark.py generate --conversations 100000 --db bench_100k.db
+    python benchmark.py run --sizes 1k,100k --output bench_results.json
+    python benchmark.py run --sizes 1k --baseline bench_baseline.json --threshold 1.25
+    python benchmark.py prompts --turns 50
+
+Les bases générées sont réutilisées d'une exécution à l'autre (bench_data/).
+Avec --baseline, le code de sortie vaut 1 si une opération est plus lente que
+baseline * threshold.
+"""
+import argparse
+import json
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from corrections import CORRECTION_FORMAT_INSTRUCTION
+from prompts import LEVEL_INSTRUCTIONS, get_system_prompt, HFPromptBuilder
+from database import (
+    init_database, conversation_hash, insert_conversation, fetch_conversations,
+    delete_conversation_record, fetch_statistics, fetch_error_categories,
+    fetch_data_version, search_conversations
+)
+
+BENCH_DIR = Path("bench_data")
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+LEVELS = ["Débutant (A1-A2)", "Intermédiaire (B1-B2)", "Avancé (C1-C2)"]
+TOPICS = ["Libre", "Daily routines", "Hobbies", "Travel", "Food & Cooking",
+          "Movies & TV", "Work & Career", "Family & Friends", "Weather", "Technology", "Sports"]
+WORDS = ("i you we they the a an is are was were have has had do did go went like love want "
+         "to of in on at for with about from my your our their this that what when where why how "
+         "today yesterday weekend work job family friend friends movie food travel city country "
+         "really very good great nice fun interesting think know usually sometimes often always "
+         "play watch read cook eat visit learn practice english french book music sport weather").split()
+CATEGORIES = ["grammar", "tense", "vocabulary", "spelling", "preposition", "article", "word_order"]
+
+
+def _sentence(rng, min_words, max_words):
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return " ".join(words).capitalize() + rng.choice([".", "?", "!"])
+
+
+def synthetic_conversation(rng, created):
+    """Conversation réaliste: 2 à 15 échanges, messages courts côté utilisateur"""
+    messages = []
+    corrections = []
+    for turn in range(rng.randint(2, 15)):
+        user = _sentence(rng, 4, 25)
+        messages.append({"role": "user", "content": user})
+        reply = " ".join(_sentence(rng, 6, 18) for _ in range(rng.randint(2, 4)))
+        if rng.random() < 0.3:
+            original, corrected = _sentence(rng, 3, 6), _sentence(rng, 3, 6)
+            category = rng.choice(CATEGORIES)
+            line = f"💡 Petite correction [{category}]: instead of '{original}', say '{corrected}'"
+            reply += "\n" + line
+            corrections.append({"timestamp": created.strftime("%H:%M"), "user_message": user,
+                                "turn": len(messages), "original": original, "corrected": corrected,
+                                "category": category, "correction": line})
+        messages.append({"role": "assistant", "content": reply})
+    return {
+        "title": f"{rng.choice(TOPICS)} {rng.randint(1, 10**6)}",
+        "date": created.strftime("%Y-%m-%d %H:%M:%S"),
+        "level": rng.choice(LEVELS),
+        "topic": rng.choice(TOPICS),
+        "messages": messages,
+        "corrections": corrections,
+        "message_count": len(messages) // 2,
+    }
+
+
+def generate_history(db_path, count, days=730, seed=42, batch_size=10_000):
+    """Crée une base conversations.db synthétique de `count` conversations sur `days` jours"""
+    db_path = Path(db_path)
+    if db_path.exists():
+        db_path.unlink()
+    init_database(db_path)
+    rng = random.Random(seed)
+    now = datetime.now()
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    produced = 0
+    while produced < count:
+        rows = []
+        correction_rows = []
+        for _ in range(min(batch_size, count - produced)):
+            created = now - timedelta(seconds=rng.randint(0, days * 86400))
+            conv = synthetic_conversation(rng, created)
+            produced += 1
+            rows.append((
+                produced, conv['title'], conv['date'], conv['date'], conv['level'], conv['topic'],
+                conv['message_count'], len(conv['corrections']), json.dumps(conv['messages']),
+                json.dumps(conv['corrections']), '', conversation_hash(conv)
+            ))
+            correction_rows.extend(
+                (produced, c['turn'], c['original'], c['corrected'], c['category'], conv['date'])
+                for c in conv['corrections']
+            )
+        with conn:
+            conn.executemany("""
+                INSERT INTO conversations
+                (id, title, date_created, date_modified, level, topic, message_count,
+                 correction_count, messages_json, corrections_json, file_path, content_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            conn.executemany("""
+                INSERT INTO corrections (conversation_id, turn, original, corrected, category, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, correction_rows)
+        print(f"\r🧪 {produced}/{count} conversations", end="", file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    conn.close()
+    return db_path
+
+
+def _time(func, repeat):
+    """Exécute `func` `repeat` fois; retourne les durées en secondes"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def run_benchmarks(db_path, repeat=3):
+    """Mesure chaque chemin critique sur une base existante"""
+    rng = random.Random(7)
+    conversations = fetch_conversations(db_path=db_path)
+
+    def save_delete():
+        # 20 sauvegardes unitaires puis suppressions, comme dans l'interface
+        ids = [insert_conversation(synthetic_conversation(rng, datetime.now()), db_path=db_path) for _ in range(20)]
+        for conv_id in ids:
+            delete_conversation_record(conv_id, db_path=db_path)
+
+    def export_json():
+        # L'onglet Sauvegardes sérialise chaque conversation pour son bouton de téléchargement
+        for conv in conversations:
+            json.dumps(conv, indent=2, ensure_ascii=False)
+
+    def simulated_rerun():
+        # Ce que fait une exécution du script avec l'onglet Sauvegardes ouvert
+        history = fetch_conversations(db_path=db_path)
+        fetch_data_version(db_path=db_path)
+        fetch_statistics(30, db_path=db_path)
+        fetch_error_categories(90, db_path=db_path)
+        for conv in search_conversations(history, ""):
+            json.dumps(conv, indent=2, ensure_ascii=False)
+
+    operations = {
+        'load_from_database': lambda: fetch_conversations(db_path=db_path),
+        'get_statistics': lambda: fetch_statistics(30, db_path=db_path),
+        'get_statistics_all': lambda: fetch_statistics(None, db_path=db_path),
+        'error_categories': lambda: fetch_error_categories(90, db_path=db_path),
+        'data_version': lambda: fetch_data_version(db_path=db_path),
+        'history_search': lambda: search_conversations(conversations, "travel"),
+        'save_delete_20': save_delete,
+        'json_export': export_json,
+        'simulated_rerun': simulated_rerun,
+    }
+
+    results = {}
+    for name, func in operations.items():
+        durations = _time(func, repeat)
+        results[name] = {
+            'median_s': statistics.median(durations),
+            'min_s': min(durations),
+            'max_s': max(durations),
+            'repeat': repeat,
+        }
+        print(f"   {name:<22} {results[name]['median_s'] * 1000:10.1f} ms", file=sys.stderr)
+    return results
+
+
+def _legacy_system_prompt(level, topic):
+    """Ancienne construction du prompt, refaite à chaque tour (référence)"""
+    topic_instruction = f" Focus the conversation on {topic}." if topic != "Libre" else ""
+    return f"""You are a friendly English conversation partner helping a French speaker practice English.
+
+Level: {level}
+Instructions: {LEVEL_INSTRUCTIONS[level]}{topic_instruction}
+
+Your role:
+1. Have natural, friendly conversations like a friend would
+2. Ask follow-up questions to keep the conversation flowing
+3. If the user makes grammatical errors, gently correct them by:
+   - First responding naturally to their message
+   - Then adding one note per error, on its own line, in exactly this format:
+     {CORRECTION_FORMAT_INSTRUCTION}
+     Example: "💡 Petite correction [tense]: instead of 'I go yesterday', say 'I went yesterday'"
+4. Encourage the user and be supportive
+5. Keep responses concise (2-4 sentences typically)
+6. Use casual, friendly language
+7. Show interest in what they say
+
+Remember: You're a conversation partner, not a strict teacher. Make it fun and natural!"""
+
+
+def _legacy_hf_prompt(system_prompt, messages):
+    """Ancienne concaténation de tout l'historique à chaque tour (référence)"""
+    full_prompt = system_prompt + "\n\n"
+    for msg in messages:
+        role = "User" if msg["role"] == "user" else "Assistant"
+        full_prompt += f"{role}: {msg['content']}\n"
+    full_prompt += "Assistant:"
+    return full_prompt
+
+
+def run_prompt_benchmarks(turns=50, conversations=200, repeat=3):
+    """Construction des prompts sur `conversations` conversations de `turns` tours, ancien vs nouveau"""
+    rng = random.Random(11)
+    histories = []
+    for _ in range(conversations):
+        conv = synthetic_conversation(rng, datetime.now())
+        messages = [{"role": "user" if i % 2 == 0 else "assistant", "content": _sentence(rng, 6, 40)}
+                    for i in range(turns * 2)]
+        histories.append((conv['level'], conv['topic'], messages))
+
+    def legacy():
+        for level, topic, messages in histories:
+            for turn in range(1, turns + 1):
+                _legacy_hf_prompt(_legacy_system_prompt(level, topic), messages[:turn * 2 - 1])
+
+    def compiled():
+        for level, topic, messages in histories:
+            builder = HFPromptBuilder()
+            for turn in range(1, turns + 1):
+                builder.build(get_system_prompt(level, topic), messages[:turn * 2 - 1])
+
+    # Les deux versions doivent produire le même texte de conversation
+    level, topic, messages = histories[0]
+    expected = _legacy_hf_prompt("", messages)
+    assert HFPromptBuilder().build("", messages) == expected
+
+    results = {}
+    for name, func in (('prompt_legacy', legacy), ('prompt_compiled', compiled)):
+        durations = _time(func, repeat)
+        results[name] = {'median_s': statistics.median(durations), 'min_s': min(durations),
+                         'max_s': max(durations), 'repeat': repeat}
+        print(f"   {name:<22} {results[name]['median_s'] * 1000:10.1f} ms", file=sys.stderr)
+    speedup = results['prompt_legacy']['median_s'] / results['prompt_compiled']['median_s']
+    print(f"   gain x{speedup:.1f} ({conversations} conversations de {turns} tours)", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Retourne la liste des régressions (taille, opération, ratio)"""
+    regressions = []
+    for size, operations in results['results'].items():
+        for name, values in operations.items():
+            reference = baseline.get('results', {}).get(size, {}).get(name)
+            if not reference or not reference['median_s']:
+                continue
+            ratio = values['median_s'] / reference['median_s']
+            values['baseline_ratio'] = ratio
+            if ratio > threshold:
+                regressions.append((size, name, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks des chemins critiques de l'application")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate = subparsers.add_parser("generate", help="Génère une base synthétique")
+    generate.add_argument("--conversations", type=int, default=1000)
+    generate.add_argument("--db", required=True)
+    generate.add_argument("--seed", type=int, default=42)
+
+    prompts = subparsers.add_parser("prompts", help="Micro-benchmark de la construction des prompts")
+    prompts.add_argument("--turns", type=int, default=50)
+    prompts.add_argument("--conversations", type=int, default=200)
+    prompts.add_argument("--repeat", type=int, default=3)
+
+    run = subparsers.add_parser("run", help="Exécute les benchmarks")
+    run.add_argument("--sizes", default="1k,100k", help=f"Tailles parmi {', '.join(SIZES)}")
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--output", default="bench_results.json")
+    run.add_argument("--baseline", help="Résultats de référence à comparer")
+    run.add_argument("--threshold", type=float, default=1.25, help="Ratio toléré avant régression")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        generate_history(args.db, args.conversations, seed=args.seed)
+        return
+    if args.command == "prompts":
+        print("⏱️ Construction des prompts", file=sys.stderr)
+        run_prompt_benchmarks(args.turns, args.conversations, args.repeat)
+        return
+
+    BENCH_DIR.mkdir(exist_ok=True)
+    results = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec="seconds"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sqlite': sqlite3.sqlite_version,
+        },
+        'results': {}
+    }
+    for size in args.sizes.split(","):
+        db_path = BENCH_DIR / f"bench_{size}.db"
+        if not db_path.exists():
+            generate_history(db_path, SIZES[size])
+        else:
+            init_database(db_path)
+        print(f"⏱️ {size} ({db_path})", file=sys.stderr)
+        results['results'][size] = run_benchmarks(db_path, args.repeat)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for size, name, ratio in regressions:
+            print(f"❌ Régression {size}/{name}: x{ratio:.2f}", file=sys.stderr)
+        exit_code = 1 if regressions else 0
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Résultats enregistrés dans {args.output}", file=sys.stderr)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
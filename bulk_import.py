@@ -0,0 +1,201 @@
+"""Import en masse des conversations sauvegardées (fichiers JSON ou archives d'export).
+
+Usage:
+    python bulk_import.py saved_conversations/ sauvegarde.zip --db conversations.db
+"""
+import argparse
+import io
+import json
+import os
+import sqlite3
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+
+from database import DB_PATH, DEFAULT_USER, conversation_hash, init_database
+
+# Nombre de fichiers analysés puis insérés par transaction
+BATCH_SIZE = 2000
+
+
+def iter_sources(paths):
+    """Parcourt les dossiers, fichiers JSON et archives ZIP sans tout charger en mémoire
+
+    Produit des tuples (nom, chemin, contenu) : les fichiers sur disque sont lus par
+    les processus d'analyse (contenu None), les membres d'archive sont lus ici.
+    Accepte aussi les fichiers téléversés via Streamlit (objets avec getvalue()).
+    """
+    for path in paths:
+        if hasattr(path, 'getvalue'):
+            data = path.getvalue()
+            if zipfile.is_zipfile(io.BytesIO(data)):
+                with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                    for member in archive.namelist():
+                        if member.endswith(".json"):
+                            yield f"{path.name}:{member}", None, archive.read(member)
+            else:
+                yield path.name, None, data
+            continue
+
+        path = Path(path)
+        if path.is_dir():
+            for file_path in sorted(path.glob("*.json")):
+                yield file_path.name, str(file_path), None
+        elif zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                for member in archive.namelist():
+                    if member.endswith(".json"):
+                        yield f"{path.name}:{member}", None, archive.read(member)
+        elif path.exists():
+            yield path.name, str(path), None
+
+
+def _conversation_row(conv, file_path, now, user_id):
+    """Convertit une conversation JSON en ligne pour la table conversations"""
+    messages = conv.get('messages')
+    if not isinstance(messages, list):
+        raise ValueError("champ 'messages' manquant ou invalide")
+    corrections = conv.get('corrections') or []
+    # Empreinte calculée avant la date par défaut : un fichier sans date garde la même
+    # empreinte d'un import à l'autre et n'est pas dupliqué
+    content_hash = conversation_hash(conv)
+    return (
+        user_id,
+        conv.get('title') or Path(file_path or 'conversation').stem,
+        conv.get('date') or now,
+        now,
+        conv.get('level', 'Non spécifié'),
+        conv.get('topic', 'Libre'),
+        conv.get('message_count', len([m for m in messages if m.get('role') == 'user'])),
+        len(corrections),
+        json.dumps(messages, ensure_ascii=False),
+        json.dumps(corrections, ensure_ascii=False),
+        file_path or '',
+        content_hash
+    )
+
+
+def parse_source(source):
+    """Analyse une source (exécuté dans un processus séparé)
+
+    Retourne (lignes, erreur). Un fichier peut contenir une conversation ou une liste
+    de conversations (export groupé).
+    """
+    name, file_path, data, user_id = source
+    try:
+        if data is None:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+        payload = json.loads(data.decode('utf-8'))
+        conversations = payload if isinstance(payload, list) else [payload]
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return [_conversation_row(conv, file_path, now, user_id) for conv in conversations], None
+    except Exception as e:
+        return [], f"{name}: {e}"
+
+
+def _insert_batch(conn, rows):
+    """Insère un lot dans une seule transaction et retourne le nombre de lignes ajoutées"""
+    before = conn.total_changes
+    with conn:
+        conn.executemany("""
+            INSERT OR IGNORE INTO conversations
+            (user_id, title, date_created, date_modified, level, topic, message_count,
+             correction_count, messages_json, corrections_json, file_path, content_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+    return conn.total_changes - before
+
+
+def import_conversations(paths, user_id=DEFAULT_USER, db_path=DB_PATH, workers=None,
+                         batch_size=BATCH_SIZE, progress=None):
+    """Importe des fichiers/archives de conversations d'un utilisateur avec dédoublonnage
+
+    `progress` est appelé après chaque lot avec le rapport courant.
+    Retourne un rapport: fichiers, importées, doublons, erreurs, durée, débit.
+    """
+    init_database(db_path)
+    workers = workers or os.cpu_count() or 1
+
+    report = {'files': 0, 'imported': 0, 'duplicates': 0, 'errors': [], 'elapsed': 0.0, 'rate': 0.0}
+    start = time.perf_counter()
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        sources = iter_sources(paths)
+        while True:
+            chunk = [source + (user_id,) for source in islice(sources, batch_size)]
+            if not chunk:
+                break
+
+            if executor:
+                results = executor.map(parse_source, chunk, chunksize=max(1, len(chunk) // (workers * 4)))
+            else:
+                results = map(parse_source, chunk)
+
+            rows = []
+            seen = set()
+            for parsed, error in results:
+                if error:
+                    report['errors'].append(error)
+                for row in parsed:
+                    # Doublons à l'intérieur du lot ; ceux déjà en base sont ignorés par l'index unique
+                    if row[-1] in seen:
+                        report['duplicates'] += 1
+                        continue
+                    seen.add(row[-1])
+                    rows.append(row)
+
+            inserted = _insert_batch(conn, rows)
+            report['files'] += len(chunk)
+            report['imported'] += inserted
+            report['duplicates'] += len(rows) - inserted
+            report['elapsed'] = time.perf_counter() - start
+            report['rate'] = report['files'] / report['elapsed'] if report['elapsed'] else 0.0
+
+            if progress:
+                progress(report)
+    finally:
+        if executor:
+            executor.shutdown()
+        conn.close()
+
+    report['elapsed'] = time.perf_counter() - start
+    report['rate'] = report['files'] / report['elapsed'] if report['elapsed'] else 0.0
+    return report
+
+
+def _print_progress(report):
+    print(f"\r📥 {report['files']} fichiers | {report['imported']} importées | "
+          f"{report['duplicates']} doublons | {len(report['errors'])} erreurs | "
+          f"{report['rate']:.0f} fichiers/s", end="", file=sys.stderr, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importe des conversations sauvegardées dans la base SQLite")
+    parser.add_argument("paths", nargs="+", help="Dossiers, fichiers JSON ou archives ZIP")
+    parser.add_argument("--db", default=str(DB_PATH), help="Chemin de la base SQLite")
+    parser.add_argument("--user", default=DEFAULT_USER, help="Utilisateur propriétaire des conversations")
+    parser.add_argument("--workers", type=int, default=None, help="Nombre de processus d'analyse")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Fichiers par transaction")
+    args = parser.parse_args()
+
+    report = import_conversations(args.paths, user_id=args.user, db_path=args.db, workers=args.workers,
+                                  batch_size=args.batch_size, progress=_print_progress)
+    print(file=sys.stderr)
+    for error in report['errors']:
+        print(f"⚠️ {error}", file=sys.stderr)
+    print(f"✅ {report['imported']} importées, {report['duplicates']} doublons, "
+          f"{len(report['errors'])} erreurs en {report['elapsed']:.2f}s ({report['rate']:.0f} fichiers/s)")
+
+
+if __name__ == "__main__":
+    main()
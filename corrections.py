@@ -0,0 +1,89 @@
+import re
+
+# Catégories d'erreurs reconnues (stockées dans la table corrections)
+CORRECTION_CATEGORIES = [
+    "grammar", "tense", "vocabulary", "spelling",
+    "preposition", "article", "word_order", "other"
+]
+
+# Format demandé au modèle pour chaque correction (une par ligne)
+CORRECTION_FORMAT_INSTRUCTION = (
+    "💡 Petite correction [category]: instead of 'wrong phrase', say 'correct phrase'\n"
+    f"   where category is one of: {', '.join(CORRECTION_CATEGORIES)}"
+)
+
+_QUOTE_OPEN = r"['\"‘“]"
+# Guillemet fermant: pas suivi d'une lettre, pour accepter les apostrophes (don't)
+_QUOTE_CLOSE = r"['\"’”](?![A-Za-z])"
+
+# Format structuré: "💡 ... [tense]: instead of 'I go yesterday', say 'I went yesterday'"
+_STRUCTURED_RE = re.compile(
+    r"💡[^\n\[]*\[(?P<category>[a-z_ ]+)\][^\n]*?instead of\s+" + _QUOTE_OPEN +
+    r"(?P<original>[^\n]+?)" + _QUOTE_CLOSE + r",?\s*(?:you )?(?:should )?say\s+" + _QUOTE_OPEN +
+    r"(?P<corrected>[^\n]+?)" + _QUOTE_CLOSE,
+    re.IGNORECASE
+)
+
+# Repli: "instead of 'X', say 'Y'" sans catégorie, uniquement sur une ligne marquée 💡
+_FALLBACK_RE = re.compile(
+    r"instead of\s+" + _QUOTE_OPEN + r"(?P<original>[^\n]+?)" + _QUOTE_CLOSE +
+    r",?\s*(?:you )?(?:should |could )?(?:say|use|write)\s+" + _QUOTE_OPEN +
+    r"(?P<corrected>[^\n]+?)" + _QUOTE_CLOSE,
+    re.IGNORECASE
+)
+
+_ARTICLES = {"a", "an", "the"}
+_PREPOSITIONS = {"in", "on", "at", "to", "for", "of", "with", "by", "from", "about", "into"}
+
+
+def _guess_category(original, corrected):
+    """Devine la catégorie d'une correction quand le modèle ne l'a pas fournie"""
+    before = original.lower().split()
+    after = corrected.lower().split()
+    if sorted(before) == sorted(after):
+        return "word_order"
+    removed = set(before) - set(after)
+    added = set(after) - set(before)
+    changed = removed | added
+    if changed and changed <= _ARTICLES:
+        return "article"
+    if changed and changed <= _PREPOSITIONS:
+        return "preposition"
+    if len(removed) == 1 and len(added) == 1:
+        old, new = next(iter(removed)), next(iter(added))
+        if old[:3] == new[:3] and abs(len(old) - len(new)) <= 2:
+            return "spelling" if len(old) == len(new) else "tense"
+        return "vocabulary"
+    return "grammar"
+
+
+def _normalize_category(category):
+    category = category.strip().lower().replace(" ", "_")
+    return category if category in CORRECTION_CATEGORIES else "other"
+
+
+def extract_corrections(response_text):
+    """Extrait les corrections d'une réponse de l'assistant
+
+    Retourne une liste de dictionnaires {original, corrected, category, correction}.
+    Le format structuré est essayé en premier, puis un repli sur les lignes 💡.
+    """
+    corrections = []
+    for line in response_text.split("\n"):
+        if "💡" not in line:
+            continue
+        match = _STRUCTURED_RE.search(line)
+        if match:
+            category = _normalize_category(match.group("category"))
+        else:
+            match = _FALLBACK_RE.search(line)
+            if not match:
+                continue
+            category = _guess_category(match.group("original"), match.group("corrected"))
+        corrections.append({
+            "original": match.group("original").strip(),
+            "corrected": match.group("corrected").strip(),
+            "category": category,
+            "correction": line.strip()
+        })
+    return corrections
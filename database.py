@@ -0,0 +1,454 @@
+import sqlite3
+import json
+import hashlib
+from datetime import datetime
+from pathlib import Path
+
+# Base de données SQLite
+DB_PATH = Path("conversations.db")
+
+# Utilisateur des données créées avant le cloisonnement par utilisateur
+DEFAULT_USER = "default"
+
+
+def conversation_hash(conversation_data):
+    """Calcule l'empreinte du contenu d'une conversation (utilisée pour le dédoublonnage)"""
+    payload = json.dumps({
+        'title': conversation_data.get('title', ''),
+        'date': conversation_data.get('date', ''),
+        'level': conversation_data.get('level', ''),
+        'topic': conversation_data.get('topic', ''),
+        'messages': conversation_data.get('messages', [])
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _column_names(cursor, table):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cursor.fetchall()}
+
+
+def insert_correction_rows(cursor, conversation_id, created_at, corrections, user_id=DEFAULT_USER):
+    """Insère les corrections structurées d'une conversation dans la table corrections"""
+    rows = [
+        (user_id, conversation_id, corr.get('turn'), corr['original'], corr['corrected'],
+         corr.get('category', 'other'), created_at)
+        for corr in corrections
+        if corr.get('original') and corr.get('corrected')
+    ]
+    cursor.executemany("""
+        INSERT INTO corrections (user_id, conversation_id, turn, original, corrected, category, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    return len(rows)
+
+
+# Initialiser la base de données
+def init_database(db_path=DB_PATH):
+    """Crée la base de données et les tables si elles n'existent pas"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            date_created TEXT NOT NULL,
+            date_modified TEXT NOT NULL,
+            level TEXT,
+            topic TEXT,
+            message_count INTEGER DEFAULT 0,
+            correction_count INTEGER DEFAULT 0,
+            messages_json TEXT,
+            corrections_json TEXT,
+            file_path TEXT,
+            content_hash TEXT,
+            user_id TEXT NOT NULL DEFAULT 'default'
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS statistics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            messages_sent INTEGER DEFAULT 0,
+            corrections_received INTEGER DEFAULT 0,
+            time_practiced INTEGER DEFAULT 0,
+            topics_practiced TEXT
+        )
+    """)
+
+    # Corrections structurées (une ligne par correction, indexée pour les statistiques)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS corrections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            conversation_id INTEGER NOT NULL,
+            turn INTEGER,
+            original TEXT,
+            corrected TEXT,
+            category TEXT NOT NULL DEFAULT 'other',
+            created_at TEXT NOT NULL,
+            user_id TEXT NOT NULL DEFAULT 'default'
+        )
+    """)
+
+    # Index du vocabulaire (mot -> occurrences, première/dernière utilisation, par utilisateur et niveau)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS lexicon (
+            user_id TEXT NOT NULL DEFAULT 'default',
+            word TEXT NOT NULL,
+            level TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            first_seen TEXT NOT NULL,
+            last_seen TEXT NOT NULL,
+            PRIMARY KEY (user_id, word, level)
+        )
+    """)
+
+    # Mesures de latence par étape (voir telemetry.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS turn_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            turn_id TEXT,
+            created_at TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            duration_ms REAL NOT NULL,
+            payload_in INTEGER,
+            payload_out INTEGER,
+            tokens_in INTEGER,
+            tokens_out INTEGER,
+            model TEXT,
+            ok INTEGER DEFAULT 1
+        )
+    """)
+
+    # Révision espacée des corrections (voir review.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS review_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL DEFAULT 'default',
+            original TEXT NOT NULL,
+            corrected TEXT NOT NULL,
+            category TEXT NOT NULL DEFAULT 'other',
+            ease REAL NOT NULL DEFAULT 2.5,
+            interval_days REAL NOT NULL DEFAULT 0,
+            repetitions INTEGER NOT NULL DEFAULT 0,
+            lapses INTEGER NOT NULL DEFAULT 0,
+            due_at TEXT NOT NULL,
+            last_reviewed TEXT,
+            UNIQUE (user_id, original, corrected)
+        )
+    """)
+
+    # Instantanés compressés des sessions en cours (voir snapshots.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS session_snapshots (
+            token TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL DEFAULT 'default',
+            updated_at TEXT NOT NULL,
+            payload BLOB NOT NULL
+        )
+    """)
+
+    # Points de reprise des traitements par lots (voir reanalyze.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_checkpoints (
+            job TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0,
+            processed INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL
+        )
+    """)
+
+    _migrate(cursor)
+
+    # Index (créés après les migrations qui ajoutent les colonnes)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_conversations_user_modified
+        ON conversations(user_id, date_modified)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_conversations_user_created
+        ON conversations(user_id, date_created)
+    """)
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_conversations_user_hash
+        ON conversations(user_id, content_hash) WHERE content_hash != ''
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_corrections_user_created_category
+        ON corrections(user_id, created_at, category)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_corrections_conversation
+        ON corrections(conversation_id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_lexicon_user_level_count
+        ON lexicon(user_id, level, count DESC)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_turn_metrics_created_stage
+        ON turn_metrics(created_at, stage)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_review_items_user_due
+        ON review_items(user_id, due_at)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_session_snapshots_updated
+        ON session_snapshots(updated_at)
+    """)
+
+    conn.commit()
+    conn.close()
+
+
+def _migrate(cursor):
+    """Met à niveau les bases créées par des versions précédentes"""
+    # Index remplacés par leurs équivalents préfixés par user_id
+    for index in ("idx_conversations_content_hash", "idx_conversations_date_modified",
+                  "idx_corrections_created_category", "idx_lexicon_level_count"):
+        cursor.execute(f"DROP INDEX IF EXISTS {index}")
+
+    conversation_columns = _column_names(cursor, 'conversations')
+    if 'content_hash' not in conversation_columns:
+        cursor.execute("ALTER TABLE conversations ADD COLUMN content_hash TEXT")
+    if 'user_id' not in conversation_columns:
+        cursor.execute(f"ALTER TABLE conversations ADD COLUMN user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER}'")
+    if 'user_id' not in _column_names(cursor, 'corrections'):
+        cursor.execute(f"ALTER TABLE corrections ADD COLUMN user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER}'")
+
+    # La clé primaire du vocabulaire inclut maintenant user_id : reconstruction de la table
+    if 'user_id' not in _column_names(cursor, 'lexicon'):
+        cursor.execute("ALTER TABLE lexicon RENAME TO lexicon_old")
+        cursor.execute("""
+            CREATE TABLE lexicon (
+                user_id TEXT NOT NULL DEFAULT 'default',
+                word TEXT NOT NULL,
+                level TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                first_seen TEXT NOT NULL,
+                last_seen TEXT NOT NULL,
+                PRIMARY KEY (user_id, word, level)
+            )
+        """)
+        cursor.execute(f"""
+            INSERT INTO lexicon (user_id, word, level, count, first_seen, last_seen)
+            SELECT '{DEFAULT_USER}', word, level, count, first_seen, last_seen FROM lexicon_old
+        """)
+        cursor.execute("DROP TABLE lexicon_old")
+
+    # Empreinte de contenu pour le dédoublonnage
+    cursor.execute("""
+        SELECT id, user_id, title, date_created, level, topic, messages_json
+        FROM conversations
+        WHERE content_hash IS NULL
+    """)
+    missing = cursor.fetchall()
+    if missing:
+        # Les doublons déjà présents gardent une empreinte vide pour ne pas bloquer l'index unique
+        cursor.execute("SELECT user_id, content_hash FROM conversations WHERE content_hash IS NOT NULL")
+        seen = set(cursor.fetchall())
+        updates = []
+        for row in missing:
+            digest = conversation_hash({
+                'title': row[2], 'date': row[3], 'level': row[4], 'topic': row[5],
+                'messages': json.loads(row[6] or '[]')
+            })
+            updates.append((digest if (row[1], digest) not in seen else '', row[0]))
+            seen.add((row[1], digest))
+        cursor.executemany("UPDATE conversations SET content_hash = ? WHERE id = ?", updates)
+
+
+# Accès aux données (sans Streamlit, pour l'application, les outils et les benchmarks)
+def insert_conversation(conversation_data, user_id=DEFAULT_USER, db_path=DB_PATH, conn=None):
+    """Insère une conversation et ses corrections; retourne son identifiant
+
+    Une conversation identique (même empreinte) n'est pas dupliquée. Avec `conn`,
+    l'écriture se fait dans la transaction de l'appelant (voir write_behind.py).
+    """
+    own_connection = conn is None
+    if own_connection:
+        conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    content_hash = conversation_hash(conversation_data)
+
+    cursor.execute("""
+        INSERT OR IGNORE INTO conversations
+        (user_id, title, date_created, date_modified, level, topic, message_count,
+         correction_count, messages_json, corrections_json, file_path, content_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        user_id,
+        conversation_data['title'],
+        conversation_data['date'],
+        now,
+        conversation_data['level'],
+        conversation_data['topic'],
+        conversation_data['message_count'],
+        len(conversation_data['corrections']),
+        json.dumps(conversation_data['messages']),
+        json.dumps(conversation_data['corrections']),
+        conversation_data.get('file_path', ''),
+        content_hash
+    ))
+
+    conv_id = cursor.lastrowid
+    if cursor.rowcount == 0:
+        # Conversation identique déjà en base
+        cursor.execute("SELECT id FROM conversations WHERE user_id = ? AND content_hash = ?",
+                       (user_id, content_hash))
+        conv_id = cursor.fetchone()[0]
+    else:
+        insert_correction_rows(cursor, conv_id, conversation_data['date'],
+                               conversation_data['corrections'], user_id)
+    if own_connection:
+        conn.commit()
+        conn.close()
+    return conv_id
+
+
+def fetch_conversations(user_id=DEFAULT_USER, db_path=DB_PATH):
+    """Charge les conversations d'un utilisateur, la plus récemment modifiée en premier"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, title, date_created, level, topic, message_count,
+               correction_count, messages_json, corrections_json, file_path
+        FROM conversations
+        WHERE user_id = ?
+        ORDER BY date_modified DESC
+    """, (user_id,))
+
+    conversations = []
+    for row in cursor.fetchall():
+        conversations.append({
+            'id': row[0],
+            'title': row[1],
+            'date': row[2],
+            'level': row[3],
+            'topic': row[4],
+            'message_count': row[5],
+            'correction_count': row[6],
+            'messages': json.loads(row[7]),
+            'corrections': json.loads(row[8]),
+            'file_path': row[9]
+        })
+
+    conn.close()
+    return conversations
+
+
+def delete_conversation_record(conv_id, user_id=DEFAULT_USER, db_path=DB_PATH, conn=None):
+    """Supprime une conversation de l'utilisateur et ses corrections"""
+    own_connection = conn is None
+    if own_connection:
+        conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM conversations WHERE id = ? AND user_id = ?", (conv_id, user_id))
+    if cursor.rowcount:
+        cursor.execute("DELETE FROM corrections WHERE conversation_id = ?", (conv_id,))
+    if own_connection:
+        conn.commit()
+        conn.close()
+
+
+def fetch_statistics(days=30, user_id=DEFAULT_USER, db_path=DB_PATH):
+    """Statistiques d'un utilisateur (timeline sur `days` jours, tout l'historique si None)"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+
+    # Stats globales
+    cursor.execute("""
+        SELECT
+            COUNT(*) as total_conversations,
+            SUM(message_count) as total_messages,
+            SUM(correction_count) as total_corrections,
+            COUNT(DISTINCT level) as levels_practiced,
+            COUNT(DISTINCT topic) as topics_practiced
+        FROM conversations
+        WHERE user_id = ?
+    """, (user_id,))
+    stats = cursor.fetchone()
+
+    # Stats par niveau
+    cursor.execute("""
+        SELECT level, COUNT(*) as count, SUM(message_count) as messages
+        FROM conversations
+        WHERE user_id = ?
+        GROUP BY level
+    """, (user_id,))
+    level_stats = cursor.fetchall()
+
+    # Stats par sujet
+    cursor.execute("""
+        SELECT topic, COUNT(*) as count
+        FROM conversations
+        WHERE user_id = ?
+        GROUP BY topic
+        ORDER BY count DESC
+        LIMIT 10
+    """, (user_id,))
+    topic_stats = cursor.fetchall()
+
+    # Stats temporelles
+    cursor.execute("""
+        SELECT DATE(date_created) as date, COUNT(*) as count, SUM(message_count) as messages
+        FROM conversations
+        WHERE user_id = ? AND (? IS NULL OR date_created >= date('now', ?))
+        GROUP BY DATE(date_created)
+        ORDER BY date
+    """, (user_id, days, f"-{days} days"))
+    time_stats = cursor.fetchall()
+
+    conn.close()
+
+    return {
+        'global': stats,
+        'by_level': level_stats,
+        'by_topic': topic_stats,
+        'timeline': time_stats
+    }
+
+
+def fetch_error_categories(days=90, user_id=DEFAULT_USER, db_path=DB_PATH):
+    """Catégories d'erreurs les plus fréquentes sur une période"""
+    conn = sqlite3.connect(db_path)
+    categories = conn.execute("""
+        SELECT category, COUNT(*) as count
+        FROM corrections
+        WHERE user_id = ? AND created_at >= date('now', ?)
+        GROUP BY category
+        ORDER BY count DESC
+    """, (user_id, f"-{days} days")).fetchall()
+    conn.close()
+    return categories
+
+
+def fetch_data_version(user_id=DEFAULT_USER, db_path=DB_PATH):
+    """Empreinte peu coûteuse des données d'un utilisateur affichées dans les statistiques"""
+    conn = sqlite3.connect(db_path)
+    version = conn.execute("""
+        SELECT
+            (SELECT COUNT(*) || ':' || IFNULL(MAX(id), 0) || ':' || IFNULL(MAX(date_modified), '')
+             FROM conversations WHERE user_id = ?1),
+            (SELECT COUNT(*) || ':' || IFNULL(MAX(id), 0) FROM corrections WHERE user_id = ?1),
+            (SELECT COUNT(*) || ':' || IFNULL(MAX(last_seen), '') FROM lexicon WHERE user_id = ?1)
+    """, (user_id,)).fetchone()
+    conn.close()
+    return "|".join(version)
+
+
+def search_conversations(conversations, search_term):
+    """Filtre les conversations dont le titre ou le sujet contient le terme recherché"""
+    if not search_term:
+        return conversations
+    term = search_term.lower()
+    return [
+        conv for conv in conversations
+        if term in conv['title'].lower()
+        or term in (conv.get('topic') or '').lower()
+    ]
@@ -0,0 +1,124 @@
+"""Clés d'idempotence et cache court des transcriptions et réponses.
+
+Une transcription est indexée par l'empreinte de l'audio : un enregistrement
+rejoué n'est pas retranscrit. Une réponse est indexée par la session et
+l'empreinte de la requête complète (service, modèle, prompt système, messages) :
+un même appel déjà en cours est rejoint au lieu d'être relancé, et un résultat
+terminé est resservi pendant TTL_S secondes, sans jamais être partagé entre
+deux sessions ni entre deux requêtes différentes.
+
+Une entrée utilisateur est réservée avant d'être ajoutée à la conversation
+(claim_input) : un même texte renvoyé dans les INPUT_WINDOW_S secondes est un
+double envoi, un même enregistrement du micro n'est traité qu'une fois.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+TTL_S = 30
+MAX_ENTRIES = 1024
+# Attente maximale d'un appel identique déjà en cours
+WAIT_TIMEOUT_S = 120
+# Fenêtre d'un double envoi de la même entrée texte, et nombre d'entrées mémorisées par session
+INPUT_WINDOW_S = 5
+MAX_CLAIMED_INPUTS = 50
+
+
+def audio_key(user_id, audio_bytes):
+    """Clé d'un enregistrement : empreinte du contenu audio"""
+    return f"{user_id}:audio:{hashlib.sha256(audio_bytes).hexdigest()[:32]}"
+
+
+def request_key(session_id, request):
+    """Clé d'un appel au modèle : session + empreinte de la requête (dictionnaire sérialisable)"""
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return f"{session_id}:request:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+def input_key(kind, content):
+    """Clé d'une entrée utilisateur : type + empreinte du contenu (texte, identifiant d'enregistrement)"""
+    return f"{kind}:{hashlib.sha256(str(content).encode('utf-8')).hexdigest()[:32]}"
+
+
+def claim_input(claimed, kind, content, window=INPUT_WINDOW_S, now=None):
+    """Réserve une entrée dans `claimed` (dictionnaire clé -> horodatage gardé en session)
+
+    Retourne False si la même entrée a été réservée il y a moins de `window`
+    secondes, ou déjà réservée si `window` vaut None.
+    """
+    now = time.time() if now is None else now
+    key = input_key(kind, content)
+    claimed_at = claimed.pop(key, None)
+    if claimed_at is not None and (window is None or now - claimed_at < window):
+        claimed[key] = claimed_at
+        return False
+    claimed[key] = now
+    while len(claimed) > MAX_CLAIMED_INPUTS:
+        claimed.pop(next(iter(claimed)))
+    return True
+
+
+class TTLCache:
+    """Résultats par clé avec dédoublonnage des appels en cours (thread-safe)"""
+
+    def __init__(self, ttl=TTL_S, maxsize=MAX_ENTRIES):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'new': 0, 'cached': 0, 'joined': 0}
+
+    def _purge(self, now):
+        while self.entries:
+            key, (expires_at, _) = next(iter(self.entries.items()))
+            if expires_at > now and len(self.entries) <= self.maxsize:
+                break
+            self.entries.popitem(last=False)
+
+    def run(self, key, fn):
+        """Retourne (résultat, statut) avec statut parmi 'new', 'cached', 'joined'
+
+        Une erreur n'est pas mise en cache : elle est transmise aux appels qui
+        attendaient, et l'appel suivant réessaie.
+        """
+        now = time.time()
+        with self.lock:
+            self._purge(now)
+            entry = self.entries.get(key)
+            if entry is None:
+                future = Future()
+                self.entries[key] = (now + self.ttl, future)
+                owner = True
+            else:
+                future = entry[1]
+                owner = False
+                status = 'cached' if future.done() else 'joined'
+                self.stats[status] += 1
+
+        if not owner:
+            return future.result(timeout=WAIT_TIMEOUT_S), status
+
+        with self.lock:
+            self.stats['new'] += 1
+        try:
+            result = fn()
+        except BaseException as e:
+            # Y compris l'interruption du script : les appels en attente ne doivent pas rester bloqués
+            with self.lock:
+                self.entries.pop(key, None)
+            future.set_exception(e)
+            raise
+        future.set_result(result)
+        return result, 'new'
+
+    def metrics(self):
+        with self.lock:
+            return {'entries': len(self.entries), **self.stats}
+
+
+# Caches du processus (les clés de réponses sont propres à chaque session)
+transcriptions = TTLCache()
+responses = TTLCache()
@@ -0,0 +1,177 @@
+"""Index incrémental du vocabulaire utilisé dans les messages de l'utilisateur.
+
+Usage (reconstruction complète depuis l'historique):
+    python lexicon.py --db conversations.db
+"""
+import argparse
+import hashlib
+import json
+import re
+import sqlite3
+import time
+from collections import Counter
+from datetime import datetime
+
+from database import DB_PATH, DEFAULT_USER, init_database
+
+WORD_RE = re.compile(r"[a-z]+(?:'[a-z]+)?")
+
+
+def tokenize(text):
+    """Découpe un message en mots anglais normalisés (minuscules)"""
+    return WORD_RE.findall(text.lower())
+
+
+def update_lexicon(text, level, seen_at=None, user_id=DEFAULT_USER, db_path=DB_PATH, conn=None):
+    """Met à jour l'index avec les mots d'un message (appelé à chaque tour)
+
+    Avec `conn`, l'écriture se fait dans la transaction de l'appelant.
+    """
+    counts = Counter(tokenize(text))
+    if not counts:
+        return 0
+    level = level or "Non spécifié"
+    seen_at = seen_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    own_connection = conn is None
+    if own_connection:
+        conn = sqlite3.connect(db_path)
+    conn.executemany("""
+        INSERT INTO lexicon (user_id, word, level, count, first_seen, last_seen)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(user_id, word, level) DO UPDATE SET
+            count = count + excluded.count,
+            last_seen = MAX(last_seen, excluded.last_seen),
+            first_seen = MIN(first_seen, excluded.first_seen)
+    """, [(user_id, word, level, count, seen_at, seen_at) for word, count in counts.items()])
+    if own_connection:
+        conn.commit()
+        conn.close()
+    return len(counts)
+
+
+def _new_message_offsets(conversations):
+    """Position du premier message nouveau de chaque conversation [(user_id, messages)]
+
+    Une conversation sauvegardée plusieurs fois (ou rechargée puis poursuivie) est
+    enregistrée en entier à chaque sauvegarde : les messages déjà présents dans une
+    sauvegarde précédente du même utilisateur (préfixe identique) sont ignorés,
+    comme l'index incrémental qui ne compte chaque tour qu'une fois.
+    """
+    saved = {}
+    offsets = []
+    for user_id, messages in conversations:
+        seen = saved.setdefault(user_id, set())
+        digest = hashlib.sha256()
+        offset = 0
+        for position, msg in enumerate(messages, 1):
+            digest.update(f"{msg.get('role')}\x00{msg.get('content')}\x01".encode('utf-8'))
+            prefix = digest.hexdigest()
+            if prefix in seen:
+                offset = position
+        offsets.append(offset)
+        seen.add(digest.hexdigest())
+    return offsets
+
+
+def rebuild_lexicon(user_id=None, db_path=DB_PATH):
+    """Reconstruit l'index depuis l'historique (vectorisé avec pandas)
+
+    Tous les utilisateurs si `user_id` est None, sinon uniquement celui-ci.
+
+    Les comptes sont ceux de l'index incrémental pour tout ce qui a été sauvegardé
+    (chaque message compté une fois, même si la conversation a été sauvegardée
+    plusieurs fois). Deux différences restent : les tours jamais sauvegardés sont
+    perdus, et first_seen/last_seen prennent la date de la sauvegarde qui contient
+    le message, l'heure exacte du tour n'étant pas enregistrée.
+
+    Retourne le nombre d'entrées (utilisateur, mot, niveau) écrites.
+    """
+    import pandas as pd
+
+    conn = sqlite3.connect(db_path)
+    conversations = pd.read_sql_query(
+        "SELECT user_id, COALESCE(level, 'Non spécifié') as level, date_created, messages_json "
+        "FROM conversations WHERE ?1 IS NULL OR user_id = ?1 ORDER BY id",
+        conn, params=(user_id,)
+    )
+
+    entries = pd.DataFrame(columns=['user_id', 'word', 'level', 'count', 'first_seen', 'last_seen'])
+    if not conversations.empty:
+        conversations['messages'] = conversations['messages_json'].map(json.loads)
+        conversations['new_from'] = _new_message_offsets(zip(conversations['user_id'], conversations['messages']))
+        messages = conversations.explode('messages').rename(columns={'messages': 'message'})
+        messages = messages.assign(position=messages.groupby(level=0).cumcount()).dropna(subset=['message'])
+        messages = messages[messages['position'] >= messages['new_from']]
+        messages = messages[messages['message'].map(lambda m: m.get('role') == 'user')]
+        words = messages.assign(
+            word=messages['message'].map(lambda m: m.get('content', '')).str.lower().str.findall(WORD_RE.pattern)
+        ).explode('word').dropna(subset=['word'])
+
+        if not words.empty:
+            entries = words.groupby(['user_id', 'word', 'level']).agg(
+                count=('word', 'size'),
+                first_seen=('date_created', 'min'),
+                last_seen=('date_created', 'max')
+            ).reset_index()
+
+    # tolist() convertit les types NumPy en types Python acceptés par sqlite3
+    columns = ['user_id', 'word', 'level', 'count', 'first_seen', 'last_seen']
+    rows = zip(*(entries[column].tolist() for column in columns))
+    with conn:
+        conn.execute("DELETE FROM lexicon WHERE ?1 IS NULL OR user_id = ?1", (user_id,))
+        conn.executemany("""
+            INSERT INTO lexicon (user_id, word, level, count, first_seen, last_seen)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+    conn.close()
+    return len(entries)
+
+
+def get_top_words(limit=20, level=None, user_id=DEFAULT_USER, db_path=DB_PATH):
+    """Mots les plus utilisés, tous niveaux confondus ou pour un niveau donné"""
+    conn = sqlite3.connect(db_path)
+    if level:
+        rows = conn.execute("""
+            SELECT word, count FROM lexicon
+            WHERE user_id = ? AND level = ?
+            ORDER BY count DESC LIMIT ?
+        """, (user_id, level, limit)).fetchall()
+    else:
+        rows = conn.execute("""
+            SELECT word, SUM(count) as total FROM lexicon
+            WHERE user_id = ?
+            GROUP BY word
+            ORDER BY total DESC LIMIT ?
+        """, (user_id, limit)).fetchall()
+    conn.close()
+    return rows
+
+
+def get_vocabulary_growth(user_id=DEFAULT_USER, db_path=DB_PATH):
+    """Nombre de nouveaux mots par jour (date de première utilisation)"""
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("""
+        SELECT DATE(first_seen) as date, COUNT(*) as new_words
+        FROM (SELECT word, MIN(first_seen) as first_seen FROM lexicon WHERE user_id = ? GROUP BY word)
+        GROUP BY DATE(first_seen)
+        ORDER BY date
+    """, (user_id,)).fetchall()
+    conn.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruit l'index de vocabulaire depuis l'historique")
+    parser.add_argument("--db", default=str(DB_PATH), help="Chemin de la base SQLite")
+    parser.add_argument("--user", default=None, help="Limiter la reconstruction à cet utilisateur")
+    args = parser.parse_args()
+
+    init_database(args.db)
+    start = time.perf_counter()
+    count = rebuild_lexicon(args.user, args.db)
+    print(f"✅ {count} entrées (utilisateur, mot, niveau) en {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""Test de charge: N sessions Streamlit simultanées contre une seule conversations.db.
+
+Chaque session est pilotée par AppTest (sans navigateur) dans son propre processus
+et enchaîne tours de conversation, sauvegardes, historique et statistiques. Les
+fournisseurs d'IA sont remplacés par mock_providers.py.
+
+Les sauvegardes passent par la file d'écriture en arrière-plan : les échecs sont
+lus dans writer.metrics() et dans les notifications (st.toast), les verrous SQLite
+dans les notifications et les messages d'erreur. Une action dont le widget est
+introuvable est comptée à part (missing_widgets) au lieu d'être ignorée.
+
+Usage:
+    python load_test.py --concurrency 1,4,8,16 --iterations 5 --output load_results.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import write_behind
+from database import DB_PATH
+from mock_providers import provider_env, start_mock_server
+
+APP_PATH = Path(__file__).resolve().parent / "Main.py"
+TEXT_MESSAGES = [
+    "Hello, how are you today?",
+    "I go to the cinema yesterday with my friends.",
+    "What do you like to cook on weekends?",
+    "My job is very interesting but sometimes stressful.",
+]
+
+
+def _percentile(sorted_values, percent):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Session:
+    """Une session simulée : enchaîne les actions et chronomètre chaque exécution du script"""
+
+    def __init__(self, session_id, timeout):
+        from streamlit.testing.v1 import AppTest
+
+        self.session_id = session_id
+        self.app = AppTest.from_file(str(APP_PATH), default_timeout=timeout)
+        self.timings = []
+        self.errors = []
+        self.missing = []
+        self.locked = 0
+        self.write_errors = 0
+
+    def _run(self, action, element=None):
+        start = time.perf_counter()
+        try:
+            (element.run() if element is not None else self.app.run())
+        except Exception as e:
+            self.errors.append(f"{action}: {e}")
+        self.timings.append((action, time.perf_counter() - start))
+        messages = [str(error.value) for error in self.app.error]
+        # Résultat des écritures en arrière-plan, notifié à l'exécution suivante
+        toasts = [str(toast.value) for toast in self.app.toast]
+        self.write_errors += sum(1 for toast in toasts if toast.startswith("❌"))
+        self.locked += sum(1 for message in messages + toasts if "locked" in message.lower())
+
+    def _missing(self, action, widget):
+        """Action impossible : le widget attendu n'est pas affiché"""
+        self.missing.append(f"{action}: {widget} introuvable")
+
+    def _tab(self, label):
+        try:
+            radio = self.app.sidebar.radio(key="navigation_tabs")
+        except KeyError:
+            self._missing(f"tab:{label}", "navigation")
+            return False
+        if radio.value != label:
+            self._run(f"tab:{label}", radio.set_value(label))
+        return True
+
+    def _enter_api_key(self):
+        api_inputs = [t for t in self.app.sidebar.text_input if t.label.startswith("Clé API")]
+        if not api_inputs:
+            self._missing("api_key", "champ de clé API")
+        for text_input in api_inputs:
+            if not text_input.value:
+                self._run("api_key", text_input.input("gsk_load_test_key"))
+
+    def _sidebar_shows(self, prefixes):
+        texts = [str(e.value) for e in list(self.app.sidebar.subheader) + list(self.app.sidebar.info)]
+        return any(text.startswith(prefix) for text in texts for prefix in prefixes)
+
+    def chat_turn(self, message):
+        if not self._tab("💬 Conversation"):
+            return
+        self._enter_api_key()
+        if not self.app.chat_input:
+            self._missing("chat_turn", "chat_input")
+            return
+        self._run("chat_turn", self.app.chat_input[0].set_value(message))
+
+    def save(self, iteration):
+        if not self._tab("💾 Sauvegardes"):
+            return
+        title_inputs = [t for t in self.app.sidebar.text_input if t.key == "conv_title_input"]
+        if not title_inputs:
+            self._missing("save", "titre de la conversation")
+            return
+        title_inputs[0].set_value(f"Session {self.session_id} #{iteration}")
+        buttons = [b for b in self.app.sidebar.button if b.label == "💾 Sauvegarder"]
+        if not buttons:
+            self._missing("save", "bouton 💾 Sauvegarder")
+            return
+        self._run("save", buttons[0].click())
+
+    def history(self):
+        if not self._tab("💾 Sauvegardes"):
+            return
+        self._run("history_load")
+        if not self._sidebar_shows(("📚 Historique", "📚 Aucune conversation")):
+            self._missing("history_load", "historique")
+
+    def stats(self):
+        if not self._tab("📊 Statistiques"):
+            return
+        self._run("stats_view")
+        if not self._sidebar_shows(("📈 Vos statistiques",)):
+            self._missing("stats_view", "statistiques")
+
+
+def run_session(args):
+    """Exécuté dans un processus dédié; retourne les mesures de la session"""
+    session_id, iterations, workdir, env, timeout = args
+    os.chdir(workdir)
+    os.environ.update(env)
+
+    session = Session(session_id, timeout)
+    session._run("initial_load")
+    for iteration in range(iterations):
+        session.chat_turn(TEXT_MESSAGES[iteration % len(TEXT_MESSAGES)])
+        session.save(iteration)
+        session.history()
+        session.stats()
+
+    # Écritures encore en file : attendre leur COMMIT avant de lire les compteurs
+    writer = write_behind.get_writer(DB_PATH)
+    writer.flush()
+    write_metrics = writer.metrics()
+
+    return {
+        'session_id': session_id,
+        'timings': session.timings,
+        'errors': session.errors,
+        'missing': session.missing,
+        'locked': session.locked,
+        'write_errors': session.write_errors,
+        'writes_committed': write_metrics['committed'],
+        'writes_failed': write_metrics['failed'],
+        'write_ack_p95_ms': write_metrics['ack_ms_p95'],
+        # ru_maxrss est en Ko sous Linux, en octets sous macOS
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024),
+    }
+
+
+def run_level(concurrency, iterations, workdir, env, timeout):
+    """Lance `concurrency` sessions en parallèle et agrège leurs mesures"""
+    start = time.perf_counter()
+    # Un processus neuf par session pour que la mémoire mesurée lui soit propre
+    with multiprocessing.get_context("spawn").Pool(concurrency, maxtasksperchild=1) as pool:
+        sessions = pool.map(run_session, [
+            (session_id, iterations, workdir, env, timeout) for session_id in range(concurrency)
+        ])
+    elapsed = time.perf_counter() - start
+
+    durations = sorted(d for s in sessions for _, d in s['timings'])
+    by_action = {}
+    for s in sessions:
+        for action, duration in s['timings']:
+            by_action.setdefault(action.split(":")[0], []).append(duration)
+
+    return {
+        'concurrency': concurrency,
+        'elapsed_s': elapsed,
+        'reruns': len(durations),
+        'throughput_rps': len(durations) / elapsed if elapsed else 0.0,
+        'rerun_latency_ms': {f"p{p}": _percentile(durations, p) * 1000 for p in (50, 95, 99)},
+        'by_action_p95_ms': {a: _percentile(sorted(v), 95) * 1000 for a, v in sorted(by_action.items())},
+        'sqlite_locked': sum(s['locked'] for s in sessions),
+        'writes_committed': sum(s['writes_committed'] for s in sessions),
+        'writes_failed': sum(s['writes_failed'] for s in sessions),
+        'write_errors_notified': sum(s['write_errors'] for s in sessions),
+        'write_ack_p95_ms': max(s['write_ack_p95_ms'] for s in sessions),
+        'missing_widgets': sum(len(s['missing']) for s in sessions),
+        'errors': [e for s in sessions for e in s['errors'] + s['missing']][:20],
+        'max_rss_mb': max(s['max_rss_mb'] for s in sessions),
+        'mean_rss_mb': sum(s['max_rss_mb'] for s in sessions) / len(sessions),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge multi-sessions de l'application")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="Niveaux de concurrence")
+    parser.add_argument("--iterations", type=int, default=3, help="Scénarios par session")
+    parser.add_argument("--latency-ms", type=float, default=200, help="Latence des fournisseurs simulés")
+    parser.add_argument("--timeout", type=float, default=60, help="Délai max d'une exécution du script")
+    parser.add_argument("--workdir", help="Dossier de travail (conversations.db partagée)")
+    parser.add_argument("--output", default="load_results.json")
+    args = parser.parse_args()
+
+    server, state, base_url = start_mock_server(config={'latency_ms': args.latency_ms,
+                                                        'jitter_ms': args.latency_ms / 3})
+    env = provider_env(base_url)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="english_tutor_load_")
+
+    results = []
+    try:
+        for concurrency in (int(c) for c in args.concurrency.split(",")):
+            print(f"⏱️ {concurrency} session(s)...", file=sys.stderr)
+            level = run_level(concurrency, args.iterations, workdir, env, args.timeout)
+            results.append(level)
+            print(f"   {level['throughput_rps']:.1f} exécutions/s | "
+                  f"p50 {level['rerun_latency_ms']['p50']:.0f} ms | "
+                  f"p95 {level['rerun_latency_ms']['p95']:.0f} ms | "
+                  f"p99 {level['rerun_latency_ms']['p99']:.0f} ms | "
+                  f"verrous {level['sqlite_locked']} | "
+                  f"écritures {level['writes_committed']} ok / {level['writes_failed']} échecs | "
+                  f"widgets manquants {level['missing_widgets']} | "
+                  f"RSS max {level['max_rss_mb']:.0f} Mo", file=sys.stderr)
+    finally:
+        server.shutdown()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'base_url': base_url, 'iterations': args.iterations, 'levels': results}, f, indent=2)
+    print(f"✅ Résultats enregistrés dans {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""Serveur local qui imite Groq (chat + transcription), Hugging Face et la synthèse vocale.
+
+Permet de tester la charge et la latence sans réseau ni clé API. Les URL de base
+de l'application se configurent par variables d'environnement:
+
+    python mock_providers.py --port 8765 --latency-ms 400 --jitter-ms 150 --error-rate 0.02
+    GROQ_BASE_URL=http://localhost:8765/openai/v1 \\
+    HF_BASE_URL=http://localhost:8765 \\
+    TTS_BASE_URL=http://localhost:8765/tts \\
+    streamlit run Main.py
+
+Endpoints: POST /openai/v1/chat/completions (stream possible), POST /openai/v1/audio/transcriptions,
+POST /models/<modèle>, POST /tts, GET /stats, POST /reset.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Réponses types ; certaines contiennent une correction au format attendu par corrections.py
+REPLIES = [
+    "That sounds really nice! What do you usually do on weekends?",
+    "Oh, interesting! How long have you been doing that?",
+    "I love that too. What made you start?\n"
+    "💡 Petite correction [tense]: instead of 'I go there yesterday', say 'I went there yesterday'",
+    "Great question! I think it depends on the season. What about you?",
+    "Wow, that must have been fun! Did you go with friends?\n"
+    "💡 Petite correction [article]: instead of 'I have a dog named the Max', say 'I have a dog named Max'",
+]
+
+TRANSCRIPTIONS = [
+    "Hello, how are you today?",
+    "I go to the cinema yesterday with my friends.",
+    "I would like to talk about my job.",
+    "What is your favourite food?",
+]
+
+DEFAULT_CONFIG = {
+    'latency_ms': 300,          # latence moyenne avant la réponse
+    'jitter_ms': 100,           # écart type (normal) ou sigma relatif (lognormal)
+    'distribution': 'normal',   # fixed | normal | lognormal
+    'error_rate': 0.0,          # probabilité d'une erreur 500/503
+    'rate_limit_rate': 0.0,     # probabilité d'une erreur 429
+    'quota': 0,                 # nombre max de requêtes avant 429 permanent (0 = illimité)
+    'tokens_per_second': 200,   # débit des réponses en streaming
+    'audio_bytes_per_char': 400,
+}
+
+
+class MockState:
+    """Configuration et compteurs partagés entre les threads du serveur"""
+
+    def __init__(self, config=None, seed=None):
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.counts = {}
+
+    def count(self, endpoint, status):
+        with self.lock:
+            key = f"{endpoint} {status}"
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def latency(self):
+        config = self.config
+        with self.lock:
+            if config['distribution'] == 'fixed':
+                value = config['latency_ms']
+            elif config['distribution'] == 'lognormal':
+                sigma = config['jitter_ms'] / max(config['latency_ms'], 1)
+                value = config['latency_ms'] * self.random.lognormvariate(0, sigma)
+            else:
+                value = self.random.gauss(config['latency_ms'], config['jitter_ms'])
+        return max(0.0, value) / 1000
+
+    def injected_error(self):
+        """Retourne un code d'erreur à simuler (quota, 429, 5xx) ou None"""
+        config = self.config
+        with self.lock:
+            self.requests += 1
+            if config['quota'] and self.requests > config['quota']:
+                return 429
+            draw = self.random.random()
+        if draw < config['rate_limit_rate']:
+            return 429
+        if draw < config['rate_limit_rate'] + config['error_rate']:
+            return self.random.choice([500, 503])
+        return None
+
+    def choice(self, values):
+        with self.lock:
+            return self.random.choice(values)
+
+
+def _count_tokens(text):
+    return max(1, len(text.split()))
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate(self, endpoint):
+        """Applique latence et erreurs injectées; retourne False si une erreur a été envoyée"""
+        time.sleep(self.state.latency())
+        status = self.state.injected_error()
+        if status:
+            self.state.count(endpoint, status)
+            headers = {"Retry-After": "1"} if status == 429 else None
+            self._send(status, {"error": {"message": f"Erreur simulée {status}", "type": "mock"}},
+                       headers=headers)
+            return False
+        self.state.count(endpoint, 200)
+        return True
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/stats":
+            with self.state.lock:
+                self._send(200, {'requests': self.state.requests, 'counts': dict(self.state.counts),
+                                 'config': self.state.config})
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_HEAD(self):
+        # Préchauffage des connexions (prefetch.py) : réponse sans corps, connexion gardée ouverte
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        body = self._read_body()
+
+        if path == "/reset":
+            self.state.reset()
+            if body:
+                self.state.config.update(json.loads(body))
+            self._send(200, {"ok": True})
+        elif path.endswith("/chat/completions"):
+            self._chat(json.loads(body or b"{}"))
+        elif path.endswith("/audio/transcriptions"):
+            if self._simulate("transcriptions"):
+                self._send(200, {"text": self.state.choice(TRANSCRIPTIONS)})
+        elif path.startswith("/models/"):
+            if self._simulate("huggingface"):
+                self._send(200, [{"generated_text": " " + self.state.choice(REPLIES)}])
+        elif path.startswith("/tts"):
+            self._tts(body)
+        else:
+            self._send(404, {"error": "not found"})
+
+    def _chat(self, request):
+        if not self._simulate("chat"):
+            return
+        reply = self.state.choice(REPLIES)
+        prompt_tokens = sum(_count_tokens(m.get("content", "")) for m in request.get("messages", []))
+        completion_tokens = _count_tokens(reply)
+
+        if not request.get("stream"):
+            self._send(200, {
+                "id": "mock-chat",
+                "object": "chat.completion",
+                "model": request.get("model", "mock"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens}
+            })
+            return
+
+        # Streaming SSE, mot par mot, au débit configuré
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        delay = 1 / max(self.state.config['tokens_per_second'], 1)
+        for word in reply.split(" "):
+            chunk = {"choices": [{"index": 0, "delta": {"content": word + " "}}]}
+            self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            time.sleep(delay)
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _tts(self, body):
+        if not self._simulate("tts"):
+            return
+        query = parse_qs(urlparse(self.path).query)
+        text = query.get("text", [""])[0] or body.decode("utf-8", errors="ignore")
+        # Faux MP3 : en-tête ID3 puis remplissage proportionnel à la longueur du texte
+        size = max(1, len(text)) * self.state.config['audio_bytes_per_char']
+        self._send(200, b"ID3" + bytes(size), content_type="audio/mpeg")
+
+
+def start_mock_server(port=0, config=None, seed=None):
+    """Démarre le serveur dans un thread; retourne (serveur, état, URL de base)"""
+    state = MockState(config, seed)
+    handler = type("BoundMockHandler", (MockHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def provider_env(base_url):
+    """Variables d'environnement qui dirigent l'application vers le serveur local"""
+    return {
+        "GROQ_BASE_URL": f"{base_url}/openai/v1",
+        "HF_BASE_URL": base_url,
+        "TTS_BASE_URL": f"{base_url}/tts",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur local imitant les fournisseurs d'IA")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=DEFAULT_CONFIG['latency_ms'])
+    parser.add_argument("--jitter-ms", type=float, default=DEFAULT_CONFIG['jitter_ms'])
+    parser.add_argument("--distribution", choices=["fixed", "normal", "lognormal"],
+                        default=DEFAULT_CONFIG['distribution'])
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilité d'erreur 5xx")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Probabilité d'erreur 429")
+    parser.add_argument("--quota", type=int, default=0, help="Requêtes autorisées avant 429 (0 = illimité)")
+    parser.add_argument("--tokens-per-second", type=float, default=DEFAULT_CONFIG['tokens_per_second'])
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = {
+        'latency_ms': args.latency_ms, 'jitter_ms': args.jitter_ms, 'distribution': args.distribution,
+        'error_rate': args.error_rate, 'rate_limit_rate': args.rate_limit_rate, 'quota': args.quota,
+        'tokens_per_second': args.tokens_per_second,
+    }
+    state = MockState(config, args.seed)
+    handler = type("BoundMockHandler", (MockHandler,), {"state": state})
+    server = ThreadingHTTPServer(("", args.port), handler)
+    base_url = f"http://localhost:{args.port}"
+    print(f"🧪 Fournisseurs simulés sur {base_url}")
+    for name, value in provider_env(base_url).items():
+        print(f"   {name}={value}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Préparation spéculative du tour suivant pendant que l'utilisateur réfléchit.
+
+Après une réponse, des tâches en arrière-plan :
+- ouvrent les connexions HTTP vers les fournisseurs (pool partagé `http`),
+- synthétisent à part l'audio de la question de relance de la réponse,
+- importent les modules lourds utilisés au tour suivant.
+Tout est annulé dès qu'une vraie entrée arrive; la latence économisée est estimée
+(poignée de main TCP/TLS évitée, synthèse déjà faite) et rapportée.
+
+Activation: case « Préparation anticipée » ou ENGLISH_TUTOR_PREFETCH=1.
+"""
+import importlib
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+ENABLED_BY_DEFAULT = os.environ.get("ENGLISH_TUTOR_PREFETCH") == "1"
+
+# Durée pendant laquelle une connexion ouverte est supposée encore disponible dans le pool
+KEEPALIVE_S = 60
+
+# Session HTTP partagée : les connexions ouvertes ici sont réutilisées par les appels du tour
+http = requests.Session()
+_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32)
+http.mount("https://", _adapter)
+http.mount("http://", _adapter)
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+
+_SENTENCE = re.compile(r"[^.!?\n]*\?")
+
+
+def host_of(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def follow_up_question(text):
+    """Dernière question de la réponse (hors lignes de correction), ou None"""
+    lines = [line for line in text.splitlines() if "💡" not in line]
+    questions = _SENTENCE.findall("\n".join(lines))
+    return questions[-1].strip() if questions else None
+
+
+class Speculation:
+    """Tâches spéculatives préparées après une réponse de l'assistant"""
+
+    def __init__(self, key):
+        self.key = key
+        self.cancelled = threading.Event()
+        self.futures = {}
+        self.warmed = {}
+        self.used = set()
+
+    def submit(self, name, fn, *args):
+        if not self.cancelled.is_set():
+            self.futures[name] = _executor.submit(self._guarded, fn, *args)
+
+    def _guarded(self, fn, *args):
+        if self.cancelled.is_set():
+            return None
+        return fn(self, *args)
+
+    def cancel(self):
+        """Annule les tâches pas encore commencées; les autres sont ignorées"""
+        self.cancelled.set()
+        for future in self.futures.values():
+            future.cancel()
+
+    def result(self, name):
+        """Résultat d'une tâche terminée sans erreur, sinon None (jamais bloquant)"""
+        future = self.futures.get(name)
+        if future is None or not future.done() or future.cancelled() or future.exception():
+            return None
+        return future.result()
+
+    def take(self, name):
+        """Comme result(), mais ne compte l'économie qu'une seule fois"""
+        if name in self.used:
+            return None
+        result = self.result(name)
+        if result is not None:
+            self.used.add(name)
+        return result
+
+
+def _warm_connection(speculation, url):
+    """Ouvre une connexion (requête à froid) puis mesure une requête à chaud
+
+    Une connexion que le serveur ferme (Connection: close) ne resservira pas :
+    elle n'est pas comptée comme préparée.
+    """
+    try:
+        start = time.perf_counter()
+        http.head(url, timeout=5)
+        middle = time.perf_counter()
+        response = http.head(url, timeout=5)
+        end = time.perf_counter()
+    except requests.RequestException:
+        return None
+    if response.headers.get("Connection", "").lower() == "close":
+        return None
+    handshake_ms = max(0.0, ((middle - start) - (end - middle)) * 1000)
+    speculation.warmed[host_of(url)] = (handshake_ms, time.time())
+    return handshake_ms
+
+
+def _timed(speculation, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (result, (time.perf_counter() - start) * 1000) if result else None
+
+
+def _preload(speculation, modules):
+    for name in modules:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    return True
+
+
+def start(key, urls, question=None, synthesize=None, modules=()):
+    """Lance la préparation du tour suivant; retourne la Speculation"""
+    speculation = Speculation(key)
+    for url in dict.fromkeys(urls):
+        if url:
+            speculation.submit(f"warm:{host_of(url)}", _warm_connection, url)
+    if question and synthesize:
+        speculation.submit("tts_question", _timed, synthesize, question)
+    if modules:
+        speculation.submit("preload", _preload, modules)
+    return speculation
+
+
+def consume(speculation, urls):
+    """Arrivée d'une vraie entrée : annule la spéculation et retourne l'économie estimée
+
+    Retourne [(source, ms)] pour les connexions préparées qui seront réutilisées.
+    """
+    speculation.cancel()
+    now = time.time()
+    saved = []
+    for host in dict.fromkeys(host_of(url) for url in urls if url):
+        warmed = speculation.warmed.get(host)
+        if warmed and now - warmed[1] < KEEPALIVE_S:
+            saved.append((f"connection:{host}", warmed[0]))
+    return saved
@@ -0,0 +1,178 @@
+"""Profilage optionnel d'une exécution du script Streamlit, section par section.
+
+Activation par variable d'environnement ou paramètre d'URL:
+    ENGLISH_TUTOR_PROFILE=1          ou  ?profile=1          chronomètres seuls
+    ENGLISH_TUTOR_PROFILE=memory     ou  ?profile=memory     + allocations (tracemalloc)
+    ENGLISH_TUTOR_PROFILE=cprofile   ou  ?profile=cprofile   + cProfile
+    ENGLISH_TUTOR_PROFILE=all        ou  ?profile=all        tout
+
+Le script appelle mark("section") au début de chaque partie logique : une section
+dure jusqu'à la marque suivante. Les N derniers profils sont gardés dans profiles/.
+
+tracemalloc n'est actif que pendant les exécutions profilées en mode mémoire : il
+est arrêté quand la dernière se termine (ou est abandonnée par st.rerun()), sauf
+s'il tournait déjà avant (PYTHONTRACEMALLOC).
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+PROFILE_DIR = Path("profiles")
+MAX_PROFILES = 20
+
+_local = threading.local()
+
+# Exécutions en cours qui utilisent tracemalloc (sessions simultanées)
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+
+
+def _acquire_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracemalloc_owned = True
+        _tracemalloc_users += 1
+
+
+def _release_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+
+class RunProfile:
+    """Mesures d'une exécution du script"""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.created_at = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        self.sections = []
+        self.current = None
+        self.started = time.perf_counter()
+        self.memory = mode in ("memory", "all")
+        self.profiler = cProfile.Profile() if mode in ("cprofile", "all") else None
+        self.function_stats = ""
+        self.finished = False
+
+        if self.memory:
+            _acquire_tracemalloc()
+        if self.profiler:
+            self.profiler.enable()
+
+    def mark(self, name):
+        """Termine la section en cours et en commence une nouvelle"""
+        now = time.perf_counter()
+        memory = tracemalloc.get_traced_memory() if self.memory else (0, 0)
+        if self.current:
+            previous_name, started, (previous_memory, _) = self.current
+            self.sections.append({
+                'section': previous_name,
+                'ms': (now - started) * 1000,
+                'alloc_kb': (memory[0] - previous_memory) / 1024,
+                'peak_kb': (memory[1] - previous_memory) / 1024 if self.memory else 0.0,
+            })
+        if self.memory:
+            tracemalloc.reset_peak()
+            memory = tracemalloc.get_traced_memory()
+        self.current = (name, now, memory) if name else None
+
+    def finish(self):
+        self.mark(None)
+        self._stop()
+        if self.profiler:
+            buffer = io.StringIO()
+            pstats.Stats(self.profiler, stream=buffer).sort_stats("cumulative").print_stats(25)
+            self.function_stats = buffer.getvalue()
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+
+    def _stop(self):
+        """Arrête cProfile et libère tracemalloc (une seule fois)"""
+        if self.finished:
+            return
+        self.finished = True
+        if self.profiler:
+            self.profiler.disable()
+        if self.memory:
+            _release_tracemalloc()
+
+    def ranked_sections(self):
+        """Sections agrégées par nom, triées par temps décroissant"""
+        totals = {}
+        for section in self.sections:
+            entry = totals.setdefault(section['section'], {'section': section['section'], 'ms': 0.0,
+                                                           'alloc_kb': 0.0, 'peak_kb': 0.0})
+            entry['ms'] += section['ms']
+            entry['alloc_kb'] += section['alloc_kb']
+            entry['peak_kb'] = max(entry['peak_kb'], section['peak_kb'])
+        return sorted(totals.values(), key=lambda s: s['ms'], reverse=True)
+
+    def save(self, profile_dir=PROFILE_DIR, keep=MAX_PROFILES):
+        """Écrit le profil sur disque et ne garde que les `keep` plus récents"""
+        profile_dir.mkdir(exist_ok=True)
+        base = profile_dir / f"run_{self.created_at}"
+        with open(base.with_suffix(".json"), 'w', encoding='utf-8') as f:
+            json.dump({'created_at': self.created_at, 'mode': self.mode, 'total_ms': self.total_ms,
+                       'sections': self.ranked_sections(), 'timeline': self.sections}, f, indent=2)
+        if self.profiler:
+            self.profiler.dump_stats(str(base.with_suffix(".prof")))
+
+        runs = sorted({p.stem for p in profile_dir.glob("run_*")})
+        for stem in runs[:-keep]:
+            for path in profile_dir.glob(f"{stem}.*"):
+                path.unlink()
+
+
+def requested_mode(query_value=None):
+    """Mode demandé par l'URL ou l'environnement (None si désactivé)"""
+    value = query_value or os.environ.get("ENGLISH_TUTOR_PROFILE")
+    if not value or value == "0":
+        return None
+    return value if value in ("memory", "cprofile", "all") else "timers"
+
+
+def begin_run(mode):
+    """Démarre le profilage de l'exécution (ne fait rien si mode est None)
+
+    Une exécution précédente interrompue (st.rerun(), exception) n'a pas appelé
+    finish_run() : son profil est abandonné.
+    """
+    previous = current_profile()
+    if previous:
+        previous._stop()
+    _local.profile = RunProfile(mode) if mode else None
+    return _local.profile
+
+
+def current_profile():
+    return getattr(_local, 'profile', None)
+
+
+def mark(name):
+    """Début d'une section logique du script (sans effet si le profilage est désactivé)"""
+    profile = current_profile()
+    if profile:
+        profile.mark(name)
+
+
+def finish_run():
+    """Termine et enregistre le profil de l'exécution; retourne le profil ou None"""
+    profile = current_profile()
+    if not profile:
+        return None
+    _local.profile = None
+    profile.finish()
+    profile.save()
+    return profile
@@ -0,0 +1,82 @@
+"""Prompts système précompilés et construction incrémentale du prompt Hugging Face.
+
+Le prompt système commence par une partie statique identique octet pour octet
+quel que soit le niveau ou le sujet (mise en cache du préfixe côté fournisseur);
+seules les dernières lignes dépendent de (niveau, sujet) et des corrections à
+réviser. Chaque combinaison est construite une seule fois par processus.
+"""
+from functools import lru_cache
+
+from corrections import CORRECTION_FORMAT_INSTRUCTION
+
+LEVEL_INSTRUCTIONS = {
+    "Débutant (A1-A2)": "Use simple vocabulary and short sentences. Speak slowly and clearly.",
+    "Intermédiaire (B1-B2)": "Use everyday vocabulary with some idioms. Encourage natural conversation.",
+    "Avancé (C1-C2)": "Use advanced vocabulary and complex structures. Challenge the learner."
+}
+
+STATIC_PREFIX = f"""You are a friendly English conversation partner helping a French speaker practice English.
+
+Your role:
+1. Have natural, friendly conversations like a friend would
+2. Ask follow-up questions to keep the conversation flowing
+3. If the user makes grammatical errors, gently correct them by:
+   - First responding naturally to their message
+   - Then adding one note per error, on its own line, in exactly this format:
+     {CORRECTION_FORMAT_INSTRUCTION}
+     Example: "💡 Petite correction [tense]: instead of 'I go yesterday', say 'I went yesterday'"
+4. Encourage the user and be supportive
+5. Keep responses concise (2-4 sentences typically)
+6. Use casual, friendly language
+7. Show interest in what they say
+
+Remember: You're a conversation partner, not a strict teacher. Make it fun and natural!
+"""
+
+
+@lru_cache(maxsize=1024)
+def get_system_prompt(level, topic, review_items=()):
+    """Prompt système pour (niveau, sujet), construit une seule fois
+
+    `review_items`: tuple de (original, corrigé, catégorie) à faire pratiquer
+    (révision espacée, voir review.py), ajouté après la partie statique.
+    """
+    topic_instruction = f" Focus the conversation on {topic}." if topic != "Libre" else ""
+    prompt = f"""{STATIC_PREFIX}
+Level: {level}
+Instructions: {LEVEL_INSTRUCTIONS[level]}{topic_instruction}"""
+    if review_items:
+        review_lines = "\n".join(f"- [{category}] instead of '{original}', say '{corrected}'"
+                                  for original, corrected, category in review_items)
+        prompt += f"""
+
+Review: the learner made these mistakes before. Steer the conversation so they get a
+natural chance to use the correct forms, and correct them again if they repeat a mistake:
+{review_lines}"""
+    return prompt
+
+
+def _render_message(msg):
+    role = "User" if msg["role"] == "user" else "Assistant"
+    return f"{role}: {msg['content']}\n"
+
+
+class HFPromptBuilder:
+    """Prompt texte Hugging Face construit incrémentalement d'un tour à l'autre
+
+    Les messages déjà rendus sont gardés; seuls les nouveaux sont formatés. Si le
+    prompt système ou l'historique a changé (conversation chargée, nouvelle
+    conversation), tout est reconstruit.
+    """
+
+    def __init__(self):
+        self.system_prompt = None
+        self.rendered = []
+
+    def build(self, system_prompt, messages):
+        if (system_prompt != self.system_prompt or len(messages) < len(self.rendered)
+                or (self.rendered and _render_message(messages[len(self.rendered) - 1]) != self.rendered[-1])):
+            self.system_prompt = system_prompt
+            self.rendered = []
+        self.rendered.extend(_render_message(msg) for msg in messages[len(self.rendered):])
+        return f"{system_prompt}\n\n{''.join(self.rendered)}Assistant:"
@@ -0,0 +1,302 @@
+"""Réanalyse de tout l'historique après un changement du format des corrections ou du prompt.
+
+Usage:
+    python reanalyze.py --db conversations.db
+    python reanalyze.py --db conversations.db --user alice --workers 8
+    python reanalyze.py --db conversations.db --llm --concurrency 4   # relecture par le modèle
+    python reanalyze.py --db conversations.db --restart               # ignore le point de reprise
+
+Les conversations sont lues par tranches d'identifiants croissants. Chaque tranche
+est analysée dans un pool de processus (extract_corrections sur les réponses
+enregistrées), puis réécrite en une seule transaction : lignes de corrections,
+corrections_json, correction_count, message_count et point de reprise
+(table job_checkpoints). Relancer la commande reprend après la dernière tranche
+validée; une fois le parcours terminé, seules les nouvelles conversations sont
+traitées (--restart pour tout refaire). Les conversations importées en masse,
+qui n'ont pas encore de lignes dans la table corrections, sont complétées au passage.
+
+Avec --llm, les messages de l'utilisateur sont relus par le modèle (clé dans
+GROQ_API_KEY ou --api-key), avec au plus --concurrency appels simultanés.
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+
+from corrections import CORRECTION_FORMAT_INSTRUCTION, extract_corrections
+from database import DB_PATH, init_database, insert_correction_rows
+
+# Conversations analysées puis réécrites par transaction
+BATCH_SIZE = 1000
+LLM_CONCURRENCY = 4
+LLM_RETRIES = 3
+
+REVIEW_PROMPT = f"""You review English written by a French speaker.
+Each message below starts with its number in brackets, like [3].
+For every grammatical error, output one line starting with the message number, then
+the correction in exactly this format:
+{CORRECTION_FORMAT_INSTRUCTION}
+Example: [3] 💡 Petite correction [tense]: instead of 'I go yesterday', say 'I went yesterday'
+Output nothing else. If there are no errors, output OK."""
+
+_NUMBERED_LINE = re.compile(r"^\s*\[(\d+)\]\s*(.+)$")
+
+
+def job_name(user_id=None, llm=False):
+    return f"reanalyze:{user_id or '*'}" + (":llm" if llm else "")
+
+
+def load_checkpoint(conn, job):
+    """Retourne (dernier identifiant traité, nombre traité) ou (0, 0)"""
+    row = conn.execute("SELECT last_id, processed FROM job_checkpoints WHERE job = ?", (job,)).fetchone()
+    return row if row else (0, 0)
+
+
+def iter_batches(conn, after_id, batch_size=BATCH_SIZE, user_id=None):
+    """Parcourt les conversations par tranches d'identifiants, sans tout charger en mémoire"""
+    user_filter = "AND user_id = ?" if user_id else ""
+    while True:
+        params = (after_id, user_id, batch_size) if user_id else (after_id, batch_size)
+        rows = conn.execute(f"""
+            SELECT id, user_id, date_created, messages_json, corrections_json
+            FROM conversations
+            WHERE id > ? {user_filter}
+            ORDER BY id
+            LIMIT ?
+        """, params).fetchall()
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1][0]
+
+
+def analyze_conversation(row, keep_messages=False):
+    """Réextrait les corrections d'une conversation (exécuté dans un processus séparé)
+
+    Retourne (identifiant, analyse, erreur). Les messages ne sont renvoyés qu'avec
+    `keep_messages` (relecture par le modèle), pour limiter les échanges entre processus.
+    """
+    conv_id, user_id, created_at, messages_json, corrections_json = row
+    try:
+        messages = json.loads(messages_json)
+        previous = json.loads(corrections_json or "[]")
+    except (TypeError, ValueError) as e:
+        return conv_id, None, f"{conv_id}: {e}"
+
+    timestamp = created_at[11:16]
+    corrections = []
+    user_message = ""
+    for turn, msg in enumerate(messages):
+        if msg.get('role') == 'user':
+            user_message = msg.get('content') or ""
+            continue
+        for correction in extract_corrections(msg.get('content') or ""):
+            corrections.append({"timestamp": timestamp, "user_message": user_message,
+                                "turn": turn, **correction})
+
+    return conv_id, {
+        'user_id': user_id,
+        'created_at': created_at,
+        'messages': messages if keep_messages else None,
+        'corrections': corrections,
+        'previous_count': len(previous),
+        'message_count': sum(1 for msg in messages if msg.get('role') == 'user'),
+    }, None
+
+
+def review_with_llm(analysis, api_key, base_url, model):
+    """Fait relire les messages de l'utilisateur par le modèle; retourne les corrections"""
+    import prefetch
+
+    messages = analysis['messages']
+    user_turns = {i: msg.get('content') or "" for i, msg in enumerate(messages) if msg.get('role') == 'user'}
+    if not user_turns:
+        return []
+    data = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": REVIEW_PROMPT},
+            {"role": "user", "content": "\n".join(f"[{i}] {text}" for i, text in user_turns.items())},
+        ],
+        "temperature": 0,
+        "max_tokens": 1000,
+    }
+    for attempt in range(LLM_RETRIES):
+        response = prefetch.http.post(f"{base_url}/chat/completions", json=data, timeout=60,
+                                      headers={"Authorization": f"Bearer {api_key}"})
+        if response.status_code == 429 and attempt < LLM_RETRIES - 1:
+            time.sleep(float(response.headers.get("Retry-After", 2 ** attempt)))
+            continue
+        response.raise_for_status()
+        break
+    content = response.json()["choices"][0]["message"]["content"]
+
+    timestamp = analysis['created_at'][11:16]
+    corrections = []
+    for line in content.splitlines():
+        match = _NUMBERED_LINE.match(line)
+        if not match or int(match.group(1)) not in user_turns:
+            continue
+        user_turn = int(match.group(1))
+        for correction in extract_corrections(match.group(2)):
+            # Même convention qu'en direct : tour = index de la réponse de l'assistant
+            corrections.append({"timestamp": timestamp, "user_message": user_turns[user_turn],
+                                "turn": user_turn + 1, **correction})
+    return corrections
+
+
+def _write_batch(conn, job, analyses, last_id, processed):
+    """Réécrit une tranche et le point de reprise dans une seule transaction"""
+    with conn:
+        conn.executemany("DELETE FROM corrections WHERE conversation_id = ?",
+                         [(conv_id,) for conv_id, _ in analyses])
+        cursor = conn.cursor()
+        for conv_id, analysis in analyses:
+            insert_correction_rows(cursor, conv_id, analysis['created_at'],
+                                   analysis['corrections'], analysis['user_id'])
+        conn.executemany("""
+            UPDATE conversations
+            SET corrections_json = ?, correction_count = ?, message_count = ?
+            WHERE id = ?
+        """, [(json.dumps(analysis['corrections'], ensure_ascii=False), len(analysis['corrections']),
+               analysis['message_count'], conv_id) for conv_id, analysis in analyses])
+        conn.execute("""
+            INSERT INTO job_checkpoints (job, last_id, processed, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(job) DO UPDATE SET
+                last_id = excluded.last_id,
+                processed = excluded.processed,
+                updated_at = excluded.updated_at
+        """, (job, last_id, processed, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+
+def reanalyze(db_path=DB_PATH, user_id=None, workers=None, batch_size=BATCH_SIZE, restart=False,
+              llm=False, api_key=None, base_url=None, model=None, concurrency=LLM_CONCURRENCY,
+              progress=None):
+    """Réanalyse l'historique (un utilisateur ou tous) avec reprise sur point de contrôle
+
+    Retourne un rapport: conversations, modifiées, corrections, erreurs, durée, débit.
+    """
+    init_database(db_path)
+    workers = workers or os.cpu_count() or 1
+    if llm:
+        from routing import ROUTES
+        api_key = api_key or os.environ.get("GROQ_API_KEY")
+        if not api_key:
+            raise ValueError("--llm nécessite une clé API (GROQ_API_KEY ou --api-key)")
+        base_url = base_url or os.environ.get("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+        model = model or ROUTES['large']['model']
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+
+    job = job_name(user_id, llm)
+    last_id, processed = (0, 0) if restart else load_checkpoint(conn, job)
+    report = {'job': job, 'resumed_from': last_id, 'conversations': 0, 'changed': 0,
+              'corrections': 0, 'errors': [], 'elapsed': 0.0, 'rate': 0.0}
+    start = time.perf_counter()
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    llm_pool = ThreadPoolExecutor(max_workers=concurrency) if llm else None
+    try:
+        for rows in iter_batches(conn, last_id, batch_size, user_id):
+            analyze = partial(analyze_conversation, keep_messages=llm)
+            if executor:
+                results = executor.map(analyze, rows, chunksize=max(1, len(rows) // (workers * 4)))
+            else:
+                results = map(analyze, rows)
+
+            analyses = []
+            for conv_id, analysis, error in results:
+                if error:
+                    report['errors'].append(error)
+                else:
+                    analyses.append((conv_id, analysis))
+
+            if llm_pool:
+                reviews = llm_pool.map(
+                    lambda item: _safe_review(item[1], api_key, base_url, model), analyses
+                )
+                for (conv_id, analysis), (corrections, error) in zip(analyses, reviews):
+                    if error:
+                        # Échec du modèle : on garde l'extraction locale
+                        report['errors'].append(f"{conv_id}: {error}")
+                    else:
+                        analysis['corrections'] = corrections
+
+            last_id = rows[-1][0]
+            processed += len(rows)
+            _write_batch(conn, job, analyses, last_id, processed)
+
+            report['conversations'] += len(rows)
+            report['changed'] += sum(1 for _, a in analyses if len(a['corrections']) != a['previous_count'])
+            report['corrections'] += sum(len(a['corrections']) for _, a in analyses)
+            report['elapsed'] = time.perf_counter() - start
+            report['rate'] = report['conversations'] / report['elapsed'] if report['elapsed'] else 0.0
+            if progress:
+                progress(report)
+    finally:
+        if executor:
+            executor.shutdown()
+        if llm_pool:
+            llm_pool.shutdown()
+        conn.close()
+
+    report['elapsed'] = time.perf_counter() - start
+    report['rate'] = report['conversations'] / report['elapsed'] if report['elapsed'] else 0.0
+    return report
+
+
+def _safe_review(analysis, api_key, base_url, model):
+    try:
+        return review_with_llm(analysis, api_key, base_url, model), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _print_progress(report):
+    print(f"\r🔁 {report['conversations']} conversations | {report['changed']} modifiées | "
+          f"{report['corrections']} corrections | {len(report['errors'])} erreurs | "
+          f"{report['rate']:.0f} conv/s", end="", file=sys.stderr, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Réanalyse les corrections de tout l'historique")
+    parser.add_argument("--db", default=str(DB_PATH), help="Chemin de la base SQLite")
+    parser.add_argument("--user", help="Limiter à un utilisateur (tous par défaut)")
+    parser.add_argument("--workers", type=int, default=None, help="Nombre de processus d'analyse")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Conversations par transaction")
+    parser.add_argument("--restart", action="store_true", help="Ignorer le point de reprise")
+    parser.add_argument("--llm", action="store_true", help="Faire relire les messages par le modèle")
+    parser.add_argument("--api-key", help="Clé API (sinon GROQ_API_KEY)")
+    parser.add_argument("--model", help="Modèle utilisé avec --llm")
+    parser.add_argument("--concurrency", type=int, default=LLM_CONCURRENCY, help="Appels simultanés avec --llm")
+    args = parser.parse_args()
+
+    try:
+        report = reanalyze(args.db, user_id=args.user, workers=args.workers, batch_size=args.batch_size,
+                           restart=args.restart, llm=args.llm, api_key=args.api_key, model=args.model,
+                           concurrency=args.concurrency, progress=_print_progress)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(2)
+    print(file=sys.stderr)
+    for error in report['errors'][:20]:
+        print(f"⚠️ {error}", file=sys.stderr)
+    if report['resumed_from']:
+        print(f"↪️ Reprise après la conversation {report['resumed_from']}", file=sys.stderr)
+    print(f"✅ {report['conversations']} conversations réanalysées, {report['changed']} modifiées, "
+          f"{report['corrections']} corrections, {len(report['errors'])} erreurs en "
+          f"{report['elapsed']:.2f}s ({report['rate']:.0f} conv/s)")
+
+
+if __name__ == "__main__":
+    main()
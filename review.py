@@ -0,0 +1,179 @@
+"""Révision espacée (SM-2) des corrections reçues.
+
+Chaque correction distincte (original -> corrigé) devient un élément de révision
+dans la table review_items, indexée par (utilisateur, échéance) : « les N prochains
+éléments dus » est une lecture d'index, sans décoder le JSON des conversations.
+Pendant une session, les éléments chargés sont gardés dans un tas ordonné par
+échéance (ReviewQueue). Refaire la même erreur remet l'élément en tête.
+
+Usage (alimente la table depuis les corrections déjà enregistrées):
+    python review.py --db conversations.db [--user alice]
+"""
+import argparse
+import heapq
+import sqlite3
+from datetime import datetime, timedelta
+
+from database import DB_PATH, DEFAULT_USER, init_database
+
+MIN_EASE = 1.3
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_COLUMNS = "id, original, corrected, category, ease, interval_days, repetitions, lapses, due_at"
+
+
+def _now(now=None):
+    return (now or datetime.now()).strftime(DATE_FORMAT)
+
+
+def _connect(db_path, conn):
+    return (conn, False) if conn is not None else (sqlite3.connect(db_path), True)
+
+
+def schedule_corrections(corrections, user_id=DEFAULT_USER, db_path=DB_PATH, conn=None, now=None):
+    """Ajoute les corrections à réviser (dues tout de suite)
+
+    Une erreur déjà connue est une rechute : l'élément redevient dû et son
+    intervalle repart de zéro.
+    """
+    rows = [
+        (user_id, c['original'], c['corrected'], c.get('category', 'other'), _now(now))
+        for c in corrections if c.get('original') and c.get('corrected')
+    ]
+    if not rows:
+        return 0
+    conn, own_connection = _connect(db_path, conn)
+    conn.executemany("""
+        INSERT INTO review_items (user_id, original, corrected, category, due_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(user_id, original, corrected) DO UPDATE SET
+            repetitions = 0,
+            interval_days = 0,
+            lapses = lapses + 1,
+            ease = MAX(ease - 0.2, 1.3),
+            due_at = MIN(due_at, excluded.due_at)
+    """, rows)
+    if own_connection:
+        conn.commit()
+        conn.close()
+    return len(rows)
+
+
+def sync_from_corrections(user_id=DEFAULT_USER, db_path=DB_PATH, conn=None, now=None):
+    """Crée les éléments manquants depuis la table corrections (imports, réanalyse)"""
+    conn, own_connection = _connect(db_path, conn)
+    before = conn.total_changes
+    conn.execute("""
+        INSERT OR IGNORE INTO review_items (user_id, original, corrected, category, due_at)
+        SELECT user_id, original, corrected, MAX(category), ?
+        FROM corrections
+        WHERE user_id = ?
+        GROUP BY original, corrected
+    """, (_now(now), user_id))
+    added = conn.total_changes - before
+    if own_connection:
+        conn.commit()
+        conn.close()
+    return added
+
+
+def due_items(user_id=DEFAULT_USER, limit=10, db_path=DB_PATH, now=None):
+    """Les `limit` éléments dus les plus anciens (parcours de l'index user_id, due_at)"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(f"""
+        SELECT {_COLUMNS}
+        FROM review_items
+        WHERE user_id = ? AND due_at <= ?
+        ORDER BY due_at
+        LIMIT ?
+    """, (user_id, _now(now), limit)).fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+
+def count_due(user_id=DEFAULT_USER, db_path=DB_PATH, now=None):
+    conn = sqlite3.connect(db_path)
+    count = conn.execute("SELECT COUNT(*) FROM review_items WHERE user_id = ? AND due_at <= ?",
+                         (user_id, _now(now))).fetchone()[0]
+    conn.close()
+    return count
+
+
+def sm2(item, quality, now=None):
+    """Applique SM-2 à un élément pour une note de 0 (oublié) à 5 (parfait)"""
+    item = dict(item)
+    if quality < 3:
+        item['repetitions'] = 0
+        item['interval_days'] = 1
+        item['lapses'] += 1
+    else:
+        item['repetitions'] += 1
+        if item['repetitions'] == 1:
+            item['interval_days'] = 1
+        elif item['repetitions'] == 2:
+            item['interval_days'] = 6
+        else:
+            item['interval_days'] = round(item['interval_days'] * item['ease'], 1)
+    item['ease'] = max(MIN_EASE, item['ease'] + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    now = now or datetime.now()
+    item['due_at'] = _now(now + timedelta(days=item['interval_days']))
+    item['last_reviewed'] = _now(now)
+    return item
+
+
+def grade(item, quality, user_id=DEFAULT_USER, db_path=DB_PATH, conn=None, now=None):
+    """Enregistre la note d'un élément; retourne l'élément reprogrammé"""
+    updated = sm2(item, quality, now)
+    conn, own_connection = _connect(db_path, conn)
+    conn.execute("""
+        UPDATE review_items
+        SET ease = ?, interval_days = ?, repetitions = ?, lapses = ?, due_at = ?, last_reviewed = ?
+        WHERE id = ? AND user_id = ?
+    """, (updated['ease'], updated['interval_days'], updated['repetitions'], updated['lapses'],
+          updated['due_at'], updated['last_reviewed'], updated['id'], user_id))
+    if own_connection:
+        conn.commit()
+        conn.close()
+    return updated
+
+
+class ReviewQueue:
+    """Éléments de la session dans un tas ordonné par échéance"""
+
+    def __init__(self, items=()):
+        self.heap = [(item['due_at'], item['id'], item) for item in items]
+        heapq.heapify(self.heap)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def peek(self, n=1):
+        """Les `n` prochains éléments, sans les retirer"""
+        return [item for _, _, item in heapq.nsmallest(n, self.heap)]
+
+    def pop(self):
+        return heapq.heappop(self.heap)[2] if self.heap else None
+
+    def push(self, item):
+        heapq.heappush(self.heap, (item['due_at'], item['id'], item))
+
+    def remove(self, item_id):
+        """Retire un élément (noté pendant la session)"""
+        self.heap = [entry for entry in self.heap if entry[1] != item_id]
+        heapq.heapify(self.heap)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Alimente la révision espacée depuis les corrections enregistrées")
+    parser.add_argument("--db", default=str(DB_PATH), help="Chemin de la base SQLite")
+    parser.add_argument("--user", default=DEFAULT_USER, help="Utilisateur")
+    args = parser.parse_args()
+
+    init_database(args.db)
+    added = sync_from_corrections(args.user, args.db)
+    print(f"✅ {added} éléments ajoutés, {count_due(args.user, args.db)} à réviser")
+
+
+if __name__ == "__main__":
+    main()
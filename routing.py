@@ -0,0 +1,160 @@
+"""Choix du modèle et de max_tokens à chaque tour (routage adaptatif).
+
+Un tour court de débutant part vers un petit modèle rapide; les niveaux avancés,
+les messages longs et les tours où des corrections sont probables vont vers le
+grand modèle. Si le grand modèle dépasse le budget de latence ou approche de son
+quota, les tours qui peuvent s'en passer sont rabattus sur le petit.
+
+Budget configurable: ENGLISH_TUTOR_LATENCY_BUDGET_MS (défaut 2500 ms, p95 visé).
+"""
+import os
+import threading
+import time
+from collections import deque
+from datetime import date
+
+LATENCY_BUDGET_MS = float(os.environ.get("ENGLISH_TUTOR_LATENCY_BUDGET_MS", 2500))
+
+# Quotas journaliers indicatifs (à ajuster selon le compte); les en-têtes
+# x-ratelimit-* renvoyés par l'API priment quand ils sont présents.
+ROUTES = {
+    'fast': {'model': "llama-3.1-8b-instant", 'max_tokens': 300, 'daily_requests': 14400},
+    'large': {'model': "llama-3.3-70b-versatile", 'max_tokens': 800, 'daily_requests': 1000},
+}
+
+SHORT_INPUT_WORDS = 12
+LONG_INPUT_WORDS = 40
+# En dessous de cette part de quota restante, le grand modèle est réservé aux tours qui l'exigent
+QUOTA_RESERVE = 0.1
+# Nombre minimal de mesures avant de comparer le p95 au budget
+MIN_SAMPLES = 5
+
+
+class RouteStats:
+    """Latences et consommation d'une route, en mémoire (partagées entre sessions)"""
+
+    def __init__(self):
+        self.latencies = deque(maxlen=200)
+        self.day = date.today()
+        self.requests = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.remaining_requests = None
+        self.remaining_tokens = None
+        self.updated_at = None
+
+    def p95(self):
+        if len(self.latencies) < MIN_SAMPLES:
+            return None
+        values = sorted(self.latencies)
+        return values[min(len(values) - 1, int(len(values) * 0.95))]
+
+
+_stats = {name: RouteStats() for name in ROUTES}
+_lock = threading.Lock()
+
+
+def _stats_for(route):
+    stats = _stats[route]
+    if stats.day != date.today():
+        # Les quotas sont journaliers
+        stats = _stats[route] = RouteStats()
+    return stats
+
+
+def _quota_left(route):
+    """Part du quota journalier restante (0..1)"""
+    stats = _stats_for(route)
+    daily = ROUTES[route]['daily_requests']
+    remaining = stats.remaining_requests
+    if remaining is None:
+        remaining = daily - stats.requests
+    return max(0.0, min(1.0, remaining / daily)) if daily else 1.0
+
+
+def choose_route(level, user_input, recent_corrections=0, latency_budget_ms=LATENCY_BUDGET_MS):
+    """Retourne {route, model, max_tokens, reason} pour ce tour
+
+    `recent_corrections`: corrections relevées sur les derniers tours (signal que
+    l'utilisateur fait des erreurs et qu'une réponse plus soignée est utile).
+    """
+    words = len(user_input.split())
+    advanced = level.startswith("Avancé")
+    beginner = level.startswith("Débutant")
+
+    if advanced:
+        route, reason, required = 'large', "niveau avancé", True
+    elif words >= LONG_INPUT_WORDS:
+        route, reason, required = 'large', "message long", True
+    elif recent_corrections:
+        route, reason, required = 'large', "corrections récentes", False
+    elif beginner or words <= SHORT_INPUT_WORDS:
+        route, reason, required = 'fast', "tour court", False
+    else:
+        route, reason, required = 'large', "tour standard", False
+
+    if route == 'large' and not required:
+        with _lock:
+            p95 = _stats_for('large').p95()
+            quota_left = _quota_left('large')
+        if p95 is not None and p95 > latency_budget_ms:
+            route, reason = 'fast', f"p95 {p95:.0f} ms > budget {latency_budget_ms:.0f} ms"
+        elif quota_left < QUOTA_RESERVE:
+            route, reason = 'fast', f"quota restant {quota_left:.0%}"
+
+    max_tokens = ROUTES[route]['max_tokens']
+    if beginner:
+        # Les réponses aux débutants restent courtes (2-3 phrases)
+        max_tokens = min(max_tokens, 250)
+    return {'route': route, 'model': ROUTES[route]['model'], 'max_tokens': max_tokens, 'reason': reason}
+
+
+def record_call(route, duration_ms, ok=True, status=None, tokens_in=None, tokens_out=None, headers=None):
+    """Enregistre un appel: latence, jetons et quota restant (en-têtes x-ratelimit-*)"""
+    with _lock:
+        stats = _stats_for(route)
+        stats.requests += 1
+        stats.updated_at = time.time()
+        if ok:
+            stats.latencies.append(duration_ms)
+        else:
+            stats.errors += 1
+        if status == 429:
+            stats.rate_limited += 1
+            stats.remaining_requests = 0
+        stats.tokens_in += tokens_in or 0
+        stats.tokens_out += tokens_out or 0
+        headers = headers or {}
+        for header, attribute in (("x-ratelimit-remaining-requests", 'remaining_requests'),
+                                  ("x-ratelimit-remaining-tokens", 'remaining_tokens')):
+            value = headers.get(header)
+            if value is not None:
+                try:
+                    setattr(stats, attribute, int(value))
+                except ValueError:
+                    pass
+
+
+def route_metrics():
+    """Une ligne par route pour le panneau admin"""
+    rows = []
+    with _lock:
+        for name, config in ROUTES.items():
+            stats = _stats_for(name)
+            values = sorted(stats.latencies)
+            rows.append({
+                'route': name,
+                'model': config['model'],
+                'requests': stats.requests,
+                'errors': stats.errors,
+                'rate_limited': stats.rate_limited,
+                'p50_ms': values[len(values) // 2] if values else 0.0,
+                'p95_ms': stats.p95() or 0.0,
+                'tokens_in': stats.tokens_in,
+                'tokens_out': stats.tokens_out,
+                'quota_left': _quota_left(name),
+                'remaining_tokens': stats.remaining_tokens,
+            })
+    return rows
@@ -0,0 +1,348 @@
+"""Recherche sémantique locale dans l'historique (« les conversations où j'ai parlé de X »).
+
+Un vecteur par conversation (titre, sujet et messages de l'utilisateur) est stocké
+dans un index NumPy mappé en mémoire, un dossier par utilisateur :
+    vector_index/<utilisateur>/vectors.f32   vecteurs normalisés (capacité x dim)
+    vector_index/<utilisateur>/ids.i64       identifiant de conversation par ligne (-1 = supprimée)
+    vector_index/<utilisateur>/meta.json     modèle, dimension, nombre de lignes
+
+L'index est complété à chaque sauvegarde; la recherche est un produit matriciel par
+tranches suivi d'un top-k (cosinus), sans réseau ni base vectorielle externe.
+
+Modèle d'embedding: sentence-transformers (all-MiniLM-L6-v2, CPU) s'il est installé
+(dépendance optionnelle, voir requirements.txt), sinon un embedding local par hachage
+des mots et bigrammes : lexical, il trouve des mots proches mais pas le sens.
+Le modèle enregistré dans l'index est toujours réutilisé pour les requêtes.
+
+L'application met à jour l'index avec index_later()/remove_later() après le COMMIT
+de la sauvegarde : le calcul des vecteurs (et le premier chargement du modèle) se
+fait dans un thread dédié, hors de la transaction et du thread écrivain. La
+reconstruction complète (rebuild_later) passe par le même thread.
+
+Usage:
+    python semantic_index.py build --db conversations.db [--user alice]
+    python semantic_index.py search "planning a trip abroad" [--user alice] [--k 5]
+"""
+import argparse
+import importlib.util
+import json
+import math
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from database import DB_PATH, DEFAULT_USER
+from lexicon import tokenize
+
+INDEX_DIR = Path("vector_index")
+PREFERRED_MODEL = os.environ.get("ENGLISH_TUTOR_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+HASHING_MODEL = "hashing-256"
+HASHING_DIM = 256
+INITIAL_CAPACITY = 1024
+# Lignes multipliées par tranche lors de la recherche (borne la mémoire temporaire)
+SEARCH_CHUNK = 65536
+
+_STOPWORDS = frozenset(
+    "i you he she it we they me him her us them my your his its our their a an the is are was were be "
+    "been am do does did have has had to of in on at for with and or but so that this these those what "
+    "when where why how not no yes very really just also too can could would will shall should".split()
+)
+
+_models = {}
+_locks = {}
+_locks_guard = threading.Lock()
+# Mises à jour de l'index demandées par l'application, exécutées dans l'ordre
+_updates = ThreadPoolExecutor(max_workers=1, thread_name_prefix="semantic-index")
+
+
+def _lock_for(index_dir):
+    with _locks_guard:
+        return _locks.setdefault(str(index_dir), threading.Lock())
+
+
+def _hashing_embed(texts):
+    """Sac de mots et bigrammes haché (signé), pondération sous-linéaire"""
+    vectors = np.zeros((len(texts), HASHING_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        words = [w for w in tokenize(text) if w not in _STOPWORDS]
+        counts = {}
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            counts[feature] = counts.get(feature, 0) + 1
+        for feature, count in counts.items():
+            digest = zlib.crc32(feature.encode('utf-8'))
+            sign = 1.0 if digest & 1 else -1.0
+            vectors[row, (digest >> 1) % HASHING_DIM] += sign * (1.0 + math.log(count))
+    return vectors
+
+
+def _load_model(name):
+    """Modèle d'embedding (chargé une fois par processus); None pour le hachage"""
+    if name == HASHING_MODEL:
+        return None
+    if name not in _models:
+        from sentence_transformers import SentenceTransformer
+        _models[name] = SentenceTransformer(name, device="cpu")
+    return _models[name]
+
+
+@lru_cache(maxsize=1)
+def semantic_model_available():
+    """sentence-transformers est installé (sinon l'index est lexical)"""
+    return importlib.util.find_spec("sentence_transformers") is not None
+
+
+def resolve_model(name=None):
+    """Modèle demandé s'il est disponible, sinon l'embedding par hachage"""
+    name = name or PREFERRED_MODEL
+    if name == HASHING_MODEL:
+        return name
+    try:
+        _load_model(name)
+        return name
+    except Exception:
+        # Paquet absent ou modèle introuvable hors ligne
+        return HASHING_MODEL
+
+
+def embed(texts, model_name):
+    """Vecteurs normalisés (float32) pour une liste de textes"""
+    model = _load_model(model_name)
+    if model is None:
+        vectors = _hashing_embed(texts)
+    else:
+        vectors = np.asarray(model.encode(texts, batch_size=64, show_progress_bar=False), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def conversation_text(conv):
+    """Texte indexé : titre, sujet et messages de l'utilisateur"""
+    messages = conv.get('messages') or []
+    user_text = " ".join(m.get('content') or "" for m in messages if m.get('role') == 'user')
+    return f"{conv.get('title', '')}. {conv.get('topic', '')}. {user_text}"
+
+
+class VectorIndex:
+    """Index mappé en mémoire d'un utilisateur"""
+
+    def __init__(self, user_id=DEFAULT_USER, index_dir=INDEX_DIR):
+        self.dir = Path(index_dir) / user_id
+        self.meta_path = self.dir / "meta.json"
+        self.lock = _lock_for(self.dir)
+
+    def meta(self):
+        if not self.meta_path.exists():
+            return None
+        with open(self.meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_meta(self, meta):
+        tmp_path = self.meta_path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        # Remplacement atomique : un lecteur voit l'ancien ou le nouveau nombre de lignes
+        os.replace(tmp_path, self.meta_path)
+
+    def _arrays(self, meta, mode):
+        shape = (meta['capacity'], meta['dim'])
+        vectors = np.memmap(self.dir / "vectors.f32", dtype=np.float32, mode=mode, shape=shape)
+        ids = np.memmap(self.dir / "ids.i64", dtype=np.int64, mode=mode, shape=(meta['capacity'],))
+        return vectors, ids
+
+    def _create(self, model_name, dim, capacity=INITIAL_CAPACITY):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        meta = {'model': model_name, 'dim': dim, 'count': 0, 'capacity': capacity}
+        for name, itemsize, size in (("vectors.f32", 4, capacity * dim), ("ids.i64", 8, capacity)):
+            with open(self.dir / name, 'wb') as f:
+                f.truncate(size * itemsize)
+        self._write_meta(meta)
+        return meta
+
+    def _grow(self, meta, needed):
+        capacity = meta['capacity']
+        while capacity < needed:
+            capacity *= 2
+        if capacity != meta['capacity']:
+            # Agrandir les fichiers : les lignes existantes restent en place
+            for name, itemsize, size in (("vectors.f32", 4, capacity * meta['dim']), ("ids.i64", 8, capacity)):
+                with open(self.dir / name, 'r+b') as f:
+                    f.truncate(size * itemsize)
+            meta['capacity'] = capacity
+        return meta
+
+    def add(self, conversations, model_name=None):
+        """Ajoute ou remplace les vecteurs de conversations [(id, texte)]; retourne le nombre ajouté"""
+        if not conversations:
+            return 0
+        with self.lock:
+            meta = self.meta()
+            model_name = meta['model'] if meta else resolve_model(model_name)
+            vectors_new = embed([text for _, text in conversations], model_name)
+            if meta is None:
+                meta = self._create(model_name, vectors_new.shape[1])
+
+            vectors, ids = self._arrays(meta, "r+")
+            current = np.asarray(ids[:meta['count']])
+            new_ids = [conv_id for conv_id, _ in conversations]
+            existing = {int(current[row]): row for row in np.flatnonzero(np.isin(current, new_ids))}
+            appended = [(conv_id, vector) for (conv_id, _), vector in zip(conversations, vectors_new)
+                        if conv_id not in existing]
+            for (conv_id, _), vector in zip(conversations, vectors_new):
+                if conv_id in existing:
+                    vectors[existing[conv_id]] = vector
+
+            if appended:
+                meta = self._grow(meta, meta['count'] + len(appended))
+                vectors, ids = self._arrays(meta, "r+")
+                start = meta['count']
+                vectors[start:start + len(appended)] = np.stack([vector for _, vector in appended])
+                ids[start:start + len(appended)] = [conv_id for conv_id, _ in appended]
+                meta['count'] = start + len(appended)
+            vectors.flush()
+            ids.flush()
+            self._write_meta(meta)
+            return len(appended)
+
+    def remove(self, conv_id):
+        """Retire une conversation (ligne marquée supprimée, vecteur mis à zéro)"""
+        with self.lock:
+            meta = self.meta()
+            if not meta:
+                return False
+            vectors, ids = self._arrays(meta, "r+")
+            rows = np.flatnonzero(ids[:meta['count']] == conv_id)
+            for row in rows:
+                ids[row] = -1
+                vectors[row] = 0.0
+            vectors.flush()
+            ids.flush()
+            return len(rows) > 0
+
+    def search(self, queries, k=10):
+        """Top-k cosinus pour une ou plusieurs requêtes; retourne [[(id, score)]] par requête"""
+        if isinstance(queries, str):
+            queries = [queries]
+        meta = self.meta()
+        if not meta or not meta['count']:
+            return [[] for _ in queries]
+        count = meta['count']
+        vectors, ids = self._arrays(meta, "r")
+        query_vectors = embed(queries, meta['model'])
+
+        scores = np.empty((len(queries), count), dtype=np.float32)
+        for start in range(0, count, SEARCH_CHUNK):
+            end = min(start + SEARCH_CHUNK, count)
+            scores[:, start:end] = query_vectors @ vectors[start:end].T
+        scores[:, np.asarray(ids[:count]) < 0] = -np.inf
+
+        results = []
+        k = min(k, count)
+        for row in scores:
+            top = np.argpartition(-row, k - 1)[:k]
+            top = top[np.argsort(-row[top])]
+            results.append([(int(ids[i]), float(row[i])) for i in top if np.isfinite(row[i]) and row[i] > 0])
+        return results
+
+
+def index_later(user_id, conv_id, text, index_dir=INDEX_DIR):
+    """Met en file l'ajout d'une conversation à l'index; retourne un Future"""
+    return _updates.submit(VectorIndex(user_id, index_dir).add, [(conv_id, text)])
+
+
+def remove_later(user_id, conv_id, index_dir=INDEX_DIR):
+    """Met en file le retrait d'une conversation de l'index; retourne un Future"""
+    return _updates.submit(VectorIndex(user_id, index_dir).remove, conv_id)
+
+
+def rebuild_index(user_id=DEFAULT_USER, db_path=DB_PATH, index_dir=INDEX_DIR, model_name=None,
+                  batch_size=2000, progress=None):
+    """Reconstruit l'index d'un utilisateur depuis la base; retourne le nombre de conversations
+
+    Le nouvel index est construit dans un dossier temporaire, puis mis à la place de
+    l'ancien sous le verrou de l'index : une mise à jour concurrente n'écrit jamais
+    dans des fichiers supprimés. `progress(indexées, total)` suit chaque tranche.
+    """
+    index = VectorIndex(user_id, index_dir)
+    model_name = resolve_model(model_name)
+    Path(index_dir).mkdir(parents=True, exist_ok=True)
+    staging_root = Path(tempfile.mkdtemp(prefix=".rebuild-", dir=index_dir))
+    try:
+        staging = VectorIndex(user_id, staging_root)
+        conn = sqlite3.connect(db_path)
+        expected = conn.execute("SELECT COUNT(*) FROM conversations WHERE user_id = ?", (user_id,)).fetchone()[0]
+        cursor = conn.execute(
+            "SELECT id, title, topic, messages_json FROM conversations WHERE user_id = ? ORDER BY id", (user_id,)
+        )
+        total = 0
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            batch = [(conv_id, conversation_text({'title': title, 'topic': topic,
+                                                  'messages': json.loads(messages_json)}))
+                     for conv_id, title, topic, messages_json in rows]
+            total += staging.add(batch, model_name)
+            if progress:
+                progress(total, expected)
+        conn.close()
+
+        with index.lock:
+            # Renommages dans le même dossier : les recherches en cours gardent les anciens fichiers
+            if index.dir.exists():
+                os.replace(index.dir, staging_root / f"{user_id}.old")
+            if staging.dir.exists():
+                os.replace(staging.dir, index.dir)
+    finally:
+        shutil.rmtree(staging_root, ignore_errors=True)
+    return total
+
+
+def rebuild_later(user_id, db_path=DB_PATH, index_dir=INDEX_DIR, progress=None):
+    """Met en file la reconstruction, après les mises à jour déjà demandées; retourne un Future"""
+    return _updates.submit(rebuild_index, user_id, db_path, index_dir, progress=progress)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index sémantique local des conversations")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="Reconstruit l'index depuis la base")
+    build.add_argument("--db", default=str(DB_PATH))
+    build.add_argument("--user", default=DEFAULT_USER)
+    build.add_argument("--model", help=f"Modèle d'embedding (défaut {PREFERRED_MODEL}, repli {HASHING_MODEL})")
+    search = subparsers.add_parser("search", help="Cherche des conversations proches d'une requête")
+    search.add_argument("query")
+    search.add_argument("--user", default=DEFAULT_USER)
+    search.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        total = rebuild_index(args.user, args.db, model_name=args.model,
+                              progress=lambda n, expected: print(f"\r🧠 {n}/{expected} conversations",
+                                                                 end="", file=sys.stderr))
+        print(file=sys.stderr)
+        meta = VectorIndex(args.user).meta() or {}
+        print(f"✅ {total} conversations indexées ({meta.get('model', '—')}) en {time.perf_counter() - start:.2f}s")
+        return
+
+    start = time.perf_counter()
+    results = VectorIndex(args.user).search(args.query, args.k)[0]
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    for conv_id, score in results:
+        print(f"{conv_id}\t{score:.3f}")
+    print(f"⏱️ {elapsed_ms:.1f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
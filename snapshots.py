@@ -0,0 +1,156 @@
+"""Instantanés de session pour reprendre une conversation après rafraîchissement ou reconnexion.
+
+L'état utile de la session (messages, corrections, compteurs, titre) est écrit,
+compressé, dans la table session_snapshots sous un jeton de session (?session=...
+dans l'URL). L'audio n'y figure que sous forme de références vers un cache disque
+adressé par contenu (texte + voix) : un clip déjà synthétisé n'est jamais refait,
+ni à la reprise, ni au rechargement d'une conversation sauvegardée.
+
+La reprise est une seule lecture de ligne suivie d'une décompression. Comme les
+instantanés abandonnés, les clips inutilisés depuis MAX_AGE_DAYS sont supprimés,
+et le cache est ramené sous ENGLISH_TUTOR_AUDIO_CACHE_MB en retirant les clips
+les moins récemment servis.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from database import DB_PATH, DEFAULT_USER
+
+AUDIO_CACHE_DIR = Path("audio_cache")
+TOKEN_PATTERN = re.compile(r"^[a-f0-9]{16,64}$")
+MAX_AGE_DAYS = 30
+COMPRESSION_LEVEL = 6
+AUDIO_CACHE_MAX_MB = int(os.environ.get("ENGLISH_TUTOR_AUDIO_CACHE_MB", "500"))
+# Nettoyage du cache audio au plus une fois par AUDIO_PRUNE_INTERVAL_S (par processus)
+AUDIO_PRUNE_INTERVAL_S = 3600
+
+_audio_prune_lock = threading.Lock()
+_last_audio_prune = None
+
+
+def audio_key(text, voice):
+    """Clé de cache d'un clip : empreinte du texte et de la voix"""
+    return hashlib.sha256(f"{voice}\n{text}".encode('utf-8')).hexdigest()
+
+
+def _audio_path(key, cache_dir=AUDIO_CACHE_DIR):
+    return Path(cache_dir) / key[:2] / f"{key}.mp3"
+
+
+def load_audio(key, cache_dir=AUDIO_CACHE_DIR):
+    """Clip en cache, ou None (la date de modification marque le dernier usage)"""
+    path = _audio_path(key, cache_dir)
+    try:
+        audio_bytes = path.read_bytes()
+        os.utime(path)
+    except OSError:
+        return None
+    return audio_bytes
+
+
+def store_audio(key, audio_bytes, cache_dir=AUDIO_CACHE_DIR):
+    """Écrit un clip dans le cache (une seule fois par clé, écriture atomique)"""
+    path = _audio_path(key, cache_dir)
+    if path.exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_bytes(audio_bytes)
+    os.replace(tmp_path, path)
+    return path
+
+
+def encode_snapshot(state):
+    return zlib.compress(json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode('utf-8'),
+                         COMPRESSION_LEVEL)
+
+
+def save_snapshot(token, state, user_id=DEFAULT_USER, db_path=DB_PATH, conn=None):
+    """Enregistre (remplace) l'instantané d'une session"""
+    own_connection = conn is None
+    if own_connection:
+        conn = sqlite3.connect(db_path)
+    conn.execute("""
+        INSERT INTO session_snapshots (token, user_id, updated_at, payload)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(token) DO UPDATE SET
+            user_id = excluded.user_id,
+            updated_at = excluded.updated_at,
+            payload = excluded.payload
+    """, (token, user_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), encode_snapshot(state)))
+    if own_connection:
+        conn.commit()
+        conn.close()
+
+
+def load_snapshot(token, user_id=DEFAULT_USER, db_path=DB_PATH):
+    """État enregistré pour ce jeton et cet utilisateur, ou None"""
+    conn = sqlite3.connect(db_path)
+    row = conn.execute("SELECT payload FROM session_snapshots WHERE token = ? AND user_id = ?",
+                       (token, user_id)).fetchone()
+    conn.close()
+    if not row:
+        return None
+    return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+
+def prune_snapshots(max_age_days=MAX_AGE_DAYS, db_path=DB_PATH, conn=None):
+    """Supprime les instantanés abandonnés; retourne le nombre supprimé"""
+    own_connection = conn is None
+    if own_connection:
+        conn = sqlite3.connect(db_path)
+    limit = (datetime.now() - timedelta(days=max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
+    deleted = conn.execute("DELETE FROM session_snapshots WHERE updated_at < ?", (limit,)).rowcount
+    if own_connection:
+        conn.commit()
+        conn.close()
+    return deleted
+
+
+def prune_audio_cache(max_age_days=MAX_AGE_DAYS, max_bytes=AUDIO_CACHE_MAX_MB * 1024 * 1024,
+                      cache_dir=AUDIO_CACHE_DIR):
+    """Supprime les clips inutilisés; retourne le nombre de fichiers supprimés
+
+    Les clips non servis depuis `max_age_days` partent d'abord, puis les moins
+    récemment servis jusqu'à repasser sous `max_bytes`.
+    """
+    files = []
+    for path in Path(cache_dir).glob("*/*"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+
+    limit = time.time() - max_age_days * 86400
+    total = sum(size for _, size, _ in files)
+    deleted = 0
+    for mtime, size, path in files:
+        if mtime >= limit and total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+        deleted += 1
+    return deleted
+
+
+def prune_audio_cache_later(cache_dir=AUDIO_CACHE_DIR):
+    """Lance le nettoyage du cache audio dans un thread, au plus une fois par AUDIO_PRUNE_INTERVAL_S"""
+    global _last_audio_prune
+    with _audio_prune_lock:
+        if _last_audio_prune is not None and time.monotonic() - _last_audio_prune < AUDIO_PRUNE_INTERVAL_S:
+            return None
+        _last_audio_prune = time.monotonic()
+    thread = threading.Thread(target=prune_audio_cache, kwargs={'cache_dir': cache_dir},
+                              name="audio-cache-prune", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,343 @@
+"""Mesures de latence par tour de conversation (STT, LLM, TTS, base de données, rendu).
+
+Chaque étape est chronométrée avec `stage()`; les mesures d'un tour sont écrites
+ensemble dans la table turn_metrics (et dans un fichier JSONL si METRICS_LOG est défini).
+Les mesures hors tour (chargement de l'historique, acquittement des sauvegardes)
+sont gardées en mémoire et écrites par lots. Toutes les écritures
+passent par la file d'écriture en arrière-plan (write_behind.py), jamais par le
+thread du script; les mesures plus anciennes que RETENTION_DAYS sont supprimées.
+
+Usage (export pour un collecteur Prometheus):
+    python telemetry.py --db conversations.db             # affiche les métriques
+    python telemetry.py --db conversations.db --serve 9108  # expose /metrics
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+import atexit
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import write_behind
+from database import DB_PATH
+
+# Fichier JSONL optionnel (une ligne par étape mesurée)
+METRICS_LOG = os.environ.get("METRICS_LOG")
+
+PERCENTILES = (50, 95, 99)
+
+# Pseudo-étapes qui ne sont pas des latences : économie estimée de la préparation
+# anticipée et entrées dédoublonnées (durée nulle, seul le nombre compte)
+SAVING_STAGES = ("prefetch_saved",)
+DEDUP_PREFIX = "dedup_"
+
+# Mesures hors tour : écrites par lots de FLUSH_SIZE ou toutes les FLUSH_INTERVAL_S secondes
+FLUSH_SIZE = 200
+FLUSH_INTERVAL_S = 30
+MAX_PENDING = 5000
+# Durée de conservation de turn_metrics (purge au plus une fois par PRUNE_INTERVAL_S)
+RETENTION_DAYS = int(os.environ.get("ENGLISH_TUTOR_METRICS_RETENTION_DAYS", "30"))
+PRUNE_INTERVAL_S = 3600
+
+# Streamlit exécute chaque session dans son propre thread
+_local = threading.local()
+
+_pending = deque(maxlen=MAX_PENDING)
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+_last_prune = None
+
+
+class Turn:
+    """Un tour de conversation : entrée utilisateur -> réponse affichée"""
+
+    def __init__(self):
+        self.turn_id = uuid.uuid4().hex[:12]
+        self.created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.started = time.perf_counter()
+        self.records = []
+
+
+def _insert_rows(conn, rows, prune_before=None):
+    """Exécuté par le thread écrivain, dans sa transaction"""
+    conn.executemany("""
+        INSERT INTO turn_metrics
+        (turn_id, created_at, stage, duration_ms, payload_in, payload_out,
+         tokens_in, tokens_out, model, ok)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    if prune_before:
+        conn.execute("DELETE FROM turn_metrics WHERE created_at < ?", (prune_before,))
+
+
+def _write_records(records, db_path=DB_PATH):
+    """Met en file l'écriture des mesures (sans attendre le COMMIT)"""
+    global _last_prune
+    if not records:
+        return
+    rows = [(
+        r.get('turn_id'), r['created_at'], r['stage'], r['duration_ms'],
+        r.get('payload_in'), r.get('payload_out'), r.get('tokens_in'), r.get('tokens_out'),
+        r.get('model'), int(r.get('ok', True))
+    ) for r in records]
+
+    prune_before = None
+    with _pending_lock:
+        if _last_prune is None or time.monotonic() - _last_prune >= PRUNE_INTERVAL_S:
+            _last_prune = time.monotonic()
+            prune_before = (datetime.now() - timedelta(days=RETENTION_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        write_behind.get_writer(db_path).submit(lambda conn: _insert_rows(conn, rows, prune_before))
+    except Exception:
+        # La télémétrie ne doit jamais bloquer la conversation (file pleine ou fermée)
+        pass
+
+    if METRICS_LOG:
+        with open(METRICS_LOG, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def _add(record):
+    """Rattache une mesure au tour en cours, sinon la garde pour la prochaine écriture groupée"""
+    turn = current_turn()
+    if turn:
+        record['turn_id'] = turn.turn_id
+        turn.records.append(record)
+    else:
+        with _pending_lock:
+            _pending.append(record)
+
+
+def _take_pending(force=False):
+    """Retire les mesures hors tour si un lot est prêt (ou toutes avec `force`)"""
+    global _last_flush
+    with _pending_lock:
+        due = len(_pending) >= FLUSH_SIZE or time.monotonic() - _last_flush >= FLUSH_INTERVAL_S
+        if not _pending or not (force or due):
+            return []
+        records = list(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+    return records
+
+
+def flush(db_path=DB_PATH, force=True):
+    """Écrit les mesures hors tour en attente"""
+    _write_records(_take_pending(force), db_path)
+
+
+def begin_run():
+    """Marque le début d'une exécution du script Streamlit"""
+    _local.run_started = time.perf_counter()
+    _local.turn = None
+
+
+def current_turn():
+    return getattr(_local, 'turn', None)
+
+
+def start_turn():
+    """Démarre la mesure d'un tour (à l'arrivée d'un message texte ou audio)"""
+    _local.turn = Turn()
+    return _local.turn
+
+
+@contextmanager
+def stage(name, **fields):
+    """Chronomètre une étape; le dictionnaire retourné peut être complété
+
+    Champs reconnus: payload_in, payload_out (octets), tokens_in, tokens_out, model.
+    """
+    record = {'stage': name, 'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"), **fields}
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception:
+        record['ok'] = False
+        raise
+    finally:
+        record['duration_ms'] = (time.perf_counter() - start) * 1000
+        _add(record)
+
+
+def record(name, duration_ms, **fields):
+    """Ajoute une mesure déjà chronométrée (acquittement d'une sauvegarde, gain de la préparation)"""
+    entry = {'stage': name, 'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+             'duration_ms': duration_ms, **fields}
+    _add(entry)
+
+
+def finish_run(db_path=DB_PATH):
+    """Termine l'exécution : enregistre la durée totale du tour et du rendu
+
+    Les mesures hors tour en attente partent avec celles du tour, ou seules quand
+    un lot est prêt.
+    """
+    turn = current_turn()
+    if not turn:
+        flush(db_path, force=False)
+        return None
+    now = time.perf_counter()
+    turn.records.append({
+        'turn_id': turn.turn_id, 'created_at': turn.created_at,
+        'stage': 'total', 'duration_ms': (now - turn.started) * 1000
+    })
+    run_started = getattr(_local, 'run_started', None)
+    if run_started is not None:
+        turn.records.append({
+            'turn_id': turn.turn_id, 'created_at': turn.created_at,
+            'stage': 'rerun', 'duration_ms': (now - run_started) * 1000
+        })
+    _write_records(_take_pending(force=True) + turn.records, db_path)
+    _local.turn = None
+    return turn
+
+
+@atexit.register
+def _flush_at_exit():
+    # Enregistré après celui de write_behind : s'exécute avant la fermeture des écrivains
+    flush()
+
+
+def _percentile(sorted_values, percent):
+    """Percentile par rang le plus proche"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _is_event(stage_name):
+    return stage_name in SAVING_STAGES or stage_name.startswith(DEDUP_PREFIX)
+
+
+def _recent_rows(days, db_path):
+    # created_at est en heure locale : la borne doit l'être aussi
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("""
+        SELECT stage, duration_ms, tokens_out, model
+        FROM turn_metrics
+        WHERE created_at >= datetime('now', 'localtime', ?)
+        ORDER BY stage, duration_ms
+    """, (f"-{days} days",)).fetchall()
+    conn.close()
+    return rows
+
+
+def get_latency_percentiles(days=7, db_path=DB_PATH):
+    """Retourne {étape: {count, p50, p95, p99, mean, tokens_out}} sur la période (ms)
+
+    Les pseudo-étapes (gains de la préparation, dédoublonnages) sont dans get_events().
+    """
+    durations = {}
+    tokens = {}
+    for stage_name, duration, tokens_out, _ in _recent_rows(days, db_path):
+        if _is_event(stage_name):
+            continue
+        durations.setdefault(stage_name, []).append(duration)
+        tokens[stage_name] = tokens.get(stage_name, 0) + (tokens_out or 0)
+
+    summary = {}
+    for stage_name, values in durations.items():
+        summary[stage_name] = {
+            'count': len(values),
+            'mean': sum(values) / len(values),
+            'tokens_out': tokens[stage_name],
+            **{f"p{p}": _percentile(values, p) for p in PERCENTILES}
+        }
+    return summary
+
+
+def get_events(days=7, db_path=DB_PATH):
+    """Retourne {(pseudo-étape, détail): {count, total_ms}} sur la période
+
+    Le détail est la source du gain (connexion, audio préparé) ou le type d'entrée dédoublonnée.
+    """
+    events = {}
+    for stage_name, duration, _, detail in _recent_rows(days, db_path):
+        if not _is_event(stage_name):
+            continue
+        entry = events.setdefault((stage_name, detail or ""), {'count': 0, 'total_ms': 0.0})
+        entry['count'] += 1
+        entry['total_ms'] += duration
+    return events
+
+
+def export_prometheus(days=7, db_path=DB_PATH):
+    """Formate les percentiles au format texte Prometheus (type summary)
+
+    Les gains de la préparation et les dédoublonnages sont exportés comme compteurs séparés.
+    """
+    summary = get_latency_percentiles(days, db_path)
+    lines = [
+        "# HELP english_tutor_stage_duration_seconds Durée des étapes d'un tour de conversation",
+        "# TYPE english_tutor_stage_duration_seconds summary"
+    ]
+    for stage_name, values in sorted(summary.items()):
+        for p in PERCENTILES:
+            lines.append(f'english_tutor_stage_duration_seconds{{stage="{stage_name}",quantile="{p / 100}"}} '
+                         f'{values[f"p{p}"] / 1000:.6f}')
+        lines.append(f'english_tutor_stage_duration_seconds_sum{{stage="{stage_name}"}} '
+                     f'{values["mean"] * values["count"] / 1000:.6f}')
+        lines.append(f'english_tutor_stage_duration_seconds_count{{stage="{stage_name}"}} {values["count"]}')
+    lines.append("# HELP english_tutor_tokens_total Jetons générés par étape")
+    lines.append("# TYPE english_tutor_tokens_total counter")
+    for stage_name, values in sorted(summary.items()):
+        if values['tokens_out']:
+            lines.append(f'english_tutor_tokens_total{{stage="{stage_name}"}} {values["tokens_out"]}')
+
+    events = sorted(get_events(days, db_path).items())
+    lines.append("# HELP english_tutor_prefetch_saved_seconds_total Latence économisée par la préparation anticipée")
+    lines.append("# TYPE english_tutor_prefetch_saved_seconds_total counter")
+    for (stage_name, source), values in events:
+        if stage_name in SAVING_STAGES:
+            lines.append(f'english_tutor_prefetch_saved_seconds_total{{source="{source}"}} '
+                         f'{values["total_ms"] / 1000:.6f}')
+    lines.append("# HELP english_tutor_deduplicated_total Entrées et appels dédoublonnés")
+    lines.append("# TYPE english_tutor_deduplicated_total counter")
+    for (stage_name, detail), values in events:
+        if stage_name.startswith(DEDUP_PREFIX):
+            kind = stage_name[len(DEDUP_PREFIX):]
+            lines.append(f'english_tutor_deduplicated_total{{kind="{kind}",detail="{detail}"}} {values["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+def serve_metrics(port, days=7, db_path=DB_PATH):
+    """Expose /metrics pour un collecteur (bloquant)"""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = export_prometheus(days, db_path).encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    HTTPServer(("", port), MetricsHandler).serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporte les mesures de latence par étape")
+    parser.add_argument("--db", default=str(DB_PATH), help="Chemin de la base SQLite")
+    parser.add_argument("--days", type=int, default=7, help="Fenêtre d'analyse en jours")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="Expose /metrics sur ce port")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve_metrics(args.serve, args.days, args.db)
+    else:
+        print(export_prometheus(args.days, args.db), end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Les modules de l'application sont à la racine du dépôt
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database import init_database  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """Base SQLite neuve avec le schéma courant"""
+    path = tmp_path / "conversations.db"
+    init_database(path)
+    return path
@@ -0,0 +1,139 @@
+import json
+import os
+import shutil
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("streamlit_mic_recorder")
+AppTest = pytest.importorskip("streamlit.testing.v1").AppTest
+
+import semantic_index  # noqa: E402
+import telemetry  # noqa: E402
+import write_behind  # noqa: E402
+from database import DB_PATH  # noqa: E402
+from mock_providers import provider_env, start_mock_server  # noqa: E402
+
+APP_PATH = Path(__file__).resolve().parent.parent / "Main.py"
+
+
+@pytest.fixture(scope="module")
+def app_env(tmp_path_factory):
+    """Dossier de travail neuf et fournisseurs simulés pour Main.py"""
+    workdir = tmp_path_factory.mktemp("app")
+    server, state, base_url = start_mock_server(config={'latency_ms': 0, 'jitter_ms': 0})
+    previous_cwd, previous_env = os.getcwd(), dict(os.environ)
+    os.chdir(workdir)
+    os.environ.update(provider_env(base_url))
+    yield state
+    # Mesures encore en mémoire écrites ici, pas dans le dossier d'origine à la sortie
+    writer = write_behind.get_writer(DB_PATH)
+    writer.flush()
+    telemetry.flush()
+    writer.close()
+    server.shutdown()
+    os.chdir(previous_cwd)
+    os.environ.clear()
+    os.environ.update(previous_env)
+
+
+def _app():
+    app = AppTest.from_file(str(APP_PATH), default_timeout=60)
+    app.run()
+    return app
+
+
+def test_main_runs_without_exception(app_env):
+    app = _app()
+    assert not app.exception
+    assert app.sidebar.radio(key="navigation_tabs").value == "💬 Conversation"
+
+
+def _chat(app, message):
+    for text_input in app.sidebar.text_input:
+        if text_input.label.startswith("Clé API"):
+            text_input.input("gsk_test_key").run()
+    assert app.chat_input, "la zone de saisie apparaît une fois la clé API saisie"
+    app.chat_input[0].set_value(message).run()
+
+
+def test_chat_turn_gets_an_answer(app_env):
+    app = _app()
+    _chat(app, "I go to the cinema yesterday.")
+    assert not app.exception
+    roles = [message.name for message in app.chat_message]
+    assert roles[-2:] == ["user", "assistant"]
+    assert app.session_state.messages[-1]['role'] == "assistant"
+
+
+def test_repeated_text_submission_is_deduplicated(app_env):
+    app = _app()
+    _chat(app, "Sorry, I am late.")
+    before = len(app.session_state.messages)
+    app.chat_input[0].set_value("Sorry, I am late.").run()
+    assert not app.exception
+    assert len(app.session_state.messages) == before
+    assert any(str(toast.value).startswith("⏭️") for toast in app.toast)
+
+
+def _conversations():
+    conn = sqlite3.connect(DB_PATH)
+    rows = conn.execute("SELECT id, title, file_path FROM conversations ORDER BY id").fetchall()
+    conn.close()
+    return rows
+
+
+def test_save_then_delete_writes_file_after_commit(app_env):
+    app = _app()
+    _chat(app, "What do you like to cook?")
+    app.sidebar.radio(key="navigation_tabs").set_value("💾 Sauvegardes").run()
+    app.sidebar.text_input(key="conv_title_input").set_value("Saved from test")
+    next(b for b in app.sidebar.button if b.label == "💾 Sauvegarder").click().run()
+    assert not app.exception
+    write_behind.get_writer(DB_PATH).flush()
+
+    conv_id, title, file_path = _conversations()[-1]
+    assert title == "Saved from test"
+    with open(file_path, encoding='utf-8') as f:
+        assert json.load(f)['title'] == "Saved from test"
+
+    app.run()
+    app.sidebar.button(key=f"delete_{conv_id}").click().run()
+    assert not app.exception
+    write_behind.get_writer(DB_PATH).flush()
+    assert conv_id not in [row[0] for row in _conversations()]
+    assert not Path(file_path).exists()
+
+
+def test_review_mode_does_not_wait_for_sync(app_env):
+    app = _app()
+    app.sidebar.checkbox(key="review_mode").check().run()
+    assert not app.exception
+    assert app.session_state.review_queue is not None
+    write_behind.get_writer(DB_PATH).flush()
+
+    app.run()
+    assert app.session_state.review_synced
+
+
+def test_index_is_built_in_background(app_env):
+    app = _app()
+    _chat(app, "We visited the museum in Rome.")
+    app.sidebar.radio(key="navigation_tabs").set_value("💾 Sauvegardes").run()
+    app.sidebar.text_input(key="conv_title_input").set_value("Rome trip")
+    next(b for b in app.sidebar.button if b.label == "💾 Sauvegarder").click().run()
+    write_behind.get_writer(DB_PATH).flush()
+    # Index complété après la sauvegarde : le supprimer une fois la mise à jour faite
+    semantic_index._updates.submit(lambda: None).result(timeout=10)
+    shutil.rmtree(semantic_index.INDEX_DIR, ignore_errors=True)
+
+    app.sidebar.text_input(key="search_conversations").set_value("museum")
+    app.sidebar.checkbox(key="semantic_search").check().run()
+    app.sidebar.button(key="build_semantic_index").click().run()
+    assert not app.exception
+    semantic_index._updates.submit(lambda: None).result(timeout=10)
+
+    app.run()
+    assert app.session_state.index_rebuild is None
+    assert any("Rome trip" in expander.label for expander in app.sidebar.expander)
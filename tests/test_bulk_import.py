@@ -0,0 +1,80 @@
+import json
+import sqlite3
+import zipfile
+from datetime import datetime
+
+import bulk_import
+from bulk_import import import_conversations
+
+
+def _conversation(title="Trip", **fields):
+    return {
+        "title": title,
+        "level": "Intermédiaire (B1-B2)",
+        "topic": "Travel",
+        "messages": [
+            {"role": "user", "content": "I go to Paris yesterday"},
+            {"role": "assistant", "content": "💡 Petite correction [tense]: instead of 'I go', say 'I went'"},
+        ],
+        **fields,
+    }
+
+
+def _count(db_path):
+    conn = sqlite3.connect(db_path)
+    count = conn.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+    conn.close()
+    return count
+
+
+def test_reimport_is_deduplicated(tmp_path, db_path):
+    source = tmp_path / "export"
+    source.mkdir()
+    (source / "a.json").write_text(json.dumps(_conversation(date="2024-01-02 10:00:00")), encoding="utf-8")
+    (source / "b.json").write_text(json.dumps(_conversation("Food", date="2024-01-03 10:00:00")), encoding="utf-8")
+
+    first = import_conversations([source], db_path=db_path, workers=1)
+    second = import_conversations([source], db_path=db_path, workers=1)
+
+    assert first['imported'] == 2
+    assert second['imported'] == 0
+    assert second['duplicates'] == 2
+    assert _count(db_path) == 2
+
+
+def test_file_without_date_is_not_duplicated(tmp_path, db_path, monkeypatch):
+    path = tmp_path / "undated.json"
+    path.write_text(json.dumps(_conversation()), encoding="utf-8")
+
+    class Clock:
+        current = datetime(2024, 1, 1, 9, 0, 0)
+
+        @classmethod
+        def now(cls):
+            return cls.current
+
+    monkeypatch.setattr(bulk_import, "datetime", Clock)
+    import_conversations([path], db_path=db_path, workers=1)
+    Clock.current = datetime(2024, 1, 1, 9, 0, 5)
+    report = import_conversations([path], db_path=db_path, workers=1)
+
+    assert report['imported'] == 0
+    assert _count(db_path) == 1
+
+
+def test_zip_archive_and_errors(tmp_path, db_path):
+    archive = tmp_path / "backup.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("one.json", json.dumps(_conversation(date="2024-01-02 10:00:00")))
+        zf.writestr("list.json", json.dumps([_conversation("A", date="2024-01-04 10:00:00"),
+                                             _conversation("B", date="2024-01-05 10:00:00")]))
+        zf.writestr("broken.json", "{not json")
+
+    report = import_conversations([archive], user_id="alice", db_path=db_path, workers=1)
+
+    assert report['imported'] == 3
+    assert len(report['errors']) == 1
+    conn = sqlite3.connect(db_path)
+    users = {row[0] for row in conn.execute("SELECT user_id FROM conversations")}
+    conn.close()
+    assert users == {"alice"}
@@ -0,0 +1,46 @@
+from corrections import extract_corrections
+
+
+def test_structured_format():
+    text = ("Nice! What did you see?\n"
+            "💡 Petite correction [tense]: instead of 'I go yesterday', say 'I went yesterday'")
+    assert extract_corrections(text) == [{
+        "original": "I go yesterday",
+        "corrected": "I went yesterday",
+        "category": "tense",
+        "correction": "💡 Petite correction [tense]: instead of 'I go yesterday', say 'I went yesterday'",
+    }]
+
+
+def test_one_correction_per_line():
+    text = ("💡 Petite correction [article]: instead of 'a apple', say 'an apple'\n"
+            "💡 Petite correction [Word Order]: instead of 'always I eat', say 'I always eat'")
+    corrections = extract_corrections(text)
+    assert [c["category"] for c in corrections] == ["article", "word_order"]
+
+
+def test_unknown_category_is_other():
+    text = "💡 Petite correction [style]: instead of 'very very good', say 'excellent'"
+    assert extract_corrections(text)[0]["category"] == "other"
+
+
+def test_apostrophes_inside_quotes():
+    text = "💡 Petite correction [grammar]: instead of 'I don't likes it', say 'I don't like it'"
+    correction = extract_corrections(text)[0]
+    assert correction["original"] == "I don't likes it"
+    assert correction["corrected"] == "I don't like it"
+
+
+def test_fallback_guesses_category():
+    corrections = extract_corrections(
+        "💡 Instead of 'I am agree', you should say 'I agree'\n"
+        "💡 Instead of \"a apple\", say \"an apple\"\n"
+        "💡 Instead of 'at Monday', say 'on Monday'\n"
+        "💡 Instead of 'I goed', say 'I went'"
+    )
+    assert [c["category"] for c in corrections] == ["grammar", "article", "preposition", "vocabulary"]
+
+
+def test_lines_without_marker_are_ignored():
+    text = "Instead of 'I go', say 'I went' - just kidding, that was fine!"
+    assert extract_corrections(text) == []
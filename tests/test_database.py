@@ -0,0 +1,89 @@
+import json
+import sqlite3
+
+from database import (
+    DEFAULT_USER, conversation_hash, delete_conversation_record, fetch_conversations, init_database,
+    insert_conversation
+)
+
+MESSAGES = [{"role": "user", "content": "Hello"}, {"role": "assistant", "content": "Hi! How are you?"}]
+
+
+def _old_database(path):
+    """Schéma d'avant le dédoublonnage et le cloisonnement par utilisateur"""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, date_created TEXT NOT NULL,
+            date_modified TEXT NOT NULL, level TEXT, topic TEXT, message_count INTEGER DEFAULT 0,
+            correction_count INTEGER DEFAULT 0, messages_json TEXT, corrections_json TEXT, file_path TEXT
+        );
+        CREATE TABLE corrections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, conversation_id INTEGER NOT NULL, turn INTEGER,
+            original TEXT, corrected TEXT, category TEXT NOT NULL DEFAULT 'other', created_at TEXT NOT NULL
+        );
+        CREATE TABLE lexicon (
+            word TEXT NOT NULL, level TEXT NOT NULL, count INTEGER NOT NULL DEFAULT 0,
+            first_seen TEXT NOT NULL, last_seen TEXT NOT NULL, PRIMARY KEY (word, level)
+        );
+        CREATE INDEX idx_lexicon_level_count ON lexicon(level, count DESC);
+    """)
+    row = ("Greetings", "2024-01-01 10:00:00", "2024-01-01 10:00:00", "Débutant (A1-A2)", "Libre", 1, 0,
+           json.dumps(MESSAGES), "[]", "")
+    for _ in range(2):
+        conn.execute("""
+            INSERT INTO conversations (title, date_created, date_modified, level, topic, message_count,
+                                       correction_count, messages_json, corrections_json, file_path)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, row)
+    conn.execute("INSERT INTO lexicon VALUES ('hello', 'Débutant (A1-A2)', 3, '2024-01-01', '2024-01-02')")
+    conn.commit()
+    conn.close()
+
+
+def test_migrate_old_database(tmp_path):
+    path = tmp_path / "old.db"
+    _old_database(path)
+
+    init_database(path)
+    init_database(path)  # idempotent
+
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT user_id, content_hash FROM conversations ORDER BY id").fetchall()
+    expected = conversation_hash({'title': "Greetings", 'date': "2024-01-01 10:00:00",
+                                  'level': "Débutant (A1-A2)", 'topic': "Libre", 'messages': MESSAGES})
+    # Le doublon existant garde une empreinte vide pour ne pas violer l'index unique
+    assert rows == [(DEFAULT_USER, expected), (DEFAULT_USER, "")]
+    assert conn.execute("SELECT user_id, word, count FROM lexicon").fetchall() == [(DEFAULT_USER, "hello", 3)]
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(corrections)")}
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    conn.close()
+
+    assert "user_id" in columns
+    assert "idx_lexicon_level_count" not in indexes
+    assert {"idx_conversations_user_hash", "idx_lexicon_user_level_count",
+            "idx_corrections_user_created_category"} <= indexes
+
+
+def test_insert_is_deduplicated_and_partitioned(db_path):
+    conversation = {
+        "title": "Greetings", "date": "2024-01-01 10:00:00", "level": "Débutant (A1-A2)", "topic": "Libre",
+        "messages": MESSAGES, "message_count": 1,
+        "corrections": [{"original": "I has", "corrected": "I have", "category": "grammar", "turn": 1}],
+    }
+    first = insert_conversation(conversation, "alice", db_path=db_path)
+    assert insert_conversation(conversation, "alice", db_path=db_path) == first
+    other = insert_conversation(conversation, "bob", db_path=db_path)
+    assert other != first
+
+    assert [c['id'] for c in fetch_conversations("alice", db_path)] == [first]
+    # Un utilisateur ne peut pas supprimer la conversation d'un autre
+    delete_conversation_record(first, "bob", db_path=db_path)
+    assert [c['id'] for c in fetch_conversations("alice", db_path)] == [first]
+    delete_conversation_record(first, "alice", db_path=db_path)
+    assert fetch_conversations("alice", db_path) == []
+
+    conn = sqlite3.connect(db_path)
+    corrections = conn.execute("SELECT user_id FROM corrections").fetchall()
+    conn.close()
+    assert corrections == [("bob",)]
@@ -0,0 +1,97 @@
+import threading
+
+import pytest
+
+import idempotency
+from idempotency import TTLCache, request_key
+
+
+def _request(text="Yes", session_messages=()):
+    return {'service': "Groq (Recommandé)", 'model': "llama-3.1-8b-instant", 'max_tokens': 150,
+            'system': "You are a friendly partner.",
+            'messages': [*session_messages, {"role": "user", "content": text}]}
+
+
+def test_new_then_cached():
+    cache = TTLCache()
+    assert cache.run("k", lambda: "reply") == ("reply", 'new')
+    assert cache.run("k", lambda: "other") == ("reply", 'cached')
+    assert cache.metrics() == {'entries': 1, 'new': 1, 'cached': 1, 'joined': 0}
+
+
+def test_concurrent_call_is_joined():
+    cache = TTLCache()
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return "reply"
+
+    owner = threading.Thread(target=lambda: results.append(cache.run("k", slow)))
+    owner.start()
+    assert started.wait(5)
+    joiner = threading.Thread(target=lambda: results.append(cache.run("k", lambda: pytest.fail("second call"))))
+    joiner.start()
+    release.set()
+    owner.join(5)
+    joiner.join(5)
+
+    assert sorted(results) == [("reply", 'joined'), ("reply", 'new')]
+
+
+def test_errors_are_not_cached():
+    cache = TTLCache()
+
+    def fail():
+        raise RuntimeError("429")
+
+    with pytest.raises(RuntimeError):
+        cache.run("k", fail)
+    assert cache.run("k", lambda: "retry") == ("retry", 'new')
+
+
+def test_entries_expire(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(idempotency.time, "time", lambda: clock[0])
+    cache = TTLCache(ttl=30)
+    cache.run("k", lambda: "first")
+    clock[0] += 31
+    assert cache.run("k", lambda: "second") == ("second", 'new')
+
+
+def test_request_keys_are_per_session_and_per_request():
+    same = request_key("session-a", _request())
+    assert request_key("session-a", _request()) == same
+    # Deux sessions du même utilisateur qui envoient « Yes » au même moment
+    assert request_key("session-b", _request()) != same
+    history = [{"role": "user", "content": "Do you like tea?"}, {"role": "assistant", "content": "I do!"}]
+    assert request_key("session-a", _request(session_messages=history)) != same
+    assert request_key("session-a", {**_request(), 'model': "llama-3.3-70b-versatile"}) != same
+
+
+def test_sessions_do_not_share_replies():
+    cache = TTLCache()
+    cache.run(request_key("session-a", _request()), lambda: "reply for A")
+    assert cache.run(request_key("session-b", _request()), lambda: "reply for B") == ("reply for B", 'new')
+
+
+def test_repeated_text_within_window_is_claimed_once():
+    claimed = {}
+    assert idempotency.claim_input(claimed, "text", "I go to school", now=100.0)
+    assert not idempotency.claim_input(claimed, "text", "I go to school", now=102.0)
+    assert idempotency.claim_input(claimed, "text", "Something else", now=102.0)
+    # Passé la fenêtre, le même texte est un nouveau tour
+    assert idempotency.claim_input(claimed, "text", "I go to school",
+                                   now=102.0 + idempotency.INPUT_WINDOW_S)
+
+
+def test_recording_is_claimed_once_and_claims_are_bounded():
+    claimed = {}
+    assert idempotency.claim_input(claimed, "audio", "rec-1", window=None, now=0.0)
+    assert not idempotency.claim_input(claimed, "audio", "rec-1", window=None, now=3600.0)
+    for index in range(idempotency.MAX_CLAIMED_INPUTS):
+        idempotency.claim_input(claimed, "text", f"message {index}", now=3600.0)
+    assert len(claimed) == idempotency.MAX_CLAIMED_INPUTS
+    assert idempotency.input_key("audio", "rec-1") not in claimed
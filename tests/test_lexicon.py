@@ -0,0 +1,60 @@
+import sqlite3
+
+import pytest
+
+from database import insert_conversation
+from lexicon import rebuild_lexicon, tokenize, update_lexicon
+
+pytest.importorskip("pandas")
+
+LEVEL = "Intermédiaire (B1-B2)"
+TURNS = ["I like cooking pasta", "Yesterday I cooked pasta with my sister", "She likes cooking too"]
+
+
+def _messages(turns):
+    messages = []
+    for text in turns:
+        messages += [{"role": "user", "content": text}, {"role": "assistant", "content": "Nice! Tell me more."}]
+    return messages
+
+
+def _save(db_path, turns, date):
+    insert_conversation({
+        "title": "Cooking", "date": date, "level": LEVEL, "topic": "Food & Cooking",
+        "messages": _messages(turns), "corrections": [], "message_count": len(turns),
+    }, db_path=db_path)
+
+
+def _counts(db_path):
+    conn = sqlite3.connect(db_path)
+    counts = dict(conn.execute("SELECT word, count FROM lexicon WHERE user_id = 'default'").fetchall())
+    conn.close()
+    return counts
+
+
+def test_tokenize():
+    assert tokenize("I don't LIKE it, really!") == ["i", "don't", "like", "it", "really"]
+
+
+def test_rebuild_matches_incremental_index_for_repeated_saves(db_path):
+    for text in TURNS:
+        update_lexicon(text, LEVEL, db_path=db_path)
+    incremental = _counts(db_path)
+
+    # Sauvegardée après deux tours, puis à nouveau en entier après le troisième
+    _save(db_path, TURNS[:2], "2024-03-01 10:00:00")
+    _save(db_path, TURNS, "2024-03-01 10:05:00")
+    rebuild_lexicon("default", db_path)
+
+    assert _counts(db_path) == incremental
+    assert incremental["pasta"] == 2
+
+
+def test_rebuild_keeps_distinct_conversations(db_path):
+    _save(db_path, TURNS[:1], "2024-03-01 10:00:00")
+    _save(db_path, ["Pizza is better", "I like cooking pasta"], "2024-03-02 10:00:00")
+    rebuild_lexicon("default", db_path)
+
+    counts = _counts(db_path)
+    assert counts["pasta"] == 2
+    assert counts["pizza"] == 1
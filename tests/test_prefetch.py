@@ -0,0 +1,92 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import prefetch
+from mock_providers import start_mock_server
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    # Un seul thread : les tâches suivantes restent en file tant que la première bloque
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(prefetch, "_executor", executor)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def mock_url():
+    server, state, base_url = start_mock_server()
+    yield base_url
+    server.shutdown()
+
+
+def test_follow_up_question_skips_corrections():
+    text = "Nice! 💡 Did you mean: Did you go?\nI love movies. What did you watch?"
+    assert prefetch.follow_up_question(text) == "What did you watch?"
+    assert prefetch.follow_up_question("No question here.") is None
+
+
+def test_consume_cancels_pending_tasks(executor):
+    release = threading.Event()
+    speculation = prefetch.Speculation("turn-1")
+    speculation.submit("blocking", lambda spec: release.wait(5))
+    speculation.submit("tts_question", lambda spec: ("audio", 10.0))
+
+    assert prefetch.consume(speculation, []) == []
+    release.set()
+    executor.shutdown(wait=True)
+
+    assert speculation.cancelled.is_set()
+    assert speculation.futures["tts_question"].cancelled()
+    assert speculation.result("tts_question") is None
+    # Plus rien n'est lancé après l'arrivée de la vraie entrée
+    speculation.submit("late", lambda spec: True)
+    assert "late" not in speculation.futures
+
+
+def test_saved_connections_within_keepalive():
+    speculation = prefetch.Speculation("turn-1")
+    now = time.time()
+    speculation.warmed = {
+        "https://fresh.example": (40.0, now),
+        "https://stale.example": (40.0, now - prefetch.KEEPALIVE_S - 1),
+    }
+    urls = ["https://fresh.example/v1/chat", "https://fresh.example/v1/audio", "https://stale.example/v1"]
+    assert prefetch.consume(speculation, urls) == [("connection:https://fresh.example", 40.0)]
+
+
+def test_take_counts_saving_once(executor):
+    speculation = prefetch.Speculation("turn-1")
+    speculation.submit("tts_question", prefetch._timed, lambda text: b"audio", "Why?")
+    executor.shutdown(wait=True)
+
+    audio, ms = speculation.take("tts_question")
+    assert audio == b"audio" and ms >= 0
+    assert speculation.take("tts_question") is None
+    assert speculation.result("tts_question") is not None
+
+
+def test_warm_connection_against_mock(mock_url):
+    speculation = prefetch.start("turn-1", [f"{mock_url}/chat/completions"])
+    future = speculation.futures[f"warm:{mock_url}"]
+    assert future.result(timeout=10) is not None
+    assert mock_url in speculation.warmed
+    assert prefetch.consume(speculation, [f"{mock_url}/chat/completions"])[0][0] == f"connection:{mock_url}"
+
+
+def test_closed_connection_is_not_counted():
+    # Sans do_HEAD, le serveur répond 501 et ferme la connexion
+    server = ThreadingHTTPServer(("127.0.0.1", 0), BaseHTTPRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    try:
+        speculation = prefetch.Speculation("turn-1")
+        assert prefetch._warm_connection(speculation, url) is None
+        assert speculation.warmed == {}
+    finally:
+        server.shutdown()
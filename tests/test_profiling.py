@@ -0,0 +1,32 @@
+import tracemalloc
+
+import profiling
+
+
+def test_memory_profile_stops_tracemalloc():
+    assert not tracemalloc.is_tracing()
+    first = profiling.RunProfile("memory")
+    second = profiling.RunProfile("memory")
+    first.mark("section")
+    first.finish()
+    # Une autre exécution profilée est encore en cours
+    assert tracemalloc.is_tracing()
+    second.finish()
+    assert not tracemalloc.is_tracing()
+    assert [s['section'] for s in first.ranked_sections()] == ["section"]
+
+
+def test_interrupted_run_is_abandoned():
+    profiling.begin_run("memory")
+    profiling.mark("sidebar")
+    # st.rerun() : finish_run() n'est jamais appelé, l'exécution suivante repart de zéro
+    profiling.begin_run(None)
+    assert not tracemalloc.is_tracing()
+    assert profiling.current_profile() is None
+
+
+def test_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("ENGLISH_TUTOR_PROFILE", raising=False)
+    assert profiling.requested_mode(None) is None
+    assert profiling.requested_mode("1") == "timers"
+    assert profiling.requested_mode("memory") == "memory"
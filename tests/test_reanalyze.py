@@ -0,0 +1,86 @@
+import json
+import sqlite3
+
+import pytest
+
+import reanalyze
+from database import insert_conversation
+
+
+def _conversation(title):
+    return {
+        "title": title,
+        "date": "2024-01-02 10:00:00",
+        "level": "Intermédiaire (B1-B2)",
+        "topic": "Travel",
+        "message_count": 1,
+        "messages": [
+            {"role": "user", "content": f"I go to {title} yesterday"},
+            {"role": "assistant", "content": "💡 Petite correction [tense]: instead of 'I go', say 'I went'"},
+        ],
+        # Conversation importée : corrections pas encore extraites
+        "corrections": [],
+    }
+
+
+@pytest.fixture
+def conv_ids(db_path):
+    return [insert_conversation(_conversation(title), "alice", db_path) for title in ("Paris", "Rome", "Oslo")]
+
+
+def _corrections(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT conversation_id, original, corrected, category FROM corrections "
+                        "ORDER BY conversation_id").fetchall()
+    stored = conn.execute("SELECT correction_count, corrections_json FROM conversations ORDER BY id").fetchall()
+    conn.close()
+    return rows, stored
+
+
+def test_first_run_fills_missing_corrections(db_path, conv_ids):
+    report = reanalyze.reanalyze(db_path, workers=1, batch_size=2)
+
+    assert (report['conversations'], report['changed'], report['corrections']) == (3, 3, 3)
+    assert report['resumed_from'] == 0 and report['errors'] == []
+    rows, stored = _corrections(db_path)
+    assert rows == [(conv_id, "I go", "I went", "tense") for conv_id in conv_ids]
+    assert [count for count, _ in stored] == [1, 1, 1]
+    assert json.loads(stored[0][1])[0]['turn'] == 1
+
+
+def test_interrupted_run_resumes_after_checkpoint(db_path, conv_ids):
+    def interrupt(report):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        reanalyze.reanalyze(db_path, workers=1, batch_size=1, progress=interrupt)
+    # La première tranche est validée avec son point de reprise
+    assert len(_corrections(db_path)[0]) == 1
+
+    report = reanalyze.reanalyze(db_path, workers=1, batch_size=1)
+    assert report['resumed_from'] == conv_ids[0]
+    assert report['conversations'] == 2
+    assert len(_corrections(db_path)[0]) == 3
+
+    # Parcours terminé : seules les nouvelles conversations sont traitées
+    assert reanalyze.reanalyze(db_path, workers=1)['conversations'] == 0
+    assert reanalyze.reanalyze(db_path, workers=1, restart=True)['conversations'] == 3
+    assert len(_corrections(db_path)[0]) == 3
+
+
+def test_changed_parser_rewrites_rows(db_path, conv_ids, monkeypatch):
+    reanalyze.reanalyze(db_path, workers=1)
+
+    def stricter(text):
+        return [{"original": "go", "corrected": "went", "category": "verb", "correction": text},
+                {"original": "yesterday", "corrected": "yesterday", "category": "other", "correction": text}]
+
+    monkeypatch.setattr(reanalyze, "extract_corrections", stricter)
+    report = reanalyze.reanalyze(db_path, workers=1, restart=True)
+
+    assert (report['changed'], report['corrections']) == (3, 6)
+    rows, stored = _corrections(db_path)
+    assert len(rows) == 6
+    assert ("I go", "I went") not in {(original, corrected) for _, original, corrected, _ in rows}
+    assert {category for *_, category in rows} == {"verb", "other"}
+    assert [count for count, _ in stored] == [2, 2, 2]
@@ -0,0 +1,77 @@
+import sqlite3
+from datetime import datetime
+
+from review import ReviewQueue, due_items, grade, schedule_corrections, sm2, sync_from_corrections
+
+NOW = datetime(2024, 5, 1, 9, 0, 0)
+
+
+def _item(**fields):
+    return {'id': 1, 'original': "I go", 'corrected': "I went", 'category': "tense", 'ease': 2.5,
+            'interval_days': 0, 'repetitions': 0, 'lapses': 0, 'due_at': "2024-05-01 09:00:00", **fields}
+
+
+def test_sm2_intervals_grow():
+    item = _item()
+    intervals = []
+    for _ in range(4):
+        item = sm2(item, 5, NOW)
+        intervals.append(item['interval_days'])
+    assert intervals[:2] == [1, 6]
+    assert intervals[2] > 6 and intervals[3] > intervals[2]
+    assert item['ease'] > 2.5
+    assert item['due_at'] > "2024-05-01 09:00:00"
+
+
+def test_sm2_lapse_resets_and_bounds_ease():
+    item = _item(repetitions=3, interval_days=15, ease=1.35)
+    item = sm2(item, 1, NOW)
+    assert (item['repetitions'], item['interval_days'], item['lapses']) == (0, 1, 1)
+    assert item['ease'] == 1.3
+    assert item['due_at'] == "2024-05-02 09:00:00"
+
+
+def test_review_queue_orders_by_due_date():
+    queue = ReviewQueue([_item(id=1, due_at="2024-05-03"), _item(id=2, due_at="2024-05-01"),
+                         _item(id=3, due_at="2024-05-02")])
+    assert [item['id'] for item in queue.peek(2)] == [2, 3]
+    queue.remove(2)
+    queue.push(_item(id=4, due_at="2024-04-30"))
+    assert len(queue) == 3
+    assert [queue.pop()['id'] for _ in range(3)] == [4, 3, 1]
+    assert queue.pop() is None
+
+
+def test_schedule_grade_and_relapse(db_path):
+    corrections = [{'original': "I go", 'corrected': "I went", 'category': "tense"},
+                   {'original': "a apple", 'corrected': "an apple", 'category': "article"}]
+    schedule_corrections(corrections, "alice", db_path=db_path, now=NOW)
+    due = due_items("alice", db_path=db_path, now=NOW)
+    assert {item['original'] for item in due} == {"I go", "a apple"}
+    assert due_items("bob", db_path=db_path, now=NOW) == []
+
+    graded = grade(due[0], 5, "alice", db_path=db_path, now=NOW)
+    assert [item['id'] for item in due_items("alice", db_path=db_path, now=NOW)] == [due[1]['id']]
+
+    # Même erreur refaite : l'élément redevient dû tout de suite
+    schedule_corrections([corrections[0] if due[0]['original'] == "I go" else corrections[1]], "alice",
+                         db_path=db_path, now=NOW)
+    relapsed = {item['id']: item for item in due_items("alice", db_path=db_path, now=NOW)}[graded['id']]
+    assert (relapsed['repetitions'], relapsed['lapses']) == (0, 1)
+
+
+def test_sync_from_corrections_and_index(db_path):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany("""
+            INSERT INTO corrections (user_id, conversation_id, original, corrected, category, created_at)
+            VALUES ('alice', 1, ?, ?, 'grammar', '2024-04-01')
+        """, [("he go", "he goes"), ("he go", "he goes"), ("I has", "I have")])
+    plan = " ".join(row[3] for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM review_items WHERE user_id = ? AND due_at <= ? ORDER BY due_at",
+        ("alice", "2024-05-01")))
+    conn.close()
+
+    assert sync_from_corrections("alice", db_path=db_path, now=NOW) == 2
+    assert sync_from_corrections("alice", db_path=db_path, now=NOW) == 0
+    assert "idx_review_items_user_due" in plan
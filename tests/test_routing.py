@@ -0,0 +1,61 @@
+import pytest
+
+import routing
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(routing, "_stats", {name: routing.RouteStats() for name in routing.ROUTES})
+
+
+def _words(count):
+    return " ".join(["word"] * count)
+
+
+def test_short_and_long_inputs():
+    assert routing.choose_route("Intermédiaire (B1-B2)", _words(routing.SHORT_INPUT_WORDS))['route'] == 'fast'
+    assert routing.choose_route("Intermédiaire (B1-B2)", _words(routing.SHORT_INPUT_WORDS + 1))['route'] == 'large'
+    long_turn = routing.choose_route("Intermédiaire (B1-B2)", _words(routing.LONG_INPUT_WORDS))
+    assert (long_turn['route'], long_turn['reason']) == ('large', "message long")
+
+
+def test_level_and_corrections():
+    assert routing.choose_route("Avancé (C1-C2)", "Hi")['route'] == 'large'
+    assert routing.choose_route("Débutant (A1-A2)", _words(20))['route'] == 'fast'
+    corrected = routing.choose_route("Débutant (A1-A2)", "Hi", recent_corrections=2)
+    assert corrected['route'] == 'large'
+    # Les réponses aux débutants restent courtes, même sur le grand modèle
+    assert corrected['max_tokens'] == 250
+
+
+def test_slow_large_model_falls_back_unless_required():
+    for _ in range(routing.MIN_SAMPLES):
+        routing.record_call('large', 3000)
+    fallback = routing.choose_route("Intermédiaire (B1-B2)", _words(20), latency_budget_ms=2500)
+    assert fallback['route'] == 'fast' and fallback['reason'].startswith("p95 3000 ms")
+    assert routing.choose_route("Avancé (C1-C2)", "Hi", latency_budget_ms=2500)['route'] == 'large'
+
+
+def test_p95_needs_enough_samples():
+    for _ in range(routing.MIN_SAMPLES - 1):
+        routing.record_call('large', 3000)
+    assert routing.choose_route("Intermédiaire (B1-B2)", _words(20), latency_budget_ms=2500)['route'] == 'large'
+
+
+def test_low_quota_falls_back():
+    routing.record_call('large', 100, headers={"x-ratelimit-remaining-requests": "50"})
+    assert routing.choose_route("Intermédiaire (B1-B2)", _words(20))['reason'] == "quota restant 5%"
+
+
+def test_route_metrics():
+    routing.record_call('fast', 100, tokens_in=10, tokens_out=20)
+    routing.record_call('fast', 300, ok=False, status=429,
+                        headers={"x-ratelimit-remaining-tokens": "900"})
+
+    metrics = {row['route']: row for row in routing.route_metrics()}
+    fast = metrics['fast']
+    assert (fast['requests'], fast['errors'], fast['rate_limited']) == (2, 1, 1)
+    assert (fast['tokens_in'], fast['tokens_out'], fast['remaining_tokens']) == (10, 20, 900)
+    assert fast['p50_ms'] == 100 and fast['p95_ms'] == 0.0
+    assert fast['quota_left'] == 0.0
+    assert metrics['large']['requests'] == 0 and metrics['large']['quota_left'] == 1.0
@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from database import insert_conversation  # noqa: E402
+from semantic_index import (  # noqa: E402
+    HASHING_MODEL, VectorIndex, index_later, rebuild_index, rebuild_later, remove_later
+)
+
+
+def test_add_search_remove(tmp_path):
+    index = VectorIndex("alice", tmp_path)
+    index.add([(1, "Trip. Travel. We visited the museum in Rome and ate pasta"),
+               (2, "Work. Work & Career. My manager asked me to prepare a presentation")],
+              model_name=HASHING_MODEL)
+
+    assert [conv_id for conv_id, _ in index.search("museum in Rome")[0]] == [1]
+    # Remplacement d'une conversation déjà indexée : pas de ligne en double
+    assert index.add([(1, "Trip. Travel. A weekend in Rome")], model_name=HASHING_MODEL) == 0
+    assert index.meta()['count'] == 2
+
+    assert index.remove(2)
+    assert index.search("presentation manager")[0] == []
+
+
+def test_background_updates_run_in_order(tmp_path):
+    index = VectorIndex("bob", tmp_path)
+    index.add([(1, "seed")], model_name=HASHING_MODEL)
+    index_later("bob", 7, "Food. We cooked a spicy curry", tmp_path)
+    remove_later("bob", 7, tmp_path).result(timeout=10)
+    assert index.search("spicy curry")[0] == []
+
+
+def _save(db_path, title, text, user_id="alice"):
+    return insert_conversation({
+        "title": title, "date": "2024-01-02 10:00:00", "level": "Intermédiaire (B1-B2)", "topic": "Travel",
+        "message_count": 1, "messages": [{"role": "user", "content": text}], "corrections": [],
+    }, user_id, db_path)
+
+
+def test_rebuild_replaces_index_under_lock(tmp_path, db_path):
+    index_dir = tmp_path / "index"
+    index = VectorIndex("alice", index_dir)
+    index.add([(99, "Stale. Deleted conversation about sailing")], model_name=HASHING_MODEL)
+    conv_id = _save(db_path, "Trip", "We visited the museum in Rome")
+
+    # Tant que le verrou est pris, l'ancien index reste en place
+    finished = threading.Event()
+    with index.lock:
+        thread = threading.Thread(target=lambda: (rebuild_index("alice", db_path, index_dir, HASHING_MODEL),
+                                                  finished.set()))
+        thread.start()
+        assert not finished.wait(0.5)
+        assert [match for match, _ in index.search("sailing")[0]] == [99]
+    thread.join(10)
+
+    assert [match for match, _ in index.search("museum in Rome")[0]] == [conv_id]
+    assert index.search("sailing")[0] == []
+    assert [path.name for path in index_dir.iterdir()] == ["alice"]
+
+
+def test_rebuild_later_reports_progress(tmp_path, db_path):
+    for title in ("Food", "Work", "Sport"):
+        _save(db_path, title, f"I talked about {title.lower()}")
+    calls = []
+    future = rebuild_later("alice", db_path, tmp_path, progress=lambda done, expected: calls.append((done, expected)))
+    assert future.result(timeout=10) == 3
+    assert calls == [(3, 3)]
+    assert VectorIndex("alice", tmp_path).meta()['count'] == 3
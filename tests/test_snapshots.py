@@ -0,0 +1,72 @@
+import os
+import sqlite3
+import time
+
+import snapshots
+
+
+def _state():
+    return {
+        'messages': [{"role": "user", "content": "J'ai vu « Amélie » hier"},
+                     {"role": "assistant", "content": "Nice! What did you like about it?"}],
+        'corrections': [{"original": "I go", "corrected": "I went", "category": "tense"}],
+        'conversation_count': 1,
+        'conversation_title': "Cinéma",
+        'conversation_started': "2024-01-02T10:00:00",
+        'audio_refs': {"1": snapshots.audio_key("Nice! What did you like about it?", "nova")},
+    }
+
+
+def test_snapshot_round_trip(db_path):
+    token = "a1" * 16
+    assert snapshots.load_snapshot(token, "alice", db_path) is None
+
+    snapshots.save_snapshot(token, _state(), "alice", db_path)
+    assert snapshots.load_snapshot(token, "alice", db_path) == _state()
+    # Le jeton seul ne suffit pas : l'instantané reste propre à son utilisateur
+    assert snapshots.load_snapshot(token, "bob", db_path) is None
+
+    updated = {**_state(), 'conversation_count': 2}
+    snapshots.save_snapshot(token, updated, "alice", db_path)
+    assert snapshots.load_snapshot(token, "alice", db_path) == updated
+
+
+def test_prune_snapshots(db_path):
+    snapshots.save_snapshot("b2" * 16, _state(), "alice", db_path)
+    snapshots.save_snapshot("c3" * 16, _state(), "alice", db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE session_snapshots SET updated_at = '2000-01-01 00:00:00' WHERE token = ?", ("b2" * 16,))
+    conn.commit()
+    conn.close()
+
+    assert snapshots.prune_snapshots(db_path=db_path) == 1
+    assert snapshots.load_snapshot("c3" * 16, "alice", db_path) is not None
+
+
+def _clip(cache_dir, text, size, age_days=0):
+    key = snapshots.audio_key(text, "nova")
+    path = snapshots.store_audio(key, b"x" * size, cache_dir)
+    mtime = time.time() - age_days * 86400
+    os.utime(path, (mtime, mtime))
+    return key
+
+
+def test_prune_audio_cache_by_age(tmp_path):
+    old = _clip(tmp_path, "old", 10, age_days=snapshots.MAX_AGE_DAYS + 1)
+    recent = _clip(tmp_path, "recent", 10, age_days=1)
+
+    assert snapshots.prune_audio_cache(cache_dir=tmp_path) == 1
+    assert snapshots.load_audio(old, tmp_path) is None
+    assert snapshots.load_audio(recent, tmp_path) == b"x" * 10
+
+
+def test_prune_audio_cache_by_size_keeps_recently_served(tmp_path):
+    first = _clip(tmp_path, "first", 100, age_days=3)
+    second = _clip(tmp_path, "second", 100, age_days=2)
+    third = _clip(tmp_path, "third", 100, age_days=1)
+    # Servir un clip le rend le plus récent
+    assert snapshots.load_audio(first, tmp_path)
+
+    assert snapshots.prune_audio_cache(max_bytes=250, cache_dir=tmp_path) == 1
+    assert snapshots.load_audio(second, tmp_path) is None
+    assert snapshots.load_audio(first, tmp_path) and snapshots.load_audio(third, tmp_path)
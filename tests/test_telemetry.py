@@ -0,0 +1,103 @@
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import telemetry
+import write_behind
+
+
+@pytest.fixture
+def writer(db_path, monkeypatch):
+    monkeypatch.setattr(telemetry, "_pending", type(telemetry._pending)(maxlen=telemetry.MAX_PENDING))
+    monkeypatch.setattr(telemetry, "_last_flush", time.monotonic())
+    monkeypatch.setattr(telemetry, "_last_prune", None)
+    writer = write_behind.get_writer(db_path)
+    yield writer
+    writer.close()
+
+
+def _stages(db_path):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT stage, turn_id FROM turn_metrics ORDER BY id").fetchall()
+    conn.close()
+    return rows
+
+
+def test_stage_outside_turn_is_buffered(db_path, writer):
+    telemetry.begin_run()
+    with telemetry.stage("db_load"):
+        pass
+    assert telemetry.finish_run(db_path) is None
+    writer.flush()
+    assert _stages(db_path) == []
+
+    telemetry.flush(db_path)
+    writer.flush()
+    assert _stages(db_path) == [("db_load", None)]
+
+
+def test_turn_records_are_written_with_pending_ones(db_path, writer):
+    telemetry.begin_run()
+    telemetry.record("db_save", 12.5)
+    turn = telemetry.start_turn()
+    with telemetry.stage("llm", model="fast"):
+        pass
+    telemetry.finish_run(db_path)
+    writer.flush()
+
+    stages = _stages(db_path)
+    assert [stage for stage, _ in stages] == ["db_save", "llm", "total", "rerun"]
+    assert {turn_id for stage, turn_id in stages if stage != "db_save"} == {turn.turn_id}
+
+
+def test_old_metrics_are_pruned(db_path, writer):
+    writer.submit(lambda conn: conn.execute(
+        "INSERT INTO turn_metrics (created_at, stage, duration_ms) VALUES ('2000-01-01 00:00:00', 'llm', 1)"
+    )).result(timeout=5)
+
+    telemetry.record("db_load", 1.0)
+    telemetry.flush(db_path)
+    writer.flush()
+    assert _stages(db_path) == [("db_load", None)]
+
+
+def _insert_metric(db_path, created_at, stage, duration_ms, model=None):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO turn_metrics (created_at, stage, duration_ms, model) VALUES (?, ?, ?, ?)",
+                 (created_at, stage, duration_ms, model))
+    conn.commit()
+    conn.close()
+
+
+def test_window_uses_local_time(db_path, monkeypatch):
+    # UTC-12 : une borne calculée en UTC exclurait une mesure locale d'il y a 23 h
+    monkeypatch.setenv("TZ", "Etc/GMT+12")
+    time.tzset()
+    try:
+        created_at = (datetime.now() - timedelta(hours=23)).strftime("%Y-%m-%d %H:%M:%S")
+        _insert_metric(db_path, created_at, "llm", 100)
+        assert telemetry.get_latency_percentiles(1, db_path)['llm']['count'] == 1
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+
+def test_pseudo_stages_are_kept_out_of_latencies(db_path):
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    _insert_metric(db_path, now, "llm", 800, "fast")
+    _insert_metric(db_path, now, "prefetch_saved", 120, "tts_question")
+    _insert_metric(db_path, now, "prefetch_saved", 30, "tts_question")
+    _insert_metric(db_path, now, "dedup_input", 0, "text")
+
+    assert set(telemetry.get_latency_percentiles(7, db_path)) == {"llm"}
+    assert telemetry.get_events(7, db_path) == {
+        ("dedup_input", "text"): {'count': 1, 'total_ms': 0.0},
+        ("prefetch_saved", "tts_question"): {'count': 2, 'total_ms': 150.0},
+    }
+
+    exported = telemetry.export_prometheus(7, db_path)
+    assert 'stage="prefetch_saved"' not in exported and 'stage="dedup_input"' not in exported
+    assert 'english_tutor_prefetch_saved_seconds_total{source="tts_question"} 0.150000' in exported
+    assert 'english_tutor_deduplicated_total{kind="input",detail="text"} 1' in exported
@@ -0,0 +1,130 @@
+import sqlite3
+import threading
+
+import pytest
+
+from write_behind import WriteBehindQueue
+
+
+@pytest.fixture
+def writer(db_path):
+    writer = WriteBehindQueue(db_path)
+    yield writer
+    writer.close()
+
+
+def _insert(title):
+    def op(conn):
+        return conn.execute(
+            "INSERT INTO conversations (title, date_created, date_modified) VALUES (?, '', '')", (title,)
+        ).lastrowid
+    return op
+
+
+def _titles(db_path):
+    conn = sqlite3.connect(db_path)
+    titles = [row[0] for row in conn.execute("SELECT title FROM conversations ORDER BY id")]
+    conn.close()
+    return titles
+
+
+def _hold(writer):
+    """Occupe le thread écrivain : les opérations suivantes forment un seul lot"""
+    started, release = threading.Event(), threading.Event()
+
+    def block(conn):
+        started.set()
+        release.wait(5)
+
+    writer.submit(block)
+    assert started.wait(5)
+    return release
+
+
+def test_failed_operation_is_isolated_by_replay(db_path, writer):
+    def fail(conn):
+        _insert("rolled back")(conn)
+        raise ValueError("boom")
+
+    release = _hold(writer)
+    ok_before = writer.submit(_insert("a"))
+    failed = writer.submit(fail)
+    ok_after = writer.submit(_insert("b"))
+    release.set()
+
+    assert ok_before.result(5) and ok_after.result(5)
+    with pytest.raises(ValueError):
+        failed.result(5)
+    # Le lot est annulé puis chaque opération rejouée dans sa propre transaction
+    assert _titles(db_path) == ["a", "b"]
+    metrics = writer.metrics()
+    assert (metrics['committed'], metrics['failed']) == (3, 1)
+
+
+def test_coalesced_operations_keep_the_last(db_path, writer):
+    release = _hold(writer)
+    futures = [writer.submit(_insert(f"snapshot {i}"), coalesce_key="snapshot") for i in range(3)]
+    other = writer.submit(_insert("other"))
+    release.set()
+
+    results = {future.result(5) for future in futures}
+    assert len(results) == 1
+    assert other.result(5) not in results
+    assert _titles(db_path) == ["snapshot 2", "other"]
+    assert writer.metrics()['coalesced'] == 2
+
+
+def test_future_resolves_after_commit(db_path, writer):
+    seen = []
+
+    def check(future):
+        # Lecture depuis une autre connexion : la ligne doit déjà être validée
+        conn = sqlite3.connect(db_path)
+        seen.append(conn.execute("SELECT title FROM conversations WHERE id = ?", (future.result(),)).fetchone())
+        conn.close()
+
+    future = writer.submit(_insert("durable"))
+    future.add_done_callback(check)
+    future.result(5)
+    writer.flush()
+    assert seen == [("durable",)]
+
+
+def test_close_flushes_pending_operations(db_path):
+    writer = WriteBehindQueue(db_path)
+    release = _hold(writer)
+    futures = [writer.submit(_insert(str(i))) for i in range(50)]
+    release.set()
+    writer.close()
+
+    assert all(future.done() and not future.exception() for future in futures)
+    assert len(_titles(db_path)) == 50
+    with pytest.raises(RuntimeError):
+        writer.submit(_insert("late"))
+
+
+def test_starts_while_database_is_locked(db_path):
+    blocker = sqlite3.connect(db_path, check_same_thread=False)
+    blocker.execute("BEGIN IMMEDIATE")
+    writer = WriteBehindQueue(db_path)
+    try:
+        future = writer.submit(_insert("after lock"))
+        threading.Timer(0.2, blocker.rollback).start()
+        assert future.result(5)
+        writer.flush()
+    finally:
+        writer.close()
+        blocker.close()
+    assert _titles(db_path) == ["after lock"]
+
+
+def test_cancelled_future_does_not_stop_the_writer(db_path, writer):
+    release = _hold(writer)
+    cancelled = writer.submit(_insert("cancelled"))
+    assert cancelled.cancel()
+    kept = writer.submit(_insert("kept"))
+    release.set()
+
+    assert kept.result(5)
+    writer.flush()
+    assert writer.thread.is_alive()
@@ -0,0 +1,214 @@
+"""File d'écriture en arrière-plan : les écritures SQLite quittent le chemin de la requête.
+
+Le script Streamlit ne fait que mettre en file une opération `fn(conn)`; un thread
+unique vide la file par lots et exécute chaque lot dans une seule transaction. Le
+Future retourné par submit() n'est résolu qu'après le COMMIT (acquittement durable).
+"""
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from database import DB_PATH
+
+QUEUE_SIZE = 1000
+BATCH_SIZE = 200
+SUBMIT_TIMEOUT = 2.0
+# Attente maximale d'un verrou SQLite tenu par une autre connexion (secondes)
+BUSY_TIMEOUT = 5.0
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+class WriteBehindQueue:
+    """Thread écrivain unique alimenté par une file bornée"""
+
+    def __init__(self, db_path=DB_PATH, maxsize=QUEUE_SIZE, batch_size=BATCH_SIZE):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.stats_lock = threading.Lock()
+        self.submitted = 0
+        self.committed = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.batch_latencies = deque(maxlen=1000)
+        self.ack_latencies = deque(maxlen=1000)
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self.thread.start()
+
+    def submit(self, fn, coalesce_key=None, timeout=SUBMIT_TIMEOUT):
+        """Met en file `fn(conn)` et retourne un Future résolu après le COMMIT
+
+        Deux opérations d'un même lot avec la même `coalesce_key` sont fusionnées :
+        seule la dernière est exécutée. Lève queue.Full si la file reste pleine.
+        """
+        if self.closed:
+            raise RuntimeError("File d'écriture fermée")
+        future = Future()
+        self.queue.put((fn, coalesce_key, future, time.perf_counter()), timeout=timeout)
+        with self.stats_lock:
+            self.submitted += 1
+        return future
+
+    def flush(self):
+        """Attend que toutes les opérations en file soient écrites"""
+        self.queue.join()
+
+    def close(self):
+        """Vide la file puis arrête le thread (appelé à l'arrêt du processus)"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+
+    def _drain(self):
+        """Attend une opération puis récupère celles déjà en file, jusqu'à batch_size"""
+        items = [self.queue.get()]
+        while len(items) < self.batch_size:
+            try:
+                items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _coalesce(self, items):
+        """Garde la dernière opération de chaque clé; retourne [(fn, futures, enqueued_at)]"""
+        operations = []
+        by_key = {}
+        for fn, key, future, enqueued_at in items:
+            if key is not None and key in by_key:
+                previous = by_key[key]
+                previous[0] = fn
+                previous[1].append(future)
+                with self.stats_lock:
+                    self.coalesced += 1
+                continue
+            operation = [fn, [future], enqueued_at]
+            operations.append(operation)
+            if key is not None:
+                by_key[key] = operation
+        return operations
+
+    def _run(self):
+        # Attente du verrou réglée avant tout accès : une autre connexion peut écrire au démarrage
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.Error:
+            # Le mode WAL est persistant : il sera activé par une autre connexion ou au prochain démarrage
+            pass
+        stopping = False
+        while not stopping:
+            items = self._drain()
+            if None in items:
+                stopping = True
+                items = [item for item in items if item is not None]
+                # Vider ce qui reste avant l'arrêt
+                while True:
+                    try:
+                        item = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        items.append(item)
+                    else:
+                        self.queue.task_done()
+                self.queue.task_done()
+            try:
+                if items:
+                    self._write_batch(conn, self._coalesce(items))
+            except Exception as e:
+                # Le thread ne doit jamais s'arrêter : flush() et les appelants attendraient indéfiniment
+                for _, _, future, _ in items:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in items:
+                    self.queue.task_done()
+        conn.close()
+
+    def _write_batch(self, conn, operations):
+        start = time.perf_counter()
+        results = []
+        try:
+            with conn:
+                for fn, _, _ in operations:
+                    results.append((fn(conn), None))
+        except Exception:
+            # Le lot est annulé : on rejoue chaque opération dans sa propre transaction
+            results = []
+            for fn, _, _ in operations:
+                try:
+                    with conn:
+                        results.append((fn(conn), None))
+                except Exception as e:
+                    results.append((None, e))
+
+        now = time.perf_counter()
+        with self.stats_lock:
+            self.batches += 1
+            self.batch_latencies.append((now - start) * 1000)
+            for (_, futures, enqueued_at), (_, error) in zip(operations, results):
+                self.ack_latencies.append((now - enqueued_at) * 1000)
+                if error:
+                    self.failed += len(futures)
+                else:
+                    self.committed += len(futures)
+
+        for (_, futures, _), (result, error) in zip(operations, results):
+            for future in futures:
+                # Un future annulé par l'appelant ne peut plus recevoir de résultat
+                if not future.set_running_or_notify_cancel():
+                    continue
+                if error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    def metrics(self):
+        """Profondeur de file, débit et latences (ms) pour le panneau admin"""
+        with self.stats_lock:
+            batch_latencies = sorted(self.batch_latencies)
+            ack_latencies = sorted(self.ack_latencies)
+            metrics = {
+                'queue_depth': self.queue.qsize(),
+                'queue_max': self.queue.maxsize,
+                'submitted': self.submitted,
+                'committed': self.committed,
+                'failed': self.failed,
+                'coalesced': self.coalesced,
+                'batches': self.batches,
+                'avg_batch_size': (self.committed + self.failed) / self.batches if self.batches else 0.0,
+            }
+        for name, values in (('batch_ms', batch_latencies), ('ack_ms', ack_latencies)):
+            for p in (50, 95, 99):
+                metrics[f"{name}_p{p}"] = values[min(len(values) - 1, int(len(values) * p / 100))] if values else 0.0
+        return metrics
+
+
+def get_writer(db_path=DB_PATH):
+    """Écrivain partagé par toutes les sessions pour une base donnée"""
+    key = str(db_path)
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None or writer.closed:
+            writer = WriteBehindQueue(db_path)
+            _writers[key] = writer
+        return writer
+
+
+@atexit.register
+def _close_all():
+    """Écrit tout ce qui reste en file avant l'arrêt du serveur"""
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.close()